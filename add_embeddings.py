@@ -1,20 +1,23 @@
 import os
 import json
 import time
-from utils.db import get_conn
+import random
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.db import get_conn, put_conn
 from dotenv import load_dotenv
-from utils.embedder import embed
+from utils.embedder import embed_uncached, EMBEDDING_ID
+from utils import embedding_cache
+from utils.snapshot import ensure_catalog_meta, bump_embeddings_version
 load_dotenv()
 
-conn = get_conn()
-cur = conn.cursor()
-
 BATCH_SIZE = 20     # Number of items per API call
-RATE_LIMIT_SLEEP = 1.5   # Seconds to sleep between batches to avoid rate limits
-
-
-cur.execute("SELECT id, name, key_ingredients, category_id FROM food")
-foods = cur.fetchall()  # [(id, name, key_ingredients, category_id), ...]
+CONCURRENCY = 4     # Embedding requests in flight
+MAX_RETRIES = 6
+CHECKPOINT_FILE = ".add_embeddings.checkpoint.json"
 
 
 def prepare_embedding_text(name, key_ingredients, category_id):
@@ -30,27 +33,198 @@ def prepare_embedding_text(name, key_ingredients, category_id):
     return text
 
 
-for i in range(0, len(foods), BATCH_SIZE):
-    batch = foods[i:i+BATCH_SIZE]
-    texts = [prepare_embedding_text(f[1], f[2], f[3]) for f in batch]
+# ---------------- Schema ----------------
+def ensure_schema(conn):
+    with conn.cursor() as cur:
+        # which model produced the stored embedding; NULL or another model = stale
+        cur.execute("ALTER TABLE food ADD COLUMN IF NOT EXISTS embedding_model text")
+        # content hash of the text + model behind the stored embedding
+        cur.execute("ALTER TABLE food ADD COLUMN IF NOT EXISTS embedding_hash text")
+    conn.commit()
+    embedding_cache.ensure_table(conn)
+    # stamps snapshots and neighbour graphs (see utils.snapshot.catalog_version)
+    ensure_catalog_meta(conn)
+
 
-    # Call OpenAI embeddings
+# ---------------- Rate limiting ----------------
+class AdaptiveRateLimiter:
+    """
+    Requests-per-second limiter with AIMD control: every success nudges the
+    rate up, every rate-limit response halves it.
+    """
 
+    def __init__(self, rate=5.0, min_rate=0.2, max_rate=50.0, step=0.2):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.step = step
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
 
-    embeddings = embed(texts)
-    print(len(embeddings))
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + 1.0 / self.rate
+        if wait > 0:
+            time.sleep(wait)
 
-    # Insert embeddings into DB (assuming pgvector column: embedding vector(1536))
-    for food, emb in zip(batch, embeddings):
-        
-        cur.execute(
-            "UPDATE food SET embedding=%s WHERE id=%s",
-            (emb, food[0])
-        )
+    def success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+def is_rate_limit(exc):
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def embed_with_retry(texts, limiter, retries=MAX_RETRIES):
+    for attempt in range(retries):
+        limiter.acquire()
+        try:
+            embeddings = embed_uncached(texts)
+            limiter.success()
+            return embeddings
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            if is_rate_limit(e):
+                limiter.throttled()
+            # exponential backoff with jitter
+            time.sleep(min(60, 2 ** attempt) * (0.5 + random.random()))
+
+
+# ---------------- Read side: stream rows that need an embedding ----------------
+def stream_pending(conn, after_id, batch_size):
+    """
+    Yield batches of (id, text, key) for foods whose embedding is missing or
+    whose text / model hash differs from the one stored with the embedding.
+    """
+    # server-side cursor, so only a window of rows is in memory at a time
+    with conn.cursor(name="pending_embeddings", withhold=True) as cur:
+        cur.itersize = batch_size * 10
+        cur.execute("""
+            SELECT id, name, key_ingredients, category_id,
+                   embedding IS NULL, embedding_hash
+            FROM food
+            WHERE id > %s
+            ORDER BY id
+        """, (after_id,))
+        batch = []
+        for food_id, name, key_ingredients, category_id, missing, stored_hash in cur:
+            text = prepare_embedding_text(name, key_ingredients, category_id)
+            key = embedding_cache.cache_key(text, EMBEDDING_ID)
+            if missing or key != stored_hash:
+                batch.append((food_id, text, key))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+# ---------------- Write side: COPY into staging + one UPDATE ----------------
+def write_embeddings(conn, ids, keys, embeddings, new_items):
+    with conn.transaction():
+        embedding_cache.store(conn, EMBEDDING_ID, new_items)
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE IF NOT EXISTS food_embedding_stage (
+                    id int PRIMARY KEY, embedding vector, embedding_hash text
+                ) ON COMMIT DELETE ROWS
+            """)
+            with cur.copy("COPY food_embedding_stage (id, embedding, embedding_hash) FROM STDIN") as copy:
+                for food_id, key, emb in zip(ids, keys, embeddings):
+                    copy.write_row((food_id, np.asarray(emb, dtype=np.float32), key))
+            cur.execute("""
+                UPDATE food f
+                SET embedding = s.embedding,
+                    embedding_model = %s,
+                    embedding_hash = s.embedding_hash
+                FROM food_embedding_stage s
+                WHERE f.id = s.id
+            """, (EMBEDDING_ID,))
+            bump_embeddings_version(cur)
+
+
+# ---------------- Checkpoint ----------------
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("last_id", 0) if data.get("model") == EMBEDDING_ID else 0
+
+
+def save_checkpoint(path, last_id):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_id": last_id, "model": EMBEDDING_ID}, f)
+    os.replace(tmp, path)
+
+
+# ---------------- Pipeline ----------------
+def run(batch_size=BATCH_SIZE, concurrency=CONCURRENCY, checkpoint=CHECKPOINT_FILE, restart=False):
+    read_conn, write_conn = get_conn(), get_conn()
+    ensure_schema(write_conn)
+    after_id = 0 if restart else load_checkpoint(checkpoint)
+    if after_id:
+        print(f"Resuming after food id {after_id}")
+
+    limiter = AdaptiveRateLimiter()
+    inflight = deque()
+    done = 0
+    started = time.monotonic()
+
+    def drain_one():
+        nonlocal done
+        # results are written in submission order so the checkpoint only moves
+        # past ids whose embeddings are committed
+        ids, keys, cached, miss_keys, future = inflight.popleft()
+        fresh = list(zip(miss_keys, future.result())) if future else []
+        by_key = dict(cached)
+        by_key.update(fresh)
+        write_embeddings(write_conn, ids, keys, [by_key[k] for k in keys], fresh)
+        save_checkpoint(checkpoint, ids[-1])
+        done += len(ids)
+        rate = done / max(time.monotonic() - started, 1e-9)
+        print(f"{done} foods embedded ({len(fresh)} new, {rate:.1f}/s, limiter {limiter.rate:.1f} req/s)")
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for batch in stream_pending(read_conn, after_id, batch_size):
+                ids = [b[0] for b in batch]
+                keys = [b[2] for b in batch]
+                # unchanged texts (or texts embedded for another food) come from the cache
+                cached = embedding_cache.lookup(write_conn, keys)
+                miss = {}
+                for _, text, key in batch:
+                    if key not in cached:
+                        miss.setdefault(key, text)
+                future = pool.submit(embed_with_retry, list(miss.values()), limiter) if miss else None
+                inflight.append((ids, keys, cached, list(miss), future))
+                if len(inflight) >= concurrency:
+                    drain_one()
+            while inflight:
+                drain_one()
+    finally:
+        put_conn(read_conn)
+        put_conn(write_conn)
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    print("Food embeddings added successfully!")
 
-    conn.commit()
-    time.sleep(RATE_LIMIT_SLEEP)  # respect rate limits
 
-cur.close()
-conn.close()
-print("Food embeddings added successfully!")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed foods with missing or stale embeddings.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE)
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+    run(args.batch_size, args.concurrency, args.checkpoint, args.restart)
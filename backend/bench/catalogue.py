@@ -0,0 +1,93 @@
+"""
+Synthetic recipe catalogue in the shape of recipes_with_key_ingredients.json.
+
+    export PYTHONPATH=backend     # from the repository root
+    python -m bench.catalogue bench_recipes.json --foods 20000 --branching 6 --depth 3
+    python load_herarchy_db.py bench_recipes.json
+    EMBEDDER=fake python add_embeddings.py
+"""
+import json
+import random
+import argparse
+
+INGREDIENTS = [
+    "olive oil", "butter", "garlic", "onion", "salt", "black pepper", "flour", "sugar", "eggs",
+    "milk", "heavy cream", "soy sauce", "lemon juice", "chicken breast", "ground beef", "pork loin",
+    "shrimp", "salmon", "tofu", "rice", "pasta", "potatoes", "carrots", "celery", "tomatoes",
+    "bell pepper", "mushrooms", "spinach", "basil", "oregano", "cumin", "paprika", "chili powder",
+    "ginger", "cilantro", "parmesan", "cheddar", "mozzarella", "black beans", "chickpeas",
+    "coconut milk", "honey", "vanilla extract", "cinnamon", "chocolate chips", "oats", "yogurt",
+]
+CATEGORY_WORDS = [
+    "Main Dish", "Side Dish", "Dessert", "Soup", "Salad", "Bread", "Breakfast", "Appetizer",
+    "Drinks", "Sauces", "Grilling", "Baking", "Vegetarian", "Seafood", "Poultry", "Pasta",
+]
+DISH_WORDS = [
+    "Roasted", "Spicy", "Creamy", "Easy", "Classic", "Slow Cooker", "Grilled", "Baked",
+    "Crispy", "Honey", "Lemon", "Garlic", "Smoky", "Quick", "Homestyle", "Herbed",
+]
+
+
+def category_paths(branching, depth, rng):
+    """Leaf paths of a tree with `branching` children per node, `depth` levels deep."""
+    paths = [()]
+    for level in range(depth):
+        paths = [
+            p + (f"{rng.choice(CATEGORY_WORDS)} {level + 1}.{i + 1}",)
+            for p in paths for i in range(branching)
+        ]
+    return paths
+
+
+def nutrition(rng):
+    # the source file maps the value to the nutrient name
+    return {
+        str(rng.randint(40, 900)): "Calories",
+        f"{rng.randint(0, 60)}g": "Fat",
+        f"{rng.randint(0, 120)}g": "Carbs",
+        f"{rng.randint(0, 70)}g": "Protein",
+    }
+
+
+def generate(foods, branching=6, depth=3, seed=0):
+    rng = random.Random(seed)
+    leaves = category_paths(branching, depth, rng)
+    for i in range(foods):
+        ingredients = rng.sample(INGREDIENTS, rng.randint(4, 12))
+        yield {
+            "name": f"{rng.choice(DISH_WORDS)} {ingredients[0].title()} {i + 1}",
+            "ingredients": ingredients,
+            "category": list(rng.choice(leaves)),
+            "nutrition": nutrition(rng),
+            "url": f"https://example.invalid/recipe/{i + 1}/",
+            "general_name": ingredients[0].title(),
+            "key_ingredients": ingredients[:5],
+        }
+
+
+def write(path, foods, branching=6, depth=3, seed=0):
+    """Stream the catalogue to `path` as one JSON array, one record at a time."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i, record in enumerate(generate(foods, branching, depth, seed)):
+            if i:
+                f.write(",\n")
+            json.dump(record, f)
+        f.write("\n]\n")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default="bench_recipes.json")
+    parser.add_argument("--foods", type=int, default=20000)
+    parser.add_argument("--branching", type=int, default=6, help="child categories per category")
+    parser.add_argument("--depth", type=int, default=3, help="category levels")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write(args.path, args.foods, args.branching, args.depth, args.seed)
+    print(f"{args.path}: {args.foods} foods, {args.branching ** args.depth} leaf categories")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Simulated users driving the swipe loop over HTTP.
+
+Start the backend with the offline clients, against a catalogue loaded from
+bench.catalogue, then point the driver at it:
+
+    cd backend
+    SESSION_BACKEND=file INSIGHTS_CLIENT=stub uvicorn main:app --workers 4
+    python -m bench.load --users 200 --concurrency 50 --swipes 20 --json run.json
+    python -m bench.load --users 200 --concurrency 50 --compare run.json
+
+Each user runs start → (next → swipe) × swipes → super, or with --swipe-next
+start → next → swipe-next × swipes → super. Several workers need a shared
+session backend (SESSION_BACKEND=file or redis); the default local one is
+for a single worker. Every user draws its swipes from its own RNG seeded
+from --seed and the user's number, so runs are reproducible regardless of
+how the coroutines interleave.
+"""
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+ROUTES = ("start", "next", "swipe", "swipe-next", "super")
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+
+    async def call(self, route, request):
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.errors[route] += 1
+            return None
+        self.latencies[route].append(time.perf_counter() - started)
+        # 404 from /next is the normal "no more recommendations"
+        if response.status_code >= 400 and not (route == "next" and response.status_code == 404):
+            self.errors[route] += 1
+        return response
+
+    def report(self, elapsed):
+        out = {}
+        for route in ROUTES:
+            values = sorted(self.latencies[route])
+            if not values and not self.errors[route]:
+                continue
+            out[route] = {
+                "requests": len(values),
+                "errors": self.errors[route],
+                "rps": round(len(values) / elapsed, 1),
+                "mean_ms": round(1000 * sum(values) / len(values), 2) if values else None,
+                **{f"p{p}_ms": round(1000 * percentile(values, p), 2) if values else None for p in (50, 95, 99)},
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        out["all"] = {
+            "requests": total,
+            "errors": sum(self.errors.values()),
+            "rps": round(total / elapsed, 1),
+        }
+        return out
+
+
+def choose_action(card, rng):
+    # most cards are rejected, a few liked
+    return "right" if rng.random() < (0.5 if card["type"] == "category" else 0.3) else "left"
+
+
+async def simulate_user(client, rec, swipes, swipe_next, rng):
+    # swipe_sessions.id is a uuid column, like the ids the frontend generates
+    sid = str(uuid.uuid4())
+    await rec.call("start", client.get(f"/start/{sid}"))
+
+    response = await rec.call("next", client.get(f"/next/{sid}"))
+    card = response.json() if response is not None and response.status_code == 200 else None
+    for _ in range(swipes):
+        if card is None:
+            break
+        action = choose_action(card, rng)
+        path = f"/{sid}/{card['id']}/{action}"
+        params = {"item_type": card["type"]}
+        if swipe_next:
+            response = await rec.call("swipe-next", client.post("/swipe-next" + path, params=params))
+            cards = response.json().get("next") if response is not None and response.status_code == 200 else None
+            card = cards[0] if cards else None
+        else:
+            await rec.call("swipe", client.post("/swipe" + path, params=params))
+            response = await rec.call("next", client.get(f"/next/{sid}"))
+            card = response.json() if response is not None and response.status_code == 200 else None
+
+    await rec.call("super", client.post(f"/super/{sid}"))
+
+
+async def run(base_url, users, concurrency, swipes, swipe_next=False, seed=0, timeout=30.0):
+    rec = Recorder()
+    gate = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def one(user):
+            async with gate:
+                await simulate_user(client, rec, swipes, swipe_next, random.Random(f"{seed}:{user}"))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(user) for user in range(users)))
+        elapsed = time.perf_counter() - started
+    return rec.report(elapsed), elapsed
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report, baseline=None):
+    print(f"{'route':<12}{'reqs':>8}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, r in report.items():
+        if route == "all":
+            continue
+        cols = [f"{r[k]:.2f}" if r[k] is not None else "-" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        if baseline and route in baseline and baseline[route].get("p95_ms") and r["p95_ms"] is not None:
+            change = 100 * (r["p95_ms"] / baseline[route]["p95_ms"] - 1)
+            cols[1] += f" ({change:+.0f}%)"
+        print(f"{route:<12}{r['requests']:>8}{r['errors']:>6}{r['rps']:>9}" + "".join(f"{c:>10}" for c in cols))
+    a = report["all"]
+    print(f"{'all':<12}{a['requests']:>8}{a['errors']:>6}{a['rps']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=100, help="simulated sessions in total")
+    parser.add_argument("--concurrency", type=int, default=20, help="sessions running at once")
+    parser.add_argument("--swipes", type=int, default=20, help="swipes per session")
+    parser.add_argument("--swipe-next", action="store_true", help="use the combined /swipe-next endpoint")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run to compare p95 against")
+    args = parser.parse_args()
+
+    report, elapsed = asyncio.run(run(args.url, args.users, args.concurrency, args.swipes,
+                                      args.swipe_next, args.seed))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["routes"]
+
+    print(f"{args.users} users, concurrency {args.concurrency}, {args.swipes} swipes each, {elapsed:.1f}s")
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "revision": git_revision(),
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "config": vars(args),
+                "elapsed_s": round(elapsed, 2),
+                "routes": report,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
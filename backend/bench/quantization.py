@@ -0,0 +1,114 @@
+"""
+Recall-vs-memory benchmark for the compact (quantized / PCA-reduced) index.
+
+    cd backend
+    python -m bench.quantization --from-db            # the real catalogue
+    python -m bench.quantization --synthetic 50000    # offline
+"""
+import json
+import time
+import argparse
+import numpy as np
+from utils.vector_index import BruteForceIndex, CompactIndex
+
+CONFIGS = [
+    ("float16", 0),
+    ("int8", 0),
+    ("float16", 256),
+    ("int8", 256),
+    ("int8", 128),
+    ("int8", 64),
+]
+
+
+def synthetic_catalogue(n, dim, clusters=64, seed=0):
+    """Clustered unit vectors, roughly shaped like text embeddings of a food catalogue."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    matrix = centres[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.arange(1, n + 1, dtype=np.int64), matrix
+
+
+def db_catalogue():
+    from utils.db import connection
+    from utils.vector_index import fetch_embeddings
+    with connection() as conn:
+        return fetch_embeddings(conn)
+
+
+def intent_queries(matrix, count, seed=1):
+    """Queries shaped like intent vectors: signed averages of a few swiped foods."""
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(matrix), (count, 4))
+    signs = rng.choice([1.0, 1.0, 3.0, -1.0], (count, 4)).astype(np.float32)
+    return np.einsum("qk,qkd->qd", signs, matrix[picks]) / 4
+
+
+def recall(truth, got):
+    return len(set(truth) & set(got)) / max(len(truth), 1)
+
+
+def run(ids, matrix, queries, k, rescore):
+    exact = BruteForceIndex().build(ids, matrix)
+    truth = [exact.search(q, k) for q in queries]
+    row_of = {int(i): r for r, i in enumerate(exact.ids)}
+    results = [{
+        "config": "float32",
+        "bytes_per_vector": int(matrix.shape[1] * 4),
+        "total_mb": round(exact.matrix.nbytes / 1e6, 2),
+        "recall": 1.0,
+        "query_ms": None,
+    }]
+
+    for codec, pca_dim in CONFIGS:
+        if pca_dim and pca_dim >= matrix.shape[1]:
+            continue
+        started = time.perf_counter()
+        index = CompactIndex(codec, pca_dim, rescore).build(ids, matrix)
+        build_s = time.perf_counter() - started
+        for use_rescore in ([False, True] if rescore else [False]):
+            # rescoring reads the exact vectors from memory here, from Postgres in the app
+            index.full_vectors = (lambda c: exact.matrix[[row_of[int(i)] for i in c]]) if use_rescore else None
+            started = time.perf_counter()
+            got = [index.search(index.to_index_space(q), k) for q in queries]
+            elapsed = time.perf_counter() - started
+            name = f"{codec}" + (f"+pca{pca_dim}" if pca_dim else "") + (f"+rescore{rescore}" if use_rescore else "")
+            results.append({
+                "config": name,
+                "bytes_per_vector": round(index.store.nbytes() / len(ids), 1),
+                "total_mb": round(index.store.nbytes() / 1e6, 2),
+                "recall": round(float(np.mean([recall(t, g) for t, g in zip(truth, got)])), 4),
+                "query_ms": round(1000 * elapsed / len(queries), 3),
+                "build_s": round(build_s, 2),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-db", action="store_true", help="benchmark the embeddings in the food table")
+    parser.add_argument("--synthetic", type=int, default=20000, help="catalogue size when not using --from-db")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=4)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    ids, matrix = db_catalogue() if args.from_db else synthetic_catalogue(args.synthetic, args.dim)
+    queries = intent_queries(matrix, args.queries)
+    results = run(ids, matrix, queries, args.k, args.rescore)
+
+    print(f"{len(ids)} vectors x {matrix.shape[1]} dims, recall@{args.k} over {args.queries} queries")
+    print(f"{'config':<28}{'bytes/vec':>10}{'MB':>10}{'recall':>9}{'ms/query':>10}")
+    for r in results:
+        ms = "-" if r["query_ms"] is None else f"{r['query_ms']:.3f}"
+        print(f"{r['config']:<28}{r['bytes_per_vector']:>10}{r['total_mb']:>10}{r['recall']:>9}{ms:>10}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"n": len(ids), "dim": int(matrix.shape[1]), "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
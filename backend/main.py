@@ -1,12 +1,97 @@
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from recommender import SwipeBrain
-from utils.db import get_conn
+from utils.db import connection, apool, async_connection, get_adb, pool_stats, hot_statement, SAMPLE_SESSION_ID
+from utils.session_store import session_store, ensure_schema as ensure_session_schema
+from utils.session_backends import check_workers
+from utils.category_tree import category_tree
+from utils.vector_index import vector_index, get_vector_index, reload_if_stale
+from utils.centroids import category_centroids, CATEGORY_RERANK
+from utils.nutrition import NutritionFilter, ensure_schema as ensure_nutrition_schema, nutrition_columns
+from utils.neighbor_graph import neighbor_graph, GRAPH_WALK
+from utils.retention import check_schema as check_retention_schema
+from utils.warmup import warmup
+from utils.metrics import registry, request_seconds, METRICS_ENABLED
 from psycopg import OperationalError
-from fastapi.responses import FileResponse
+from psycopg_pool import PoolTimeout
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, PlainTextResponse
+from contextlib import asynccontextmanager, nullcontext
 import pathlib
+import time
+import asyncio
+import json
+import os
+import logging
 
-app = FastAPI()
+# module loggers (utils.*, slow_query) go to stderr next to uvicorn's own log
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# send the swipe-next statements through a psycopg pipeline
+DB_PIPELINE = os.getenv("DB_PIPELINE", "0") == "1"
+
+
+def reload_indexes(conn):
+    """Rebuild the in-memory vector index, and what is derived from it, once new embeddings land."""
+    index = reload_if_stale(conn)
+    if index is None:
+        return
+    if hasattr(index, "to_storage_space"):
+        session_store.intent_codec = index
+    if GRAPH_WALK:
+        # only a graph rebuilt by build_neighbors.py for the new catalogue replaces the old one
+        neighbor_graph.load(conn)
+    if CATEGORY_RERANK:
+        category_centroids.load(conn, category_tree, get_vector_index())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the default local session backend is per-worker memory: one worker only
+    check_workers(session_store.backend)
+    # load the static category tree once so navigation never hits the DB
+    with connection() as conn:
+        category_tree.load(conn)
+        # typed nutrition columns + their columnar copy for in-memory filtering
+        ensure_nutrition_schema(conn)
+        nutrition_columns.load(conn)
+        # swipe_sessions.last_active + session_archive, created by maintain_sessions.py --migrate
+        check_retention_schema(conn)
+        # session_memory.version, guards the write-behind flush against stale copies
+        ensure_session_schema(conn)
+        # no-op for pgvector, builds the NumPy / IVF index otherwise
+        vector_index.load(conn)
+        if GRAPH_WALK:
+            # memory-mapped neighbour lists written by build_neighbors.py
+            neighbor_graph.load(conn)
+        if CATEGORY_RERANK:
+            # centroids in the vector space of the index that will answer searches
+            category_centroids.load(conn, category_tree, get_vector_index())
+    if hasattr(vector_index, "to_storage_space"):
+        session_store.intent_codec = vector_index
+    # DB_POOL_MIN_SIZE connections, each configured (pgvector types, prepared statements)
+    await apool.open(wait=True)
+    # session state is cached in memory and written back in batches
+    flusher = asyncio.create_task(session_store.run_flusher(async_connection))
+    # picks up categories / foods ingested while the app is running; new foods
+    # need their nutrition values too, or any nutrition filter drops them, and
+    # the in-memory vector index once add_embeddings.py has embedded them
+    refresher = asyncio.create_task(category_tree.run_refresher(
+        connection, dependents=(nutrition_columns,), checks=(reload_indexes,)))
+    # prewarm caches and run sample searches; /ready answers 503 until done
+    warming = asyncio.create_task(warmup.run(apool, async_connection))
+    yield
+    # stop taking new traffic while draining
+    warmup.set_ready(False)
+    warming.cancel()
+    refresher.cancel()
+    flusher.cancel()
+    async with async_connection() as conn:
+        await session_store.flush(conn)
+    await session_store.backend.close()
+    await apool.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,140 +103,231 @@ app.add_middleware(
 
 BASE_DIR = pathlib.Path(__file__).parent
 
-# ---------------- Persistent connections per session ----------------
-session_conns = {}
+# ---------------- Metrics ----------------
+if METRICS_ENABLED:
+    @app.middleware("http")
+    async def time_requests(request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # label by route template so session ids do not explode the series
+            route = request.scope.get("route")
+            request_seconds.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=route.path if route is not None else "unmatched",
+                status=status,
+            )
+
+# ---------------- Request-scoped connections ----------------
+# Every handler borrows one connection from the pool through `get_adb` and
+# hands it back when the response is sent, so the number of open
+# connections follows concurrent requests, not sessions ever started.
+
+@app.exception_handler(PoolTimeout)
+def pool_timeout_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Server busy. Please try again."})
+
+@app.exception_handler(OperationalError)
+def operational_error_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": "Database connection lost. Please try again."})
+
+SESSION_EXISTS_SQL = hot_statement("SELECT 1 FROM swipe_sessions WHERE id=%s", (SAMPLE_SESSION_ID,))
+
+async def require_session(conn, sid: str):
+    # a session cached by this worker passed this check when it was loaded
+    if session_store.holds(sid):
+        return
+    async with conn.cursor() as cur:
+        await cur.execute(SESSION_EXISTS_SQL, (sid,))
+        if not await cur.fetchone():
+            raise HTTPException(status_code=404, detail="Session not found")
 
 @app.get("/start/{sid}")
-def start_session(sid:str):
-    
-    # create and store a persistent connection for this session
-    conn = get_conn()
-    session_conns[sid] = conn
-    with conn.cursor() as cur:
-        cur.execute("INSERT INTO swipe_sessions(id) VALUES(%s) ON CONFLICT DO NOTHING", (sid,))
-        conn.commit()
+async def start_session(sid:str, conn=Depends(get_adb)):
+    async with conn.cursor() as cur:
+        await cur.execute("""
+            INSERT INTO swipe_sessions(id) VALUES(%s)
+            ON CONFLICT (id) DO UPDATE SET last_active = now()
+        """, (sid,))
+        await conn.commit()
     return {"session_id": sid}
 
-def get_session_conn(sid: str):
-    """Get existing connection or create new one if session exists in DB"""
-    conn = session_conns.get(sid)
-    
-    # Check if connection exists and is still alive
-    if conn:
-        try:
-            # Test if connection is still alive
-            with conn.cursor() as cur:
-                cur.execute("SELECT 1")
-        except (OperationalError, Exception):
-            # Connection is dead, remove it and create a new one
-            try:
-                conn.close()
-            except:
-                pass
-            conn = None
-            session_conns.pop(sid, None)
-    
-    # Create new connection if needed
-    if not conn:
-        conn = get_conn()
-        with conn.cursor() as cur:
-            cur.execute("SELECT id FROM swipe_sessions WHERE id=%s", (sid,))
-            if not cur.fetchone():
-                conn.close()
-                raise HTTPException(status_code=404, detail="Session not found")
-        session_conns[sid] = conn
-    
-    return conn
-
-# Update your super_swipe endpoint
 @app.post("/super/{sid}")
-def super_swipe(sid: str):
-    try:
-        conn = get_session_conn(sid)
-        brain = SwipeBrain(sid, conn)
-        stats = brain.get_stats()
-        return stats
-    except HTTPException:
-        raise
-    except OperationalError as e:
-        # Connection died during operation, clean up and retry once
-        session_conns.pop(sid, None)
+async def super_swipe(sid: str):
+    # no request-scoped connection: the insight LLM call must not hold one
+    async with async_connection() as conn:
+        await require_session(conn, sid)
         try:
-            conn = get_session_conn(sid)
             brain = SwipeBrain(sid, conn)
-            stats = brain.get_stats()
-            return stats
-        except Exception as retry_error:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(retry_error)}")
+            summary = await brain.summary()
+        except (HTTPException, OperationalError):
+            raise
+        except Exception as e:
+            await conn.rollback()
+            raise HTTPException(status_code=500, detail=str(e))
+    try:
+        return await brain.get_stats(summary)
     except Exception as e:
-        # For other errors, try to rollback if connection is still alive
-        conn = session_conns.get(sid)
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                # Connection is dead, remove it
-                session_conns.pop(sid, None)
         raise HTTPException(status_code=500, detail=str(e))
 
-# Update next_food endpoint
+def card(item, item_type):
+    return {
+        "id": item[0],
+        "name": item[1],
+        "ingredients": item[2] if item_type == "food" else [],
+        "type": item_type
+    }
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stats_events(sid: str):
+    """
+    Server-sent events for the stats screen: `stats` as soon as the counts are
+    in, then `token` chunks of the insight, then `done`. The insight summary
+    query runs on its own connection, concurrently with the counts; the
+    connection goes back to the pool before the multi-second LLM stream.
+    """
+    tokens = asyncio.Queue()
+
+    async def produce():
+        try:
+            async with async_connection() as conn:
+                brain = SwipeBrain(sid, conn)
+                summary = await brain.summary()
+            async for token in brain.stream_insights(summary):
+                await tokens.put(("token", token))
+        except Exception as e:
+            await tokens.put(("insight_error", str(e)))
+        await tokens.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        async with async_connection() as conn:
+            yield sse("stats", await SwipeBrain(sid, conn).get_counts())
+        while (item := await tokens.get()) is not None:
+            event, text = item
+            yield sse(event, {"text": text} if event == "token" else {"detail": text})
+        yield sse("done", {})
+    finally:
+        producer.cancel()
+
+@app.get("/super/{sid}/stream")
+async def super_stream(sid: str):
+    async with async_connection() as conn:
+        await require_session(conn, sid)
+    return StreamingResponse(
+        stats_events(sid),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/next/{sid}")
-def next_food(sid: str):
+async def next_food(sid: str, k: int = Query(1, ge=1, le=50), conn=Depends(get_adb)):
+    await require_session(conn, sid)
     try:
-        conn = get_session_conn(sid)
         brain = SwipeBrain(sid, conn)
-        item, item_type = brain.next()
-        if not item:
+        batch = await brain.next_batch(k)
+        if not batch:
             raise HTTPException(status_code=404, detail="No more recommendations")
-        return {
-            "id": item[0],
-            "name": item[1],
-            "ingredients": item[2] if item_type == "food" else [],
-            "type": item_type
-        }
-    except HTTPException:
+        # k=1 keeps the original single-object response
+        if k == 1:
+            return card(*batch[0])
+        return [card(item, item_type) for item, item_type in batch]
+    except (HTTPException, OperationalError):
         raise
-    except OperationalError:
-        session_conns.pop(sid, None)
-        raise HTTPException(status_code=500, detail="Database connection lost. Please try again.")
     except Exception as e:
-        conn = session_conns.get(sid)
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                session_conns.pop(sid, None)
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-# Update swipe endpoint
 @app.post("/swipe/{sid}/{item_id}/{action}")
-def swipe(sid: str, item_id: int, action: str, item_type: str = Query("food")):
+async def swipe(sid: str, item_id: int, action: str, item_type: str = Query("food"), conn=Depends(get_adb)):
     if action not in ["left", "right", "super"]:
         raise HTTPException(status_code=400, detail="Invalid swipe action")
-    
+    await require_session(conn, sid)
     try:
-        conn = get_session_conn(sid)
         brain = SwipeBrain(sid, conn)
-        brain.update(item_id, action, item_type)
+        await brain.update(item_id, action, item_type)
         return {"ok": True}
-    except HTTPException:
+    except (HTTPException, OperationalError):
         raise
-    except OperationalError:
-        session_conns.pop(sid, None)
-        raise HTTPException(status_code=500, detail="Database connection lost. Please try again.")
     except Exception as e:
-        conn = session_conns.get(sid)
-        if conn:
-            try:
-                conn.rollback()
-            except:
-                session_conns.pop(sid, None)
+        await conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/swipe-next/{sid}/{item_id}/{action}")
+async def swipe_and_next(sid: str, item_id: int, action: str, item_type: str = Query("food"),
+                         k: int = Query(1, ge=1, le=50), conn=Depends(get_adb)):
+    """Record a swipe and return the next card(s) in one request and one transaction."""
+    if action not in ["left", "right", "super"]:
+        raise HTTPException(status_code=400, detail="Invalid swipe action")
+    brain = SwipeBrain(sid, conn)
+    snapshot = None
+    try:
+        try:
+            async with conn.transaction():
+                pipeline = conn.pipeline() if DB_PIPELINE else nullcontext()
+                async with pipeline:
+                    await require_session(conn, sid)
+                    snapshot = session_store.snapshot(await brain._load_state())
+                    await brain.update(item_id, action, item_type)
+                    batch = await brain.next_batch(k)
+        except BaseException:
+            # the transaction rolled the swipe back; the cached state must follow
+            if snapshot is not None:
+                await session_store.restore(brain.state, snapshot)
+            raise
+        return {"ok": True, "next": [card(item, t) for item, t in batch]}
+    except (HTTPException, OperationalError):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/nutrition/{sid}")
+async def get_nutrition(sid: str, conn=Depends(get_adb)):
+    await require_session(conn, sid)
+    state = await SwipeBrain(sid, conn)._load_state()
+    return state.nutrition.to_json()
+
+@app.post("/nutrition/{sid}")
+async def set_nutrition(sid: str,
+                        min_calories: float | None = None, max_calories: float | None = None,
+                        min_fat: float | None = None, max_fat: float | None = None,
+                        min_carbs: float | None = None, max_carbs: float | None = None,
+                        min_protein: float | None = None, max_protein: float | None = None,
+                        conn=Depends(get_adb)):
+    """Set the session's nutrition bounds (per serving); no parameters clears them."""
+    await require_session(conn, sid)
+    nutrition = NutritionFilter.from_params(
+        min_calories=min_calories, max_calories=max_calories, min_fat=min_fat, max_fat=max_fat,
+        min_carbs=min_carbs, max_carbs=max_carbs, min_protein=min_protein, max_protein=max_protein,
+    )
+    return await SwipeBrain(sid, conn).set_nutrition(nutrition)
+
+@app.get("/pool")
+async def pool_metrics():
+    return pool_stats()
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def root():
     return {"message": "Backend is running"}
 
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the startup warm-up has finished."""
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"ready": False, "detail": "Warming up"})
+    return {"ready": True, "warmup_seconds": warmup.seconds, "warmup_error": warmup.error}
+
 @app.get("/favicon.ico")
 def favicon():
     return FileResponse(BASE_DIR / "favicon.ico")
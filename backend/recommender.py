@@ -1,307 +1,392 @@
 import random
-from utils.insights import generate_taste_insight 
+import numpy as np
+from utils.insights import cached_taste_insight, stream_taste_insight
+from utils.category_tree import category_tree
+from utils.centroids import category_centroids, RETRIEVAL_MODE, CATEGORY_RERANK
+from utils.neighbor_graph import neighbor_graph, GRAPH_WALK
+from utils.vector_index import get_vector_index
+from utils.session_store import session_store
+from utils.intent import (
+    new_intent, update_intent, is_meaningful_vector, intent_drift,
+    PREFETCH_SIZE, PREFETCH_DRIFT,
+)
+from utils.seen_set import sample_unseen, sample_unseen_k
+from utils.metrics import timed, timer, stage_seconds
+from utils.db import hot_statement, int4_list
 import math
 
-# At the top of your next() method or as a helper method
-def is_meaningful_vector(vec, threshold=1e-6):
-    """Check if vector has meaningful values (not all near-zero)"""
-    if vec is None:
-        return False
-    return any(abs(x) > threshold for x in vec)
+# unseen categories checked for remaining foods when the current one runs out
+FALLBACK_PROBES = 16
+
+FETCH_FOODS_SQL = hot_statement("""
+    SELECT id, name, key_ingredients
+    FROM food WHERE id = ANY(%s::int[])
+""", (int4_list([0]),))
+
 
 class SwipeBrain:
-    def __init__(self, session_id, conn):
+    def __init__(self, session_id, conn, store=session_store):
         self.session_id = session_id
         self.conn = conn
-        self.memory = None
-
-    # ---------------- Load or initialize session memory ----------------
-    def _load_memory(self):
-        if self.memory:
-            return self.memory
-
-        with self.conn.cursor() as cur:
-            cur.execute("""
-                SELECT current_category, intent_vector
-                FROM session_memory WHERE session_id=%s
-            """, (self.session_id,))
-            row = cur.fetchone()
-            if row:
-                self.memory = {"current_category": row[0], "intent_vector": row[1]}
-            else:
-                cur.execute("""
-                    INSERT INTO session_memory(session_id, current_category, intent_vector)
-                    VALUES (%s, NULL, NULL)
-                    ON CONFLICT DO NOTHING
-                """, (self.session_id,))
-                self.memory = {"current_category": None, "intent_vector": None}
-
-        return self.memory
-
-    # ---------------- Save session memory ----------------
-    def _save_memory(self):
-        mem = self.memory
-        with self.conn.cursor() as cur:
-            cur.execute("""
-                UPDATE session_memory
-                SET current_category=%s, intent_vector=%s
-                WHERE session_id=%s
-            """, (mem["current_category"], mem["intent_vector"], self.session_id))
-        self.conn.commit()
+        self.store = store
+        self.state = None
+        self.tree = category_tree
+        self.centroids = category_centroids
+        self.graph = neighbor_graph
+
+    # ---------------- Load session state (cached between requests) ----------------
+    async def _load_state(self):
+        if self.state is None:
+            self.state = await self.store.load(self.conn, self.session_id)
+            # a compact index keeps intent vectors in its own (reduced) space
+            index = get_vector_index()
+            if self.state.intent_vector is not None and hasattr(index, "to_index_space"):
+                self.state.intent_vector = index.to_index_space(self.state.intent_vector)
+        return self.state
+
+    # ---------------- Save session state (written back by the store) ----------------
+    def _save_state(self):
+        self.store.mark_dirty(self.state)
 
     # ---------------- Update swipe ----------------
-    def update(self, item_id, swipe_type, item_type):
-        mem = self._load_memory()
-        with self.conn.cursor() as cur:
+    @timed(stage_seconds, step="update")
+    async def update(self, item_id, swipe_type, item_type):
+        state = await self._load_state()
+        async with self.conn.cursor() as cur:
             if item_type == "category":
-                cur.execute("""
+                await cur.execute("""
                     INSERT INTO session_category(session_id, category_id, swipe_type)
                     VALUES (%s,%s,%s)
                 """, (self.session_id, item_id, swipe_type))
+                state.seen_categories.add(item_id)
+                state.queue = []
 
                 if swipe_type == "right":
-                    # move to child if exists
-                    cur.execute("SELECT id FROM categories WHERE parent_id=%s ORDER BY random() LIMIT 1", (item_id,))
-                    child = cur.fetchone()
-                    mem["current_category"] = child[0] if child else item_id
+                    # move to child if exists (the one closest to the intent when re-ranking)
+                    ranked = self._pick_categories(state, self.tree.children_of(item_id), (), 1)
+                    child = ranked[0] if ranked else None
+                    state.current_category = child if child is not None else item_id
                 else:
                     # left → pick sibling or parent
-                    cur.execute("SELECT parent_id FROM categories WHERE id=%s", (item_id,))
-                    par_row = cur.fetchone()
-                    parent = par_row[0] if par_row else None
+                    parent = self.tree.parent_of(item_id)
                     if parent is not None:
-                        cur.execute("""
-                            SELECT id FROM categories
-                            WHERE parent_id=%s AND id != %s
-                            ORDER BY random() LIMIT 1
-                        """, (parent, item_id))
-                        sibling = cur.fetchone()
-                        mem["current_category"] = sibling[0] if sibling else parent
+                        sibling = self.tree.random_sibling(item_id)
+                        state.current_category = sibling if sibling is not None else parent
                     else:
                         # pick random root category
-                        cur.execute("SELECT id FROM categories WHERE parent_id IS NULL AND id != %s ORDER BY random() LIMIT 1", (item_id,))
-                        root = cur.fetchone()
-                        mem["current_category"] = root[0] if root else None
+                        state.current_category = self.tree.random_root(exclude=(item_id,))
 
             elif item_type == "food":
-                cur.execute("""
+                await cur.execute("""
                     INSERT INTO session_food(session_id, food_id, swipe_type)
                     VALUES (%s,%s,%s)
                 """, (self.session_id, item_id, swipe_type))
+                state.seen_foods.add(item_id)
+                state.food_swipes += 1
+                state.remember_swipe(item_id, swipe_type)
 
-                # fetch embedding
-                cur.execute("SELECT embedding FROM food WHERE id=%s", (item_id,))
-                row = cur.fetchone()
-                embedding = row[0] if row else None
+                # embedding from the in-memory index, or the DB for pgvector
+                embedding = get_vector_index().vector(item_id)
+                if embedding is None:
+                    await cur.execute("SELECT embedding FROM food WHERE id=%s", (item_id,))
+                    row = await cur.fetchone()
+                    embedding = row[0] if row else None
 
                 if embedding is not None:
-                    if mem["intent_vector"] is None:
-                        mem["intent_vector"] = embedding
+                    if state.intent_vector is None:
+                        state.intent_vector = new_intent(embedding)
                     else:
-                        # running average with positive or negative factor
-                        cur.execute("""
-                            SELECT COUNT(*) FROM session_food
-                            WHERE session_id=%s
-                        """, (self.session_id,))
-                        n = cur.fetchone()[0] or 1
-                        factor = 0
-                        if swipe_type == "right":
-                            factor = 1
-                        elif swipe_type == "super":
-                            factor = 3
-                        else: 
-                            factor = -1
-                        mem["intent_vector"] = [
-                            (a*(n-1) + factor*b)/n
-                            for a,b in zip(mem["intent_vector"], embedding)
-                        ]
-        self._save_memory()
+                        # running average (or decay) with positive or negative factor
+                        update_intent(state.intent_vector, embedding, state.food_swipes, swipe_type)
+        self._save_state()
+        await self.store.publish(state)
 
     # ---------------- Next recommendation ----------------
-    def next(self):
-        mem = self._load_memory()
-        with self.conn.cursor() as cur:
-
+    async def next(self):
+        batch = await self.next_batch(1)
+        return batch[0] if batch else (None, None)
+
+    @timed(stage_seconds, step="next_batch")
+    async def next_batch(self, k=1):
+        """
+        Up to `k` recommendations of one type: [((id, name, ingredients), type), ...]
+
+        Planned iteratively against the in-memory tree: current category →
+        unvisited children → foods → fallback category. A call costs at most
+        one food lookup (vector search or in-memory sample) and one row fetch.
+        """
+        batch = await self._plan_next(k)
+        await self.store.publish(self.state)
+        return batch
+
+    async def _plan_next(self, k):
+        state = await self._load_state()
+
+        # at most two passes: the current category, then a fallback category
+        for _ in range(2):
             # ---------------- Pick category if no current category ----------------
-            if not mem["current_category"]:
-                cur.execute("""
-                    SELECT id, name FROM categories
-                    WHERE id NOT IN (
-                        SELECT category_id FROM session_category WHERE session_id=%s
-                    )
-                    ORDER BY random()
-                    LIMIT 1
-                """, (self.session_id,))
-                cat = cur.fetchone()
-                if cat:
-                    mem["current_category"] = cat[0]
-                    self._save_memory()
-                    return (cat[0], cat[1], []), "category"
-                else:
+            if not state.current_category:
+                cat = self._fallback_category(state)
+                if cat is None:
                     # All categories exhausted
-                    return None, None
+                    return []
+                state.current_category = cat
+                # prefetched foods were ranked for the previous category's scope
+                state.queue = []
+                self._save_state()
+                return [((cat, self.tree.name(cat), []), "category")]
 
             # ---------------- Check if category has children ----------------
-            cur.execute("SELECT id FROM categories WHERE parent_id=%s LIMIT 1", (mem["current_category"],))
-            child = cur.fetchone()
-            if child:
-                # Still has child categories → pick next unvisited child
-                cur.execute("""
-                    SELECT id, name FROM categories
-                    WHERE parent_id=%s AND id NOT IN (
-                        SELECT category_id FROM session_category WHERE session_id=%s
-                    )
-                    ORDER BY random()
-                    LIMIT 1
-                """, (mem["current_category"], self.session_id))
-                next_cat = cur.fetchone()
-                if next_cat:
-                    return (next_cat[0], next_cat[1], []), "category"
+            if self.tree.has_children(state.current_category):
+                # Still has child categories → pick next unvisited children
+                next_cats = self._pick_categories(
+                    state, self.tree.children_of(state.current_category), state.seen_categories, k
+                )
+                if next_cats:
+                    return [((c, self.tree.name(c), []), "category") for c in next_cats]
                 # No unvisited children → fall back to food
 
             # ---------------- Pick food in leaf category ----------------
-            if is_meaningful_vector(mem["intent_vector"]) :
-                cur.execute("""
-                    SELECT id, name, key_ingredients
-                    FROM food
-                    WHERE id NOT IN (
-                        SELECT food_id FROM session_food WHERE session_id=%s
-                    )
-                    ORDER BY embedding <-> %s::vector
-                    LIMIT 1
-                """, ( self.session_id, mem["intent_vector"]))
-            else:
-                cur.execute("""
-                    SELECT id, name, key_ingredients
-                    FROM food
-                    WHERE category_id=%s AND id NOT IN (
-                        SELECT food_id FROM session_food WHERE session_id=%s
-                    )
-                    ORDER BY random()
-                    LIMIT 1
-                """, (mem["current_category"], self.session_id))
-
-            f = cur.fetchone()
-            if f:
-                return (f[0], f[1], f[2]), "food"
+            foods = await self._fetch_foods(await self._pick_foods(state, k))
+            if foods:
+                return [(f, "food") for f in foods]
 
             # ---------------- No foods left → reset current_category ----------------
-            mem["current_category"] = None
-            self._save_memory()
-            # Recursively call next to pick a new category
-            return self.next()
-    def get_insights(self):
-        insights = ""
-        with self.conn.cursor() as cur:
-            cur.execute("""
-                SELECT c.name
-                FROM session_category sc
-                JOIN categories c ON sc.category_id = c.id
-                WHERE sc.session_id = %s
-                AND sc.swipe_type = 'right';
-                """,(self.session_id,))
-            liked_categories = cur.fetchall()
-
-            cur.execute("""
-                SELECT f.name, f.key_ingredients
-                FROM session_food sf
-                JOIN food f ON sf.food_id = f.id
-                WHERE sf.session_id = %s
-                AND sf.swipe_type = 'right';
-
-                """,(self.session_id,))
-            
-            liked_foods = cur.fetchall()
-
-            cur.execute("""
-                SELECT c.name
-                FROM session_category sc
-                JOIN categories c ON sc.category_id = c.id
-                WHERE sc.session_id = %s
-                AND sc.swipe_type = 'left';
-                """,(self.session_id,))
-            disliked_categories = cur.fetchall()
-
-            cur.execute("""
-                SELECT f.name, f.key_ingredients
-                FROM session_food sf
-                JOIN food f ON sf.food_id = f.id
-                WHERE sf.session_id = %s
-                AND sf.swipe_type = 'left';
-
-                """,(self.session_id,))
-            
-            disliked_foods = cur.fetchall()
-
-            cur.execute("""
-                SELECT f.name, f.key_ingredients
-                FROM session_food sf
-                JOIN food f ON sf.food_id = f.id
-                WHERE sf.session_id = %s
-                AND sf.swipe_type = 'super';
-
-                """,(self.session_id,))
-            super = cur.fetchone()
-            if not super :
-                            
-                cur.execute("""
-                SELECT c.name
-                FROM session_category sc
-                JOIN categories c ON sc.category_id = c.id
-                WHERE sc.session_id = %s
-                AND sc.swipe_type = 'super';
-
-                """,(self.session_id,))
-                super = cur.fetchone()
-
-            insights = generate_taste_insight(liked_foods, liked_categories,disliked_foods, disliked_categories,super)
-            return insights, super[0]
-
-    def get_stats(self) :
+            state.current_category = None
+            state.queue = []
+            self._save_state()
+        return []
+
+    async def _pick_foods(self, state, k):
+        # category mode: candidates are the foods of the current subtree
+        scoped = RETRIEVAL_MODE == "category"
+        within = self.tree.subtree_foods(state.current_category) if scoped else None
+
+        # graph walk: neighbours of recent likes, a lookup instead of a vector scan
+        if GRAPH_WALK and self.graph.ready and state.recent_likes:
+            picked = self.graph.walk(state.recent_likes, state.recent_dislikes, state.seen_foods, k,
+                                     allowed=self._food_filter(state, within))
+            if len(picked) >= k:
+                return picked
+            rest = await self._search_foods(state, k + len(picked), within)
+            return picked + [f for f in rest if f not in picked][:k - len(picked)]
+        return await self._search_foods(state, k, within)
+
+    def _food_filter(self, state, within):
+        """Mask function for the session's nutrition bounds and scope, or None."""
+        if within is None and not state.nutrition:
+            return None
+
+        def allowed(ids):
+            mask = state.nutrition.allows(ids) if state.nutrition else np.ones(len(ids), dtype=bool)
+            if within is not None:
+                mask &= np.isin(ids, within)
+            return mask
+        return allowed
+
+    async def _search_foods(self, state, k, within):
+        if is_meaningful_vector(state.intent_vector) :
+            return await self._nearest_foods(state, k, within)
+        # uniform unseen foods of the leaf, sampled against the seen bitmap
+        candidates = within if within is not None else self.tree.foods_in(state.current_category)
+        return sample_unseen_k(self._within_bounds(state, candidates), state.seen_foods, k)
+
+    @staticmethod
+    def _within_bounds(state, candidates):
+        """Candidates that pass the session's nutrition bounds (columnar, in-memory)."""
+        if not state.nutrition or not len(candidates):
+            return candidates
+        return candidates[state.nutrition.allows(candidates)]
+
+    def _fallback_category(self, state):
+        """
+        An unseen category that still leads to unseen foods, chosen among
+        FALLBACK_PROBES candidates, so the card shown is never a dead end
+        when a live one was found; all checks are in-memory.
+        """
+        picked = self._pick_categories(state, self.tree.ids, state.seen_categories, FALLBACK_PROBES)
+        for cat in picked:
+            foods = self._within_bounds(state, self.tree.subtree_foods(cat))
+            if sample_unseen(foods, state.seen_foods) is not None:
+                return cat
+        return picked[0] if picked else None
+
+    def _pick_categories(self, state, candidates, seen, k):
+        """Up to k unseen categories: nearest subtree centroids first when re-ranking, else random."""
+        if CATEGORY_RERANK and self.centroids.ready and is_meaningful_vector(state.intent_vector):
+            return self.centroids.nearest_unseen(candidates, state.intent_vector, seen, k)
+        return sample_unseen_k(candidates, seen, k)
+
+    @timed(stage_seconds, step="nearest_foods")
+    async def _nearest_foods(self, state, k, within=None):
+        """
+        Nearest unseen foods, served from the session's prefetch queue while
+        the intent vector has not drifted past PREFETCH_DRIFT since it was filled.
+        With `within`, only those foods are ranked, topped up from the whole
+        catalogue once fewer than k of them are left.
+        """
+        if state.queue and intent_drift(state.queue_anchor, state.intent_vector) <= PREFETCH_DRIFT:
+            queued = [f for f in state.queue if f not in state.seen_foods]
+            if within is not None and queued:
+                # only foods of the current scope, whatever category filled the queue
+                queued = [f for f, keep in zip(queued, np.isin(queued, within)) if keep]
+            if len(queued) >= k:
+                state.queue = queued[k:]
+                return queued[:k]
+
+        index = get_vector_index()
+        n = max(k, PREFETCH_SIZE)
+        where = state.nutrition or None
+        with timer(stage_seconds, step="vector_search"):
+            nearest = await index.asearch(
+                state.intent_vector, k=n, exclude=state.seen_foods, conn=self.conn,
+                within=within, where=where,
+            )
+        if within is not None and len(nearest) < k:
+            found = set(nearest)
+            extra = await index.asearch(
+                state.intent_vector, k=n + len(found), exclude=state.seen_foods, conn=self.conn, where=where
+            )
+            nearest += [f for f in extra if f not in found][:n - len(nearest)]
+        state.queue = nearest[k:]
+        state.queue_anchor = new_intent(state.intent_vector)
+        return nearest[:k]
+
+    async def set_nutrition(self, nutrition):
+        """Replace the session's nutrition bounds; prefetched foods were picked without them."""
+        state = await self._load_state()
+        state.nutrition = nutrition
+        state.queue = []
+        self._save_state()
+        await self.store.publish(state)
+        return nutrition.to_json()
+
+    @timed(stage_seconds, step="fetch_foods")
+    async def _fetch_foods(self, food_ids):
+        if not food_ids:
+            return []
+        async with self.conn.cursor() as cur:
+            await cur.execute(FETCH_FOODS_SQL, (int4_list(food_ids),))
+            rows = {r[0]: (r[0], r[1], r[2]) for r in await cur.fetchall()}
+        # keep ranking order
+        return [rows[i] for i in food_ids if i in rows]
+
+    # ---------------- Session summary (one aggregate query) ----------------
+    @timed(stage_seconds, step="summary")
+    async def summary(self):
+        """
+        Swipe counts and the liked / disliked / super items behind the insight.
+        Fetch it while holding a connection, then pass it to `get_stats` or
+        `stream_insights`, which need no connection for the LLM call.
+        """
+        async with self.conn.cursor() as cur:
+            await cur.execute("""
+                WITH s AS (
+                    SELECT 'food' AS kind, sf.swipe_type, f.name, f.key_ingredients
+                    FROM session_food sf
+                    JOIN food f ON sf.food_id = f.id
+                    WHERE sf.session_id = %s
+
+                    UNION ALL
+
+                    SELECT 'category', sc.swipe_type, c.name, NULL
+                    FROM session_category sc
+                    JOIN categories c ON sc.category_id = c.id
+                    WHERE sc.session_id = %s
+                )
+                SELECT
+                    COUNT(*) FILTER (WHERE swipe_type = 'left'),
+                    COUNT(*) FILTER (WHERE swipe_type = 'right'),
+                    COALESCE(json_agg(json_build_array(name, key_ingredients))
+                        FILTER (WHERE kind = 'food' AND swipe_type = 'right'), '[]'),
+                    COALESCE(json_agg(name) FILTER (WHERE kind = 'category' AND swipe_type = 'right'), '[]'),
+                    COALESCE(json_agg(json_build_array(name, key_ingredients))
+                        FILTER (WHERE kind = 'food' AND swipe_type = 'left'), '[]'),
+                    COALESCE(json_agg(name) FILTER (WHERE kind = 'category' AND swipe_type = 'left'), '[]'),
+                    (array_agg(json_build_array(name, key_ingredients))
+                        FILTER (WHERE kind = 'food' AND swipe_type = 'super'))[1],
+                    (array_agg(json_build_array(name, key_ingredients))
+                        FILTER (WHERE kind = 'category' AND swipe_type = 'super'))[1]
+                FROM s
+            """, (self.session_id, self.session_id))
+            row = await cur.fetchone()
+
+        left, right, liked_f, liked_c, disliked_f, disliked_c, super_f, super_c = row
+        super = super_f or super_c
+        return {
+            "left_swipes": left,
+            "right_swipes": right,
+            "liked_foods": [tuple(f) for f in liked_f],
+            "liked_categories": [(c,) for c in liked_c],
+            "disliked_foods": [tuple(f) for f in disliked_f],
+            "disliked_categories": [(c,) for c in disliked_c],
+            "super": tuple(super) if super else None,
+        }
+
+    # ---------------- Swipe counts + super item only (no insight inputs) ----------------
+    @timed(stage_seconds, step="counts")
+    async def get_counts(self):
+        async with self.conn.cursor() as cur:
+            await cur.execute("""
+                WITH s AS (
+                    SELECT swipe_type, food_id AS fid, NULL::int AS cid
+                    FROM session_food WHERE session_id = %s
+
+                    UNION ALL
+
+                    SELECT swipe_type, NULL, category_id
+                    FROM session_category WHERE session_id = %s
+                ), agg AS (
+                    SELECT
+                        COUNT(*) FILTER (WHERE swipe_type = 'left') AS left_swipes,
+                        COUNT(*) FILTER (WHERE swipe_type = 'right') AS right_swipes,
+                        (array_agg(fid) FILTER (WHERE swipe_type = 'super' AND fid IS NOT NULL))[1] AS super_fid,
+                        (array_agg(cid) FILTER (WHERE swipe_type = 'super' AND cid IS NOT NULL))[1] AS super_cid
+                    FROM s
+                )
+                SELECT agg.left_swipes, agg.right_swipes, COALESCE(f.name, c.name)
+                FROM agg
+                LEFT JOIN food f ON f.id = agg.super_fid
+                LEFT JOIN categories c ON c.id = agg.super_cid
+            """, (self.session_id, self.session_id))
+            left, right, super_name = await cur.fetchone()
+
+        stats = {'total_swipes': 1 + left + right, 'super_food': super_name}
+        if left:
+            stats['left_swipes'] = left
+        if right:
+            stats['right_swipes'] = right
+        return stats
+
+    async def stream_insights(self, summary=None):
+        """Yield insight text chunks; the summary query (unless given) runs before the first chunk."""
+        summary = summary or await self.summary()
+        async for token in stream_taste_insight(
+            summary["liked_foods"], summary["liked_categories"],
+            summary["disliked_foods"], summary["disliked_categories"], summary["super"],
+        ):
+            yield token
+
+    async def get_insights(self, summary=None):
+        summary = summary or await self.summary()
+        super = summary["super"]
+        insights = await cached_taste_insight(
+            summary["liked_foods"], summary["liked_categories"],
+            summary["disliked_foods"], summary["disliked_categories"], super,
+        )
+        return insights, super[0] if super else None
+
+    async def get_stats(self, summary=None) :
         stats = {}
         stats['total_swipes'] = 1
-        with self.conn.cursor() as cur:
-
-            cur.execute("""
-                    SELECT COUNT(*) AS total_left_swipes
-                    FROM (
-                        SELECT 1
-                        FROM session_food
-                        WHERE session_id = %s AND swipe_type = 'left'
-
-                        UNION ALL
-
-                        SELECT 1
-                        FROM session_category
-                        WHERE session_id = %s AND swipe_type = 'left'
-                    ) s
-                """,(self.session_id,self.session_id))
-            result = cur.fetchone()
-            left_swipes = result[0] if result else None
-            if left_swipes:
-                stats['left_swipes'] = left_swipes
-                stats['total_swipes'] += left_swipes
-
-            cur.execute("""
-                    SELECT COUNT(*) AS total_right_swipes
-                    FROM (
-                        SELECT 1
-                        FROM session_food
-                        WHERE session_id = %s AND swipe_type = 'right'
-
-                        UNION ALL
-
-                        SELECT 1
-                        FROM session_category
-                        WHERE session_id = %s AND swipe_type = 'right'
-                    ) s
-                """,(self.session_id,self.session_id))
-            result = cur.fetchone()
-            right_swipes = result[0] if result else None
-            if right_swipes:
-                stats['right_swipes'] = right_swipes
-                stats['total_swipes'] += right_swipes
-            
-            stats['insights'],stats['super_food'] = self.get_insights()
-            
-            return stats    
+        summary = summary or await self.summary()
+
+        if summary["left_swipes"]:
+            stats['left_swipes'] = summary["left_swipes"]
+            stats['total_swipes'] += summary["left_swipes"]
+        if summary["right_swipes"]:
+            stats['right_swipes'] = summary["right_swipes"]
+            stats['total_swipes'] += summary["right_swipes"]
+
+        stats['insights'],stats['super_food'] = await self.get_insights(summary)
+        return stats
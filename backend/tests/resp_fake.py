@@ -0,0 +1,98 @@
+"""
+In-process fake of a Redis-protocol server for tests: GET / SET [EX] / DEL /
+PING / AUTH / SELECT over a real TCP socket on 127.0.0.1.
+"""
+import time
+import asyncio
+
+
+class FakeRespServer:
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+        self.connections = 0
+        # seconds to hold back the reply to a GET of one of these keys
+        self.delays = {}
+        self._writers = set()
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def url(self):
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.port}/0"
+
+    async def stop(self):
+        self.drop_connections()
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self):
+        """Close every client connection, as a server restart would."""
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    @staticmethod
+    async def _read_command(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        assert line[:1] == b"*", line
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _get(self, key):
+        if key in self.expires and self.expires[key] < time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        authed = self.password is None
+        try:
+            while (args := await self._read_command(reader)) is not None:
+                name = args[0].decode().upper()
+                self.commands.append(name)
+                if name == "AUTH":
+                    authed = args[1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authed else b"-ERR invalid password\r\n")
+                elif not authed:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif name in ("PING", "SELECT"):
+                    writer.write(b"+PONG\r\n" if name == "PING" else b"+OK\r\n")
+                elif name == "GET":
+                    await asyncio.sleep(self.delays.get(args[1], 0))
+                    writer.write(self._bulk(self._get(args[1])))
+                elif name == "SET":
+                    self.data[args[1]] = args[2]
+                    self.expires.pop(args[1], None)
+                    if len(args) == 5 and args[3].upper() == b"EX":
+                        self.expires[args[1]] = time.time() + int(args[4])
+                    writer.write(b"+OK\r\n")
+                elif name == "DEL":
+                    removed = sum(self.data.pop(k, None) is not None for k in args[1:])
+                    writer.write(b":%d\r\n" % removed)
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
@@ -0,0 +1,36 @@
+import time
+import unittest
+from unittest import mock
+
+from utils import db
+
+
+class Conn:
+    """Stands in for a pooled connection: only its identity matters here."""
+
+
+class CheckoutCheckTest(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(db.ConnectionPool, "check_connection")
+        self.probe = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_fresh_connection_is_not_probed(self):
+        db._check(Conn())
+        self.probe.assert_not_called()
+
+    def test_recently_returned_connection_is_not_probed(self):
+        conn = Conn()
+        db._mark_returned(conn)
+        db._check(conn)
+        self.probe.assert_not_called()
+
+    def test_long_idle_connection_is_probed(self):
+        conn = Conn()
+        db._returned_at[conn] = time.monotonic() - db.DB_CHECK_IDLE - 1
+        db._check(conn)
+        self.probe.assert_called_once_with(conn)
+
+
+if __name__ == "__main__":
+    unittest.main()
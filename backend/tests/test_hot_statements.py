@@ -0,0 +1,78 @@
+import os
+import uuid
+import unittest
+
+import psycopg
+from pgvector.psycopg import register_vector_async
+
+import main  # noqa: F401  registers every hot statement
+from utils.db import HOT_STATEMENTS, prepare_hot, int4_list
+from utils.embedder import EMBEDDING_DIM
+from main import SESSION_EXISTS_SQL
+from recommender import FETCH_FOODS_SQL
+from utils.session_store import FETCH_MEMORY_SQL, FETCH_FOOD_SWIPES_SQL, FETCH_CATEGORY_SWIPES_SQL
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+# the tables of the README, in a throwaway schema
+SCHEMA = f"""
+    CREATE EXTENSION IF NOT EXISTS vector;
+    CREATE TABLE swipe_sessions (id uuid PRIMARY KEY);
+    CREATE TABLE categories (id int PRIMARY KEY, name text, parent_id int);
+    CREATE TABLE food (id int PRIMARY KEY, name text, category_id int,
+                       key_ingredients text[], embedding vector({EMBEDDING_DIM}));
+    CREATE TABLE session_memory (session_id uuid PRIMARY KEY, current_category int,
+                                 intent_vector vector({EMBEDDING_DIM}), nutrition_filter jsonb,
+                                 version bigint NOT NULL DEFAULT 0);
+    CREATE TABLE session_food (session_id uuid, food_id int, swipe_type text);
+    CREATE TABLE session_category (session_id uuid, category_id int, swipe_type text);
+"""
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL not set (a Postgres with pgvector)")
+class PrepareHotTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.conn = await psycopg.AsyncConnection.connect(TEST_DATABASE_URL, autocommit=True)
+        self.schema = f"hot_{uuid.uuid4().hex[:12]}"
+        await self.conn.execute(f"CREATE SCHEMA {self.schema}")
+        await self.conn.execute(f"SET search_path TO {self.schema}, public")
+        await self.conn.execute(SCHEMA)
+        await register_vector_async(self.conn)
+
+    async def asyncTearDown(self):
+        await self.conn.execute(f"DROP SCHEMA {self.schema} CASCADE")
+        await self.conn.close()
+
+    async def plan_counts(self):
+        cur = await self.conn.execute(
+            "SELECT statement, generic_plans + custom_plans FROM pg_prepared_statements"
+        )
+        return {statement.strip(): n for statement, n in await cur.fetchall()}
+
+    async def test_every_statement_is_prepared(self):
+        with self.assertNoLogs("utils.db", level="WARNING"):
+            await prepare_hot(self.conn)
+        prepared = await self.plan_counts()
+        self.assertEqual(len(prepared), len(HOT_STATEMENTS))
+
+    async def test_request_path_reuses_the_prepared_statements(self):
+        await prepare_hot(self.conn)
+        before = await self.plan_counts()
+        sid = str(uuid.uuid4())
+        # the params exactly as the request path passes them; ids past int2
+        for sql, params in (
+            (SESSION_EXISTS_SQL, (sid,)),
+            (FETCH_MEMORY_SQL, (sid,)),
+            (FETCH_FOOD_SWIPES_SQL, (sid,)),
+            (FETCH_CATEGORY_SWIPES_SQL, (sid,)),
+            (FETCH_FOODS_SQL, (int4_list([3, 40000]),)),
+        ):
+            await self.conn.execute(sql, params)
+        after = await self.plan_counts()
+        self.assertEqual(set(after), set(before))
+        for statement, n in after.items():
+            self.assertEqual(n, before[statement] + 1, statement)
+
+
+if __name__ == "__main__":
+    unittest.main()
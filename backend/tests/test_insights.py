@@ -0,0 +1,116 @@
+import asyncio
+import unittest
+
+from utils import insights
+from utils.insights import InsightCache, StubInsightClient, cached_taste_insight, stream_taste_insight
+
+
+LIKED = [("Pad Thai", ["rice noodles", "peanuts"]), ("Green Curry", ["coconut milk"])]
+CATEGORIES = [("Thai",)]
+DISLIKED = [("Caesar Salad", ["romaine"])]
+
+
+class StubClientTestCase(unittest.IsolatedAsyncioTestCase):
+    """A stub LLM and an empty cache per test."""
+
+    def setUp(self):
+        self.client = StubInsightClient()
+        previous_client, previous_cache = insights._client, insights.insight_cache
+        insights.set_client(self.client)
+        insights.insight_cache = InsightCache()
+        self.addCleanup(insights.set_client, previous_client)
+        self.addCleanup(setattr, insights, "insight_cache", previous_cache)
+
+    async def insight(self, liked=LIKED, super=None):
+        return await cached_taste_insight(liked, CATEGORIES, DISLIKED, [], super)
+
+
+class CachedInsightTest(StubClientTestCase):
+    async def test_unchanged_summary_is_a_cache_hit(self):
+        first = await self.insight()
+        self.assertIn("Pad Thai", first)
+        # the same swipes in another order build the same key
+        self.assertEqual(await self.insight(list(reversed(LIKED))), first)
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_new_swipe_is_a_miss(self):
+        await self.insight()
+        liked = LIKED + [("Tom Yum", ["lemongrass"])]
+        self.assertIn("Tom Yum", await self.insight(liked))
+        await self.insight(liked, super=("Tom Yum", ["lemongrass"]))
+        self.assertEqual(self.client.calls, 3)
+
+    async def test_concurrent_misses_share_one_call(self):
+        self.client.delay = 0.05
+        results = await asyncio.gather(*(self.insight() for _ in range(5)))
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_failed_call_is_not_cached(self):
+        async def fail(prompt):
+            self.client.calls += 1
+            raise RuntimeError("llm down")
+
+        complete, self.client.complete = self.client.complete, fail
+        with self.assertRaises(RuntimeError):
+            await self.insight()
+        self.client.complete = complete
+        self.assertIn("Pad Thai", await self.insight())
+        self.assertEqual(self.client.calls, 2)
+
+
+class StreamedInsightTest(StubClientTestCase):
+    async def streamed(self, liked=LIKED, limit=None):
+        tokens = []
+        async for token in stream_taste_insight(liked, CATEGORIES, DISLIKED, [], None):
+            tokens.append(token)
+            if len(tokens) == limit:
+                break
+        return tokens
+
+    async def test_concurrent_streams_share_one_call(self):
+        self.client.delay = 0.05
+        results = await asyncio.gather(*(self.streamed() for _ in range(5)))
+        self.assertGreater(len(results[0]), 1)
+        self.assertTrue(all(tokens == results[0] for tokens in results))
+        self.assertEqual(self.client.calls, 1)
+        # and the finished stream is cached for the next reader
+        self.assertEqual(await self.streamed(), ["".join(results[0]).strip()])
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_late_reader_gets_every_token(self):
+        self.client.delay = 0.05
+        first = asyncio.ensure_future(self.streamed())
+        await asyncio.sleep(0.06)  # the producer is part way through the text
+        late = await self.streamed()
+        self.assertEqual(late, await first)
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_reader_leaving_does_not_stop_the_others(self):
+        self.client.delay = 0.05
+        early, full = await asyncio.gather(self.streamed(limit=1), self.streamed())
+        self.assertEqual(early, full[:1])
+        self.assertIn("Pad Thai", "".join(full))
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_stream_and_complete_share_one_call(self):
+        self.client.delay = 0.05
+        tokens, text = await asyncio.gather(self.streamed(), self.insight())
+        self.assertEqual("".join(tokens).strip(), text)
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_failure_reaches_every_reader(self):
+        async def fail(prompt):
+            self.client.calls += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("llm down")
+            yield
+
+        self.client.stream = fail
+        results = await asyncio.gather(self.streamed(), self.streamed(), return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(self.client.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
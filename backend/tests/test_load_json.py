@@ -0,0 +1,63 @@
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+# load_herarchy_db.py lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from load_herarchy_db import iter_json_array  # noqa: E402
+
+
+RECORDS = [
+    {"name": "Pad Thai", "category": ["Asian", "Thai"], "nutrition": {"144": "Calories", "14g": "Fat"}},
+    {"name": "Crème brûlée", "category": ["Dessert"], "key_ingredients": ["cream", "sugar"]},
+    {"name": "Tricky ] [ , \"quotes\"", "category": []},
+    12345,
+    [1, [2, 3]],
+    "plain",
+]
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, text):
+        path = os.path.join(self.tmp.name, "recipes.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def parse(self, text, chunk_sizes=(1, 2, 3, 7, 16, 64, 1 << 20)):
+        path = self.write(text)
+        results = [list(iter_json_array(path, chunk_size)) for chunk_size in chunk_sizes]
+        for chunk_size, result in zip(chunk_sizes, results):
+            self.assertEqual(result, results[-1], f"chunk_size={chunk_size}")
+        return results[-1]
+
+    def test_records_at_every_chunk_size(self):
+        self.assertEqual(self.parse(json.dumps(RECORDS, indent=2, ensure_ascii=False)), RECORDS)
+        self.assertEqual(self.parse(json.dumps(RECORDS, separators=(",", ":"))), RECORDS)
+
+    def test_whitespace_before_the_array_longer_than_a_chunk(self):
+        self.assertEqual(self.parse("\n" * 100 + "  \t" + json.dumps(RECORDS)), RECORDS)
+
+    def test_empty_array(self):
+        self.assertEqual(self.parse("  [ \n ]  "), [])
+
+    def test_not_an_array(self):
+        for text in ("", "   \n  ", '{"name": "Pad Thai"}'):
+            with self.assertRaises(ValueError):
+                list(iter_json_array(self.write(text), 4))
+
+    def test_truncated_file(self):
+        path = self.write(json.dumps(RECORDS)[:-10])
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(path, 8))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import sys
+import threading
+import unittest
+
+from utils.metrics import Registry
+
+
+class ScrapeRaceTest(unittest.TestCase):
+    def test_render_while_series_are_added(self):
+        registry = Registry()
+        counter = registry.counter("t_requests_total", "requests")
+        histogram = registry.histogram("t_latency_seconds", "latency")
+
+        def record(worker):
+            # every label set is a new series, so the dicts grow while render() walks them
+            for i in range(2000):
+                counter.inc(route=f"/r{worker}-{i}")
+                histogram.observe(0.01, route=f"/r{worker}-{i}")
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-5)  # interleave the writers with the scrape as much as possible
+        self.addCleanup(sys.setswitchinterval, interval)
+        threads = [threading.Thread(target=record, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        try:
+            while any(t.is_alive() for t in threads):
+                self.assertTrue(registry.render().endswith("\n"))
+        finally:
+            for t in threads:
+                t.join()
+
+        text = registry.render()
+        self.assertIn('t_requests_total{route="/r0-0"} 1', text)
+        self.assertIn('t_latency_seconds_count{route="/r3-1999"} 1', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import unittest
+
+from utils.nutrition import NutritionColumns, NutritionFilter, parse_nutrition
+
+
+class ParseNutritionTest(unittest.TestCase):
+    def test_dataset_orientation(self):
+        # the dataset maps the amount to the nutrient name
+        parsed = parse_nutrition({"144": "Calories", "14g": "Fat", "3g": "Carbs", "2g": "Protein"})
+        self.assertEqual(parsed, {"calories": 144.0, "fat": 14.0, "carbs": 3.0, "protein": 2.0})
+
+    def test_name_to_amount_and_json_text(self):
+        raw = json.dumps({"Calories": "1,250", "carbohydrates": "12.5 g", "Protein": ".5g"})
+        parsed = parse_nutrition(raw)
+        self.assertEqual(parsed["calories"], 1250.0)
+        self.assertEqual(parsed["carbs"], 12.5)
+        self.assertEqual(parsed["protein"], 0.5)
+
+    def test_missing_and_unknown_nutrients(self):
+        parsed = parse_nutrition({"144": "Calories", "30mg": "Sodium", "trace": "Fat"})
+        self.assertEqual(parsed, {"calories": 144.0, "fat": None, "carbs": None, "protein": None})
+        self.assertEqual(parse_nutrition(None), dict.fromkeys(parsed))
+        self.assertEqual(parse_nutrition("{}"), dict.fromkeys(parsed))
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return FakeCursor(self.rows)
+
+
+class NutritionColumnsTest(unittest.TestCase):
+    def setUp(self):
+        # (id, calories, fat, carbs, protein); id 3 has no values, 2 is a gap
+        self.columns = NutritionColumns().load(FakeConnection([
+            (1, 200.0, 5.0, 30.0, 10.0),
+            (3, None, None, None, None),
+            (4, 600.0, 40.0, 50.0, 25.0),
+        ]))
+
+    def test_bounds(self):
+        flt = NutritionFilter({"calories": (None, 300)})
+        self.assertEqual(self.columns.mask(flt, [1, 4]).tolist(), [True, False])
+        flt = NutritionFilter({"calories": (300, None), "protein": (20, 30)})
+        self.assertEqual(self.columns.mask(flt, [1, 4]).tolist(), [False, True])
+
+    def test_unknown_values_and_gaps_fail(self):
+        flt = NutritionFilter({"fat": (0, None)})
+        self.assertEqual(self.columns.mask(flt, [2, 3]).tolist(), [False, False])
+
+    def test_ids_past_the_columns_fail_every_filter(self):
+        for flt in (NutritionFilter({"calories": (None, 10_000)}), NutritionFilter({"fat": (0, None)})):
+            self.assertEqual(self.columns.mask(flt, [1, 5, 10**6]).tolist(), [True, False, False])
+
+    def test_masks_are_cached_per_filter(self):
+        flt = NutritionFilter({"calories": (None, 300)})
+        self.columns.mask(flt, [1])
+        self.columns.mask(NutritionFilter({"calories": (None, 300)}), [4])
+        self.assertEqual(len(self.columns._masks), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
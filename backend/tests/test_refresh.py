@@ -0,0 +1,124 @@
+import os
+import uuid
+import unittest
+from unittest import mock
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+
+from utils import vector_index as vi
+from utils.category_tree import CategoryTree
+from utils.vector_index import BruteForceIndex, CompactIndex, reload_if_stale
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+class FakeCursor:
+    """Answers CategoryTree.load's two queries from in-memory rows."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if "MAX(id)" in sql:
+            self.rows = [(max(self.conn.categories), max(f for fs in self.conn.foods.values() for f in fs))]
+        elif "FROM categories" in sql:
+            self.rows = [(cid, f"c{cid}", parent) for cid, parent in sorted(self.conn.categories.items())]
+        else:
+            self.rows = list(self.conn.foods.items())
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self):
+        # 1 -> 2 -> 4, 1 -> 3
+        self.categories = {1: None, 2: 1, 3: 1, 4: 2}
+        self.foods = {2: [20], 3: [30, 31], 4: [40]}
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class SubtreeFoodsTest(unittest.TestCase):
+    def test_subtrees_are_built_at_load(self):
+        conn = FakeConnection()
+        tree = CategoryTree().load(conn)
+        self.assertEqual(sorted(tree.subtree_foods(1)), [20, 30, 31, 40])
+        self.assertEqual(sorted(tree.subtree_foods(2)), [20, 40])
+        self.assertEqual(tree.subtree_foods(4).tolist(), [40])
+        self.assertEqual(len(tree.subtree_foods(99)), 0)
+
+    def test_reload_swaps_in_new_subtrees(self):
+        conn = FakeConnection()
+        tree = CategoryTree().load(conn)
+        before = tree.subtree_foods(1)
+        conn.foods[4] = [40, 41]
+        self.assertTrue(tree.refresh_if_stale(conn))
+        self.assertIn(41, tree.subtree_foods(1).tolist())
+        self.assertNotIn(41, before.tolist())
+
+
+class SuccessorTest(unittest.TestCase):
+    def test_compact_successor_keeps_the_projection(self):
+        rng = np.random.default_rng(0)
+        index = CompactIndex("int8", pca_dim=4, rescore=0).build(np.arange(50), rng.normal(size=(50, 8)))
+        codes = index.store.codes
+        fresh = index.successor().build(np.arange(60), rng.normal(size=(60, 8)))
+        self.assertIs(fresh.store.pca, index.store.pca)
+        self.assertIs(index.store.codes, codes)
+        self.assertEqual(len(fresh.ids), 60)
+        self.assertEqual(len(index.ids), 50)
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL not set (a Postgres with pgvector)")
+class ReloadIfStaleTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = psycopg.connect(TEST_DATABASE_URL, autocommit=True)
+        self.schema = f"reload_{uuid.uuid4().hex[:12]}"
+        self.conn.execute(f"CREATE SCHEMA {self.schema}")
+        self.conn.execute(f"SET search_path TO {self.schema}, public")
+        self.conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        register_vector(self.conn)
+        self.conn.execute("CREATE TABLE food (id int PRIMARY KEY, embedding vector(3))")
+        self.conn.execute("INSERT INTO food VALUES (1, '[1,0,0]'), (2, '[0,1,0]'), (3, NULL)")
+        for patch in (
+            mock.patch.object(vi, "vector_index", BruteForceIndex()),
+            mock.patch.object(vi, "open_snapshot", return_value=None),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.conn.execute(f"DROP SCHEMA {self.schema} CASCADE")
+        self.conn.close()
+
+    def test_new_embeddings_swap_in_a_new_index(self):
+        old = vi.vector_index.load(self.conn)
+        self.assertIsNone(reload_if_stale(self.conn))
+        # a food without an embedding is not searchable yet
+        self.conn.execute("INSERT INTO food VALUES (4, NULL)")
+        self.assertIsNone(reload_if_stale(self.conn))
+
+        self.conn.execute("UPDATE food SET embedding = '[0,0,1]' WHERE id = 3")
+        fresh = reload_if_stale(self.conn)
+        self.assertIsNotNone(fresh)
+        self.assertIs(vi.vector_index, fresh)
+        self.assertEqual(fresh.search([0, 0, 1], k=1), [3])
+        self.assertEqual(old.ids.tolist(), [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
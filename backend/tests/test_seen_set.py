@@ -0,0 +1,79 @@
+import random
+import unittest
+
+import numpy as np
+
+from utils.seen_set import SeenSet, sample_unseen, sample_unseen_k
+
+
+class SeenSetTest(unittest.TestCase):
+    def test_bits_across_byte_boundaries(self):
+        ids = [0, 7, 8, 15, 16, 63, 64]
+        seen = SeenSet(ids)
+        self.assertEqual(list(seen), ids)
+        for i in ids:
+            self.assertIn(i, seen)
+        for i in (1, 6, 9, 14, 17, 62, 65):
+            self.assertNotIn(i, seen)
+        self.assertEqual(len(seen), len(ids))
+
+    def test_growth_past_the_initial_size(self):
+        seen = SeenSet([3])
+        seen.add(100_000)
+        seen.add(100_000)
+        self.assertIn(3, seen)
+        self.assertIn(100_000, seen)
+        self.assertNotIn(99_999, seen)
+        self.assertNotIn(10**9, seen)
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(list(seen), [3, 100_000])
+
+    def test_mask_matches_membership(self):
+        seen = SeenSet([2, 9, 4000])
+        ids = np.array([0, 2, 8, 9, 4000, 4001, 10**7])
+        self.assertEqual(seen.mask(ids).tolist(), [i in seen for i in ids.tolist()])
+        self.assertEqual(SeenSet().mask(ids).tolist(), [False] * len(ids))
+
+    def test_bytes_round_trip(self):
+        seen = SeenSet([1, 8, 255, 256, 70_000])
+        copy = SeenSet.from_bytes(seen.to_bytes())
+        self.assertEqual(list(copy), list(seen))
+        self.assertEqual(len(copy), len(seen))
+        empty = SeenSet.from_bytes(SeenSet().to_bytes())
+        self.assertEqual(len(empty), 0)
+        self.assertFalse(empty)
+
+
+class SampleUnseenTest(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+
+    def test_never_returns_a_seen_id(self):
+        candidates = np.arange(200)
+        seen = SeenSet(range(0, 200, 3))
+        for _ in range(500):
+            self.assertNotIn(sample_unseen(candidates, seen), seen)
+
+    def test_falls_back_when_almost_everything_is_seen(self):
+        candidates = np.arange(1000)
+        seen = SeenSet(i for i in range(1000) if i != 617)
+        # rejection sampling almost never hits the one unseen id
+        self.assertEqual(sample_unseen(candidates, seen, tries=2), 617)
+        self.assertEqual(sample_unseen(list(range(1000)), seen, tries=2), 617)
+
+    def test_nothing_left(self):
+        self.assertIsNone(sample_unseen(np.arange(5), SeenSet(range(5))))
+        self.assertIsNone(sample_unseen([], SeenSet()))
+
+    def test_k_picks_are_distinct_and_unseen(self):
+        candidates = np.arange(50)
+        seen = SeenSet(range(0, 50, 2))
+        for k in (1, 5, 25, 40):
+            picks = sample_unseen_k(candidates, seen, k)
+            self.assertEqual(len(picks), min(k, 25))
+            self.assertEqual(len(set(picks)), len(picks))
+            self.assertFalse(any(p in seen for p in picks))
+
+
+if __name__ == "__main__":
+    unittest.main()
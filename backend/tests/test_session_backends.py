@@ -0,0 +1,118 @@
+import os
+import asyncio
+import tempfile
+import unittest
+
+from utils.session_backends import (
+    RespClient, RedisBackend, FileBackend, LocalBackend, RedisError, worker_count, check_workers,
+)
+from tests.resp_fake import FakeRespServer
+
+
+class RespClientTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await FakeRespServer().start()
+        self.backend = RedisBackend(self.server.url, prefix="t:")
+
+    async def asyncTearDown(self):
+        await self.backend.close()
+        await self.server.stop()
+
+    async def test_set_get_delete(self):
+        self.assertIsNone(await self.backend.get("a"))
+        await self.backend.put("a", b"\x00state\r\nbytes", ttl=60)
+        self.assertEqual(await self.backend.get("a"), b"\x00state\r\nbytes")
+        await self.backend.delete("a")
+        self.assertIsNone(await self.backend.get("a"))
+
+    async def test_set_passes_ttl(self):
+        await self.backend.put("a", b"x", ttl=0.2)
+        self.assertIn(b"t:a", self.server.expires)
+        self.server.expires[b"t:a"] = 0
+        self.assertIsNone(await self.backend.get("a"))
+
+    async def test_reconnects_after_server_drop(self):
+        await self.backend.put("a", b"x", ttl=60)
+        self.server.drop_connections()
+        await asyncio.sleep(0)
+        self.assertEqual(await self.backend.get("a"), b"x")
+        self.assertEqual(self.server.connections, 2)
+
+    async def test_cancelled_command_does_not_leak_its_reply(self):
+        await self.backend.put("slow", b"slow-state", ttl=60)
+        await self.backend.put("fast", b"fast-state", ttl=60)
+        self.server.delays[b"t:slow"] = 0.2
+        task = asyncio.create_task(self.backend.get("slow"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.3)
+        # the late reply for "slow" must not be read as the answer for "fast"
+        self.assertEqual(await self.backend.get("fast"), b"fast-state")
+
+    async def test_concurrent_commands_use_a_bounded_pool(self):
+        client = RespClient(self.server.url, size=3)
+        self.server.delays[b"k"] = 0.05
+        await asyncio.gather(*(client.execute("GET", "k") for _ in range(10)))
+        await client.close()
+        self.assertLessEqual(self.server.connections, 3)
+        self.assertGreater(self.server.connections, 1)
+
+    async def test_error_reply_keeps_the_connection(self):
+        client = RespClient(self.server.url)
+        with self.assertRaises(RedisError):
+            await client.execute("NOPE")
+        self.assertEqual(await client.execute("PING"), "PONG")
+        await client.close()
+        self.assertEqual(self.server.connections, 1)
+
+    async def test_auth(self):
+        server = await FakeRespServer(password="secret").start()
+        client = RespClient(server.url)
+        self.assertEqual(await client.execute("PING"), "PONG")
+        await client.close()
+        await server.stop()
+        self.assertEqual(server.commands[:2], ["AUTH", "PING"])
+
+
+class FileBackendTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.backend = FileBackend(self.tmp.name)
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_put_get_delete(self):
+        await self.backend.put("../a", b"state", ttl=60)
+        self.assertEqual(await self.backend.get("../a"), b"state")
+        await self.backend.delete("../a")
+        self.assertIsNone(await self.backend.get("../a"))
+
+    async def test_expired_files_are_dropped(self):
+        await self.backend.put("a", b"state", ttl=-1)
+        await self.backend.put("b", b"state", ttl=60)
+        self.assertEqual(self.backend.sweep(), 1)
+        self.assertIsNone(await self.backend.get("a"))
+        self.assertEqual(await self.backend.get("b"), b"state")
+        self.assertFalse(any(name.endswith(".tmp") for name in os.listdir(self.tmp.name)))
+
+
+class WorkerCheckTest(unittest.TestCase):
+    def test_worker_count(self):
+        self.assertEqual(worker_count(["uvicorn", "main:app", "--workers", "4"], {}), 4)
+        self.assertEqual(worker_count(["gunicorn", "-w=3"], {}), 3)
+        self.assertEqual(worker_count(["uvicorn", "main:app"], {"WEB_CONCURRENCY": "2"}), 2)
+        self.assertEqual(worker_count(["uvicorn", "main:app"], {}), 1)
+
+    def test_local_backend_needs_one_worker(self):
+        check_workers(LocalBackend(), workers=1)
+        with self.assertRaises(RuntimeError):
+            check_workers(LocalBackend(), workers=4)
+        with tempfile.TemporaryDirectory() as tmp:
+            check_workers(FileBackend(tmp), workers=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
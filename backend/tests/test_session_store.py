@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+
+from utils.session_backends import LocalBackend
+from utils.session_store import SessionStore, SessionState
+
+
+class BlockingCursor:
+    """Holds executemany until the test releases it, like a slow UPDATE."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def executemany(self, sql, rows):
+        self.conn.started.set()
+        await self.conn.release.wait()
+        if self.conn.error:
+            raise self.conn.error
+
+    async def execute(self, sql, params=None):
+        self.conn.fetches += 1
+
+    async def fetchone(self):
+        return None
+
+    async def fetchall(self):
+        return []
+
+
+class BlockingConnection:
+    def __init__(self, error=None):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.error = error
+        self.fetches = 0
+
+    def cursor(self):
+        return BlockingCursor(self)
+
+    async def commit(self):
+        pass
+
+
+class FlushWindowTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.store = SessionStore(max_sessions=1, backend=LocalBackend())
+        self.state = SessionState("a", current_category=7)
+        self.store._states["a"] = self.state
+        self.store.mark_dirty(self.state)
+        # loading another session evicts "a" while it is still dirty
+        self.store._states["b"] = SessionState("b")
+        self.store._evict_overflow()
+        self.assertFalse(self.store.holds("a"))
+
+    async def start_flush(self, conn):
+        flush = asyncio.create_task(self.store.flush(conn))
+        await conn.started.wait()
+        return flush
+
+    async def test_load_during_flush_returns_the_flushing_state(self):
+        conn = BlockingConnection()
+        flush = await self.start_flush(conn)
+        loaded = await self.store.load(conn, "a")
+        self.assertIs(loaded, self.state)
+        self.assertEqual(loaded.current_category, 7)
+        self.assertEqual(conn.fetches, 0)
+        conn.release.set()
+        self.assertEqual(await flush, 1)
+        self.assertEqual(self.store._in_flight, {})
+
+    async def test_failed_flush_keeps_the_state_for_the_next_cycle(self):
+        conn = BlockingConnection(error=RuntimeError("db down"))
+        flush = await self.start_flush(conn)
+        conn.release.set()
+        with self.assertRaises(RuntimeError):
+            await flush
+        self.assertEqual(self.store._in_flight, {})
+        self.assertIs(await self.store.load(conn, "a"), self.state)
+        self.assertTrue(self.state.dirty)
+        self.assertEqual(conn.fetches, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import uuid
+import tempfile
+import unittest
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+
+from utils.snapshot import (
+    catalog_version, ensure_catalog_meta, bump_embeddings_version, write_snapshot, open_snapshot,
+)
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@unittest.skipUnless(TEST_DATABASE_URL, "TEST_DATABASE_URL not set (a Postgres with pgvector)")
+class SnapshotVersionTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = psycopg.connect(TEST_DATABASE_URL, autocommit=True)
+        self.schema = f"snap_{uuid.uuid4().hex[:12]}"
+        self.conn.execute(f"CREATE SCHEMA {self.schema}")
+        self.conn.execute(f"SET search_path TO {self.schema}, public")
+        self.conn.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        register_vector(self.conn)
+        # no embedding_hash / embedding_model: the stamp must not depend on them
+        self.conn.execute("CREATE TABLE food (id int PRIMARY KEY, category_id int, embedding vector(3))")
+        self.matrix = np.eye(3, dtype=np.float32)
+        for i, row in enumerate(self.matrix, start=1):
+            self.conn.execute("INSERT INTO food VALUES (%s, 1, %s)", (i, row))
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "food.snap")
+
+    def tearDown(self):
+        self.conn.execute(f"DROP SCHEMA {self.schema} CASCADE")
+        self.conn.close()
+        self.tmp.cleanup()
+
+    def export(self):
+        write_snapshot(self.path, catalog_version(self.conn), [1, 2, 3], [1, 1, 1], self.matrix)
+
+    def test_current_without_catalog_meta(self):
+        self.export()
+        self.assertIsNotNone(open_snapshot(self.conn, self.path))
+
+    def test_new_food_makes_it_stale(self):
+        self.export()
+        self.conn.execute("INSERT INTO food VALUES (4, 1, '[1,1,1]')")
+        self.assertIsNone(open_snapshot(self.conn, self.path))
+
+    def test_reembedding_makes_it_stale(self):
+        ensure_catalog_meta(self.conn)
+        self.export()
+        with self.conn.cursor() as cur:
+            cur.execute("UPDATE food SET embedding = '[1,1,0]' WHERE id = 1")
+            bump_embeddings_version(cur)
+        self.assertIsNone(open_snapshot(self.conn, self.path))
+
+    def test_unreadable_catalogue_falls_back(self):
+        self.export()
+        self.conn.execute("DROP TABLE food")
+        with self.assertLogs("utils.snapshot", level="WARNING"):
+            self.assertIsNone(open_snapshot(self.conn, self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+import main
+from recommender import SwipeBrain
+from utils import insights
+from utils.insights import InsightCache, StubInsightClient
+
+
+SUMMARY = {
+    "left_swipes": 1,
+    "right_swipes": 2,
+    "liked_foods": [("Pad Thai", ["rice noodles", "peanuts"])],
+    "liked_categories": [("Thai",)],
+    "disliked_foods": [],
+    "disliked_categories": [],
+    "super": ("Pad Thai", ["rice noodles", "peanuts"]),
+}
+COUNTS = {"total_swipes": 4, "left_swipes": 1, "right_swipes": 2, "super_food": "Pad Thai"}
+
+
+@asynccontextmanager
+async def no_connection():
+    yield None
+
+
+def parse(chunks):
+    events = []
+    for chunk in chunks:
+        event, data = chunk.strip().split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class StatsEventsTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.client = StubInsightClient()
+        previous_client, previous_cache = insights._client, insights.insight_cache
+        insights.set_client(self.client)
+        insights.insight_cache = InsightCache()
+        self.addCleanup(insights.set_client, previous_client)
+        self.addCleanup(setattr, insights, "insight_cache", previous_cache)
+        for patch in (
+            mock.patch.object(main, "async_connection", no_connection),
+            mock.patch.object(SwipeBrain, "summary", mock.AsyncMock(return_value=SUMMARY)),
+            mock.patch.object(SwipeBrain, "get_counts", mock.AsyncMock(return_value=COUNTS)),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def events(self):
+        return parse([chunk async for chunk in main.stats_events("sid")])
+
+    async def test_stats_then_tokens_then_done(self):
+        events = await self.events()
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], "stats")
+        self.assertEqual(events[0][1], COUNTS)
+        self.assertEqual(names[-1], "done")
+        self.assertGreater(len(names), 3)
+        self.assertEqual(set(names[1:-1]), {"token"})
+        text = "".join(data["text"] for name, data in events if name == "token")
+        self.assertIn("Pad Thai", text)
+
+    async def test_cached_insight_arrives_as_one_token(self):
+        await self.events()
+        events = await self.events()
+        self.assertEqual([name for name, _ in events], ["stats", "token", "done"])
+        self.assertEqual(self.client.calls, 1)
+
+    async def test_failed_insight_sends_insight_error(self):
+        async def fail(prompt):
+            raise RuntimeError("llm down")
+            yield
+
+        self.client.stream = fail
+        events = await self.events()
+        self.assertEqual([name for name, _ in events], ["stats", "insight_error", "done"])
+        self.assertEqual(events[1][1], {"detail": "llm down"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import os
+import asyncio
+import logging
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from utils.seen_set import sample_unseen
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# seconds between checks of the categories / food stamp (0 = load once, restart to pick up changes)
+CATEGORY_REFRESH_INTERVAL = float(os.getenv("CATEGORY_REFRESH_INTERVAL", "60"))
+
+
+class CategoryTree:
+    """
+    In-process copy of the `categories` table (plus the food IDs of each category).
+
+    The tree is static once load_herarchy_db.py has run, so it is loaded once
+    into parent / children / root indexes and every navigation step in
+    SwipeBrain is answered from memory. `run_refresher()` re-checks the
+    max id of categories and food every CATEGORY_REFRESH_INTERVAL seconds
+    and reloads when either has grown, so foods ingested later reach leaf
+    sampling without a restart. A reload builds every lookup, the subtree
+    food lists included, before swapping them in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.version = None
+        self.names = {}
+        self.parent = {}
+        self.children = {}
+        self.roots = []
+        self.ids = []
+        self.foods = {}
+        self._subtree_foods = {}
+
+    # ---------------- Loading ----------------
+    @staticmethod
+    def fetch_version(conn):
+        # the ingest only appends rows, so the max ids are the stamp; each is one
+        # primary key probe, where COUNT(*) scanned all of food in every worker
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT (SELECT COALESCE(MAX(id), 0) FROM categories),
+                       (SELECT COALESCE(MAX(id), 0) FROM food)
+            """)
+            return tuple(cur.fetchone())
+
+    def load(self, conn):
+        version = self.fetch_version(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, name, parent_id FROM categories ORDER BY id")
+            rows = cur.fetchall()
+            cur.execute("""
+                SELECT category_id, array_agg(id ORDER BY id)
+                FROM food GROUP BY category_id
+            """)
+            foods = {cid: np.asarray(ids, dtype=np.int64) for cid, ids in cur.fetchall()}
+
+        names, parent, children, roots = {}, {}, {}, []
+        for cid, name, parent_id in rows:
+            names[cid] = name
+            parent[cid] = parent_id
+            if parent_id is None:
+                roots.append(cid)
+            else:
+                children.setdefault(parent_id, []).append(cid)
+        children = {k: tuple(v) for k, v in children.items()}
+        subtree_foods = _subtree_foods(names.keys() | foods.keys(), children, foods)
+
+        with self._lock:
+            self.names = names
+            self.parent = parent
+            self.children = children
+            self.roots = tuple(roots)
+            self.ids = tuple(names)
+            self.foods = foods
+            self._subtree_foods = subtree_foods
+            self.version = version
+            self.loaded = True
+        return self
+
+    def refresh_if_stale(self, conn):
+        """Reload when the max id of categories or food has moved."""
+        if not self.loaded or self.fetch_version(conn) != self.version:
+            self.load(conn)
+            return True
+        return False
+
+    async def run_refresher(self, connection_factory, interval=CATEGORY_REFRESH_INTERVAL,
+                            dependents=(), checks=()):
+        """
+        Background task: refresh_if_stale on a sync pooled connection, off the
+        event loop. Other in-memory copies of the food table (`dependents`,
+        anything with a `load(conn)`) are reloaded along with the tree.
+        `checks` (callables taking the connection) run on every tick and
+        reload copies with a stamp of their own, such as the vector index,
+        which changes when embeddings are written rather than foods inserted.
+        """
+        if interval <= 0:
+            return
+
+        def refresh():
+            with connection_factory() as conn:
+                reloaded = self.refresh_if_stale(conn)
+                if reloaded:
+                    for dependent in dependents:
+                        dependent.load(conn)
+                for check in checks:
+                    check(conn)
+                return reloaded
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await asyncio.to_thread(refresh):
+                    logger.info("category tree reloaded: %d categories", len(self.ids))
+            except Exception:
+                logger.exception("category tree refresh failed")
+
+    # ---------------- Lookups ----------------
+    def name(self, category_id):
+        return self.names.get(category_id)
+
+    def parent_of(self, category_id):
+        return self.parent.get(category_id)
+
+    def children_of(self, category_id):
+        return self.children.get(category_id, ())
+
+    def has_children(self, category_id):
+        return category_id in self.children
+
+    def foods_in(self, category_id):
+        return self.foods.get(category_id, _NO_FOODS)
+
+    def subtree_foods(self, category_id):
+        """Food IDs of the category and every descendant (built at load)."""
+        return self._subtree_foods.get(category_id, _NO_FOODS)
+
+    def random_sibling(self, category_id):
+        parent = self.parent_of(category_id)
+        if parent is None:
+            return _pick(self.roots, (category_id,))
+        return _pick(self.children_of(parent), (category_id,))
+
+    def random_root(self, exclude=()):
+        return _pick(self.roots, exclude)
+
+
+_NO_FOODS = np.empty(0, dtype=np.int64)
+
+
+def _subtree_foods(category_ids, children, foods):
+    """Category id -> food ids of the category and all its descendants, children first."""
+    subtree = {}
+    for root in category_ids:
+        stack = [(root, False)]
+        while stack:
+            cid, expanded = stack.pop()
+            if cid in subtree:
+                continue
+            kids = children.get(cid, ())
+            if expanded or not kids:
+                parts = [foods.get(cid, _NO_FOODS)] + [subtree[k] for k in kids]
+                subtree[cid] = np.concatenate(parts) if len(parts) > 1 else parts[0]
+            else:
+                stack.append((cid, True))
+                stack.extend((k, False) for k in kids if k not in subtree)
+    return subtree
+
+
+def _pick(candidates, exclude=()):
+    return sample_unseen(candidates, exclude)
+
+
+category_tree = CategoryTree()
@@ -0,0 +1,132 @@
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# global:   nearest foods over the whole catalogue (original behaviour)
+# category: nearest foods inside the current category's subtree first,
+#           topped up from the whole catalogue once the subtree runs out
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "global")
+# order category cards by subtree centroid similarity to the intent vector
+CATEGORY_RERANK = os.getenv("CATEGORY_RERANK", "0") == "1"
+
+
+class CategoryCentroids:
+    """
+    Mean embedding of the foods directly in each category, and of every food
+    in the subtree under it (count-weighted over the descendants).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self.rows = {}                                      # category id -> row
+        self.own = np.empty((0, 0), dtype=np.float32)       # foods of the category itself
+        self.subtree = np.empty((0, 0), dtype=np.float32)   # foods of the whole subtree
+        self.counts = np.empty(0, dtype=np.int64)           # embedded foods per subtree
+
+    # ---------------- Building ----------------
+    @staticmethod
+    def _sums_from_index(tree, index):
+        sums, counts = {}, {}
+        for cid, food_ids in tree.foods.items():
+            rows = index.rows_for(food_ids)
+            if len(rows):
+                sums[cid] = index.matrix[rows].sum(axis=0, dtype=np.float64)
+                counts[cid] = len(rows)
+        return sums, counts
+
+    @staticmethod
+    def _sums_from_db(conn):
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT category_id, AVG(embedding), COUNT(*)
+                FROM food WHERE embedding IS NOT NULL AND category_id IS NOT NULL
+                GROUP BY category_id
+            """)
+            rows = cur.fetchall()
+        sums = {cid: np.asarray(avg, dtype=np.float64) * n for cid, avg, n in rows}
+        return sums, {cid: n for cid, _, n in rows}
+
+    def load(self, conn, tree, index):
+        """
+        Centroids from the in-memory embedding matrix when the index holds one,
+        otherwise one AVG(embedding) per category in Postgres. Centroids are
+        mapped into the index's vector space, the space intent vectors live in.
+        """
+        if getattr(index, "ready", False) and getattr(index, "matrix", np.empty((0, 0))).size:
+            sums, counts = self._sums_from_index(tree, index)
+        else:
+            sums, counts = self._sums_from_db(conn)
+        if not sums:
+            return self
+
+        dim = len(next(iter(sums.values())))
+        ids = list(tree.ids) or list(sums)
+        rows = {cid: i for i, cid in enumerate(ids)}
+        own_sum = np.zeros((len(ids), dim), dtype=np.float64)
+        own_count = np.zeros(len(ids), dtype=np.int64)
+        for cid, s in sums.items():
+            if cid in rows:
+                own_sum[rows[cid]] = s
+                own_count[rows[cid]] = counts[cid]
+
+        # children before parents: accumulate subtree sums bottom-up
+        sub_sum, sub_count = own_sum.copy(), own_count.copy()
+        order, stack = [], list(tree.roots)
+        while stack:
+            cid = stack.pop()
+            order.append(cid)
+            stack.extend(tree.children_of(cid))
+        for cid in reversed(order):
+            parent = tree.parent_of(cid)
+            if parent is not None and parent in rows:
+                sub_sum[rows[parent]] += sub_sum[rows[cid]]
+                sub_count[rows[parent]] += sub_count[rows[cid]]
+
+        own = (own_sum / np.maximum(own_count, 1)[:, None]).astype(np.float32)
+        subtree = (sub_sum / np.maximum(sub_count, 1)[:, None]).astype(np.float32)
+        if hasattr(index, "to_index_space") and getattr(index, "ready", False):
+            own, subtree = index.to_index_space(own), index.to_index_space(subtree)
+
+        with self._lock:
+            self.rows = rows
+            self.own = own
+            self.subtree = subtree
+            self.counts = sub_count
+            self.ready = True
+        return self
+
+    # ---------------- Lookups ----------------
+    def centroid(self, category_id, subtree=True):
+        row = self.rows.get(category_id)
+        if row is None:
+            return None
+        return (self.subtree if subtree else self.own)[row]
+
+    def rank(self, category_ids, query):
+        """
+        Category ids ordered by L2 distance of their subtree centroid to
+        `query`, nearest first; categories without embedded foods go last.
+        """
+        category_ids = list(category_ids)
+        if not self.ready or not category_ids:
+            return category_ids
+        rows = np.fromiter((self.rows.get(c, -1) for c in category_ids), dtype=np.int64, count=len(category_ids))
+        known = rows >= 0
+        dists = np.full(len(rows), np.inf, dtype=np.float32)
+        if known.any():
+            cents = self.subtree[rows[known]]
+            q = np.asarray(query, dtype=np.float32).reshape(-1)
+            d = np.einsum("ij,ij->i", cents, cents) - 2.0 * (cents @ q)
+            d[self.counts[rows[known]] == 0] = np.inf
+            dists[known] = d
+        return [category_ids[i] for i in np.argsort(dists, kind="stable")]
+
+    def nearest_unseen(self, category_ids, query, seen, k=1):
+        return [c for c in self.rank(category_ids, query) if c not in seen][:k]
+
+
+category_centroids = CategoryCentroids()
@@ -1,25 +1,206 @@
 import os
+import time
+import uuid
+import logging
+import weakref
+from contextlib import contextmanager, asynccontextmanager
 from dotenv import load_dotenv
-from pgvector.psycopg import register_vector
-from psycopg_pool import ConnectionPool
+from pgvector.psycopg import register_vector, register_vector_async
+from psycopg.types.numeric import Int4
+from psycopg_pool import ConnectionPool, AsyncConnectionPool
+from utils.metrics import (
+    METRICS_ENABLED, SLOW_QUERY_MS, registry, pool_wait_seconds, timed_cursor_factories,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
+# request path (apool) sizing
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "100"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# a connection idle in the pool longer than this is probed before it is handed out
+DB_CHECK_IDLE = float(os.getenv("DB_CHECK_IDLE", "30"))
+# the sync pool only serves the lifespan, the category refresher and the
+# offline scripts, so it stays small whatever the request pool is sized to
+SYNC_POOL_MIN_SIZE = 1
+SYNC_POOL_MAX_SIZE = 4
+
+# ---------------- Hot statements ----------------
+# (sql, sample params) of the per-request statements; every pooled async
+# connection prepares them once, from the pool's configure hook, so the
+# first requests skip parse / plan instead of waiting for psycopg's
+# prepare threshold. Only read-only statements: they really run once.
+# psycopg keys a prepared statement by its parameter types too, so the
+# sample params must dump exactly like the request path's.
+HOT_STATEMENTS = []
+
+# a session id no session has; '' would fail the cast to the uuid id columns
+SAMPLE_SESSION_ID = str(uuid.uuid4())
+
+
+def int4_list(ids):
+    """
+    Ids that always dump as int4[]: a plain list of ints is sent as int2[]
+    while every id fits in 16 bits, which is a different prepared statement.
+    """
+    return [Int4(i) for i in ids]
+
+
+def hot_statement(sql, sample_params):
+    """Register a statement for preparation on every new connection; returns sql unchanged."""
+    HOT_STATEMENTS.append((sql, sample_params))
+    return sql
+
+
+async def prepare_hot(conn):
+    for sql, params in HOT_STATEMENTS:
+        try:
+            await conn.execute(sql, params, prepare=True)
+        except Exception as e:
+            # a missing table must not make the pool discard every connection
+            logger.warning("could not prepare statement: %s", e)
+
+
+# ---------------- Checkout check ----------------
+# A probe on every checkout is one extra round trip per request. Connections
+# that were just returned are almost never broken, and one that is surfaces
+# as an OperationalError (503) on its first query; so only connections that
+# sat idle for DB_CHECK_IDLE seconds are probed. The pool's max_idle and
+# max_lifetime retire the rest.
+_returned_at = weakref.WeakKeyDictionary()
+
+
+def _mark_returned(conn):
+    _returned_at[conn] = time.monotonic()
+
+
+async def _amark_returned(conn):
+    _mark_returned(conn)
+
+
+def _idle_too_long(conn):
+    # fresh connections were just opened and configured: nothing to probe
+    returned = _returned_at.get(conn)
+    return returned is not None and time.monotonic() - returned > DB_CHECK_IDLE
+
+
+def _check(conn):
+    if _idle_too_long(conn):
+        ConnectionPool.check_connection(conn)
+
+
+async def _acheck(conn):
+    if _idle_too_long(conn):
+        await AsyncConnectionPool.check_connection(conn)
+
+
+# pgvector's type lookup runs once per physical connection, not per borrow
+def _configure(conn):
+    register_vector(conn)
+
+
+async def _aconfigure(conn):
+    await register_vector_async(conn)
+    await prepare_hot(conn)
+
+
+# statement timing (and the slow query log) only wraps cursors when switched on
+if METRICS_ENABLED or SLOW_QUERY_MS:
+    _cursor, _acursor = timed_cursor_factories()
+    _sync_kwargs = {"autocommit": True, "cursor_factory": _cursor}
+    _async_kwargs = {"autocommit": True, "cursor_factory": _acursor}
+else:
+    _sync_kwargs = _async_kwargs = {"autocommit": True}
 
-       
 pool = ConnectionPool(
     DATABASE_URL,
-    min_size=1,
-    max_size=100,
-    kwargs={"autocommit": True}
+    min_size=SYNC_POOL_MIN_SIZE,
+    max_size=SYNC_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    # the pool probes long-idle connections when they are handed out and
+    # discards broken ones, so callers never probe with SELECT 1
+    check=_check,
+    reset=_mark_returned,
+    configure=_configure,
+    kwargs=_sync_kwargs
 )
 
 
+# async pool for the FastAPI request path; opened in the app lifespan with
+# DB_POOL_MIN_SIZE connections ready (size it to the expected concurrency)
+apool = AsyncConnectionPool(
+    DATABASE_URL,
+    min_size=DB_POOL_MIN_SIZE,
+    max_size=DB_POOL_MAX_SIZE,
+    timeout=DB_POOL_TIMEOUT,
+    check=_acheck,
+    reset=_amark_returned,
+    configure=_aconfigure,
+    kwargs=_async_kwargs,
+    open=False
+)
+
 
 def get_conn():
-  # closes all idle connections
-
+    """Borrow a connection for a long-running script; return it with `put_conn`."""
+    started = time.perf_counter()
     conn = pool.getconn()
-    register_vector(conn)
+    if METRICS_ENABLED:
+        pool_wait_seconds.observe(time.perf_counter() - started, pool="sync")
     return conn
+
+
+def put_conn(conn):
+    pool.putconn(conn)
+
+
+@contextmanager
+def connection():
+    """Borrow a connection for the duration of one unit of work."""
+    started = time.perf_counter()
+    with pool.connection() as conn:
+        if METRICS_ENABLED:
+            pool_wait_seconds.observe(time.perf_counter() - started, pool="sync")
+        yield conn
+
+
+@asynccontextmanager
+async def async_connection():
+    started = time.perf_counter()
+    async with apool.connection() as conn:
+        if METRICS_ENABLED:
+            pool_wait_seconds.observe(time.perf_counter() - started, pool="async")
+        yield conn
+
+
+async def get_adb():
+    """Async FastAPI dependency: one pooled connection per request."""
+    async with async_connection() as conn:
+        yield conn
+
+
+def pool_stats(p=None):
+    p = p or apool
+    stats = p.get_stats()
+    stats["min_size"] = p.min_size
+    stats["max_size"] = p.max_size
+    return stats
+
+
+_pool_size = registry.gauge("db_pool_connections", "Open connections per pool")
+_pool_idle = registry.gauge("db_pool_idle_connections", "Idle connections per pool")
+_pool_waiting = registry.gauge("db_pool_requests_waiting", "Clients queued for a connection")
+_pool_max = registry.gauge("db_pool_max_connections", "Configured pool maximum")
+
+
+@registry.collector
+def _collect_pool_gauges():
+    for name, p in (("async", apool), ("sync", pool)):
+        stats = p.get_stats()
+        _pool_size.set(stats.get("pool_size", 0), pool=name)
+        _pool_idle.set(stats.get("pool_available", 0), pool=name)
+        _pool_waiting.set(stats.get("requests_waiting", 0), pool=name)
+        _pool_max.set(p.max_size, pool=name)
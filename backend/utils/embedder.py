@@ -1,7 +1,6 @@
-import google.genai as genai
-from google.genai import types
 import os
-from openai import OpenAI
+import hashlib
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,17 +8,56 @@ load_dotenv()
 # ---------------------------
 # Setup
 # ---------------------------
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+EMBEDDER = os.getenv("EMBEDDER", "openai")      # openai | fake
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+EMBEDDING_CACHE = os.getenv("EMBEDDING_CACHE", "1") == "1"
+# what produced a vector: part of the cache key and of food.embedding_model, so
+# fake vectors are never mistaken for the real model's
+EMBEDDING_ID = f"fake-{EMBEDDING_DIM}" if EMBEDDER == "fake" else EMBEDDING_MODEL
 
+_client = None
 
 
-def embed(texts: list):
+def _openai():
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
+
+
+def fake_embed(texts: list, dim: int = EMBEDDING_DIM):
+    """Deterministic unit vectors seeded from the text, for offline runs."""
+    out = []
+    for text in texts:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+        out.append((vec / np.linalg.norm(vec)).tolist())
+    return out
+
+
+def embed_uncached(texts: list):
 
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
+    if EMBEDDER == "fake":
+        return fake_embed(texts)
+
+    response = _openai().embeddings.create(
+        model=EMBEDDING_MODEL,
         input=texts
     )
 
     embeddings = [r.embedding for r in response.data]
 
     return embeddings
+
+
+def embed(texts: list):
+    """Embed through the content-hash cache, so repeated texts never reach the API."""
+    if not EMBEDDING_CACHE:
+        return embed_uncached(texts)
+
+    from utils.db import connection
+    from utils.embedding_cache import cached_embed
+    with connection() as conn:
+        return cached_embed(conn, texts, EMBEDDING_ID, embed_uncached)
@@ -0,0 +1,73 @@
+import hashlib
+import numpy as np
+
+
+def cache_key(text, model):
+    """Content hash of the exact text sent to the embedder plus the model name."""
+    return hashlib.sha256(f"{model}\n{text}".encode()).hexdigest()
+
+
+_table_ready = False
+
+
+def ensure_table(conn):
+    global _table_ready
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                key text PRIMARY KEY,
+                model text NOT NULL,
+                embedding vector NOT NULL,
+                created_at timestamptz NOT NULL DEFAULT now()
+            )
+        """)
+    conn.commit()
+    _table_ready = True
+
+
+def lookup(conn, keys):
+    """{key: embedding} for the keys already in the cache."""
+    if not keys:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT key, embedding FROM embedding_cache WHERE key = ANY(%s)",
+            (list(set(keys)),),
+        )
+        return {k: emb for k, emb in cur.fetchall()}
+
+
+def store(conn, model, items):
+    """Insert (key, embedding) pairs; existing keys are left alone."""
+    if not items:
+        return
+    with conn.cursor() as cur:
+        cur.executemany("""
+            INSERT INTO embedding_cache (key, model, embedding)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (key) DO NOTHING
+        """, [(k, model, np.asarray(emb, dtype=np.float32)) for k, emb in items])
+
+
+def cached_embed(conn, texts, model, embed_fn):
+    """
+    Embed `texts`, calling `embed_fn` only for texts whose (text, model) hash
+    is not cached yet; duplicates within the call are embedded once.
+    """
+    if not _table_ready:
+        ensure_table(conn)
+    keys = [cache_key(t, model) for t in texts]
+    found = lookup(conn, keys)
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+    if missing:
+        fresh = embed_fn(list(missing.values()))
+        new_items = list(zip(missing.keys(), fresh))
+        store(conn, model, new_items)
+        conn.commit()
+        found.update(new_items)
+
+    return [found[k] for k in keys]
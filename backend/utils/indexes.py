@@ -0,0 +1,39 @@
+# Index builds on live tables run offline (build_indexes.py, maintain_sessions.py),
+# never from the app lifespan: a plain CREATE INDEX blocks writes for the whole
+# build, and every worker would race on the same DDL at startup.
+
+
+def _status(conn, names):
+    """{index name: valid} for the names that exist."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, i.indisvalid FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = ANY(%s)
+        """, (list(names),))
+        return dict(cur.fetchall())
+
+
+def missing_indexes(conn, indexes):
+    """Names of `indexes` ({name: "table (columns)"}) that do not exist or are invalid."""
+    status = _status(conn, indexes)
+    return [name for name in indexes if not status.get(name)]
+
+
+def ensure_indexes(conn, indexes):
+    """
+    Build `indexes` with CREATE INDEX CONCURRENTLY, so writes to the table
+    carry on meanwhile. Needs an autocommit connection. An index left
+    invalid by an interrupted build is dropped and rebuilt.
+    """
+    status = _status(conn, indexes)
+    created = []
+    with conn.cursor() as cur:
+        for name, definition in indexes.items():
+            if status.get(name):
+                continue
+            if name in status:
+                cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+            created.append(name)
+    return created
@@ -1,11 +1,90 @@
-from openai import OpenAI
+import os
+import time
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
 from dotenv import load_dotenv
+from utils.metrics import timer, llm_seconds, METRICS_ENABLED
 
 load_dotenv()
 
-client = OpenAI()
+INSIGHTS_MODEL = os.getenv("INSIGHTS_MODEL", "gpt-4.1-mini")
+INSIGHTS_CLIENT = os.getenv("INSIGHTS_CLIENT", "openai")       # openai | stub
+INSIGHT_CACHE_SIZE = int(os.getenv("INSIGHT_CACHE_SIZE", "1024"))
+INSIGHT_CACHE_TTL = float(os.getenv("INSIGHT_CACHE_TTL", "3600"))
 
-def generate_taste_insight(liked_foods, liked_categories, disliked_foods, disliked_categories,super):
+
+# ---------------------------
+# Clients
+# ---------------------------
+class OpenAIInsightClient:
+    def __init__(self, model=INSIGHTS_MODEL):
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI()
+        self.model = model
+
+    async def complete(self, prompt):
+        res = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7
+        )
+        return res.choices[0].message.content.strip()
+
+    async def stream(self, prompt):
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class StubInsightClient:
+    """Offline stand-in for tests and benchmarks: deterministic, no network."""
+
+    model = "stub"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def complete(self, prompt):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        liked = prompt.split("User liked the following foods:")[1].split("\n")[0].strip()
+        return f"You seem to enjoy {liked or 'a bit of everything'}. Something comforting sounds right today."
+
+    async def stream(self, prompt):
+        text = await self.complete(prompt)
+        for i, word in enumerate(text.split(" ")):
+            if self.delay:
+                await asyncio.sleep(self.delay / 10)
+            yield word if i == 0 else " " + word
+
+
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = StubInsightClient() if INSIGHTS_CLIENT == "stub" else OpenAIInsightClient()
+    return _client
+
+def set_client(client):
+    global _client
+    _client = client
+
+
+# ---------------------------
+# Prompt
+# ---------------------------
+def build_prompt(liked_foods, liked_categories, disliked_foods, disliked_categories, super):
     liked_food_text = ", ".join(
         f"{name} ({', '.join(ings or [])})" for name, ings in liked_foods
     )
@@ -15,8 +94,8 @@ def generate_taste_insight(liked_foods, liked_categories, disliked_foods, dislik
         f"{name} ({', '.join(ings or [])})" for name, ings in disliked_foods
     )
     disliked_cat_text = ", ".join(c[0] for c in disliked_categories)
-    super_text = f" {super[0]} ({', '.join(super[1] or [])})  "
-    prompt = f"""
+    super_text = f" {super[0]} ({', '.join(super[1] or [])})  " if super else ""
+    return f"""
 User liked the following foods: {liked_food_text}
 User liked the following categories: {liked_cat_text}
 User disliked the following foods: {disliked_food_text}
@@ -26,10 +105,174 @@ Infer the user's taste preference and current food mood in 2 short sentences.
 Be friendly, natural and non-repetitive.
 """
 
-    res = client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7
+
+async def generate_taste_insight(liked_foods, liked_categories, disliked_foods, disliked_categories,super):
+    prompt = build_prompt(liked_foods, liked_categories, disliked_foods, disliked_categories, super)
+    with timer(llm_seconds, op="complete"):
+        return await get_client().complete(prompt)
+
+
+# ---------------------------
+# Cache + single flight
+# ---------------------------
+def insight_key(liked_foods, liked_categories, disliked_foods, disliked_categories, super, model):
+    """Order-insensitive key over the swipe sets that feed the prompt."""
+    def norm_foods(rows):
+        return sorted([name, sorted(ings or [])] for name, ings in rows)
+
+    def norm_cats(rows):
+        return sorted(c[0] for c in rows)
+
+    payload = json.dumps([
+        model,
+        norm_foods(liked_foods), norm_cats(liked_categories),
+        norm_foods(disliked_foods), norm_cats(disliked_categories),
+        [super[0], sorted(super[1] or [])] if super else None,
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _Broadcast:
+    """One producer's tokens, replayed to every reader that joins while it runs."""
+
+    def __init__(self):
+        self.tokens = []
+        self.finished = False
+        self.error = None
+        self.task = None
+        self._changed = asyncio.Event()
+
+    async def run(self, produce):
+        try:
+            async for token in produce():
+                self.tokens.append(token)
+                self._notify()
+            return "".join(self.tokens).strip()
+        except BaseException as e:
+            self.error = e
+            raise
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def read(self):
+        i = 0
+        while True:
+            while i < len(self.tokens):
+                yield self.tokens[i]
+                i += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class InsightCache:
+    """
+    TTL + LRU cache of insights. Concurrent misses for one key share one LLM
+    call, whether they want the whole text (get_or_compute) or its tokens
+    (stream).
+    """
+
+    def __init__(self, max_size=INSIGHT_CACHE_SIZE, ttl=INSIGHT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()     # key -> (expires_at, text)
+        self._inflight = {}               # key -> asyncio.Task
+        self._streams = {}                # key -> _Broadcast
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, text):
+        self._entries[key] = (time.monotonic() + self.ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key, compute):
+        text = self.get(key)
+        if text is not None:
+            return text
+        broadcast = self._streams.get(key)
+        task = broadcast.task if broadcast else self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(self._inflight, key, t))
+        # shield so one cancelled request does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def stream(self, key, produce):
+        """
+        Yield the text for `key` as `produce()` generates it. Readers that
+        arrive while it runs join the same producer and get every token from
+        the start; one reader going away does not stop it for the others.
+        """
+        text = self.get(key)
+        if text is not None:
+            yield text
+            return
+        task = self._inflight.get(key)
+        if task is not None:
+            yield await asyncio.shield(task)
+            return
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            broadcast.task = asyncio.ensure_future(broadcast.run(produce))
+            self._streams[key] = broadcast
+            broadcast.task.add_done_callback(lambda t: self._on_done(self._streams, key, t))
+        async for token in broadcast.read():
+            yield token
+
+    def _on_done(self, inflight, key, task):
+        inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+
+insight_cache = InsightCache()
+
+
+async def cached_taste_insight(liked_foods, liked_categories, disliked_foods, disliked_categories, super):
+    key = insight_key(liked_foods, liked_categories, disliked_foods, disliked_categories, super,
+                      getattr(get_client(), "model", INSIGHTS_MODEL))
+    return await insight_cache.get_or_compute(
+        key,
+        lambda: generate_taste_insight(liked_foods, liked_categories, disliked_foods, disliked_categories, super),
     )
 
-    return res.choices[0].message.content.strip()
+
+async def stream_taste_insight(liked_foods, liked_categories, disliked_foods, disliked_categories, super):
+    """Yield the insight text as it is generated (all at once on a cache hit)."""
+    client = get_client()
+    key = insight_key(liked_foods, liked_categories, disliked_foods, disliked_categories, super,
+                      getattr(client, "model", INSIGHTS_MODEL))
+
+    async def produce():
+        prompt = build_prompt(liked_foods, liked_categories, disliked_foods, disliked_categories, super)
+        started = time.perf_counter()
+        first = True
+        async for token in client.stream(prompt):
+            if first and METRICS_ENABLED:
+                llm_seconds.observe(time.perf_counter() - started, op="first_token")
+            first = False
+            yield token
+        if METRICS_ENABLED:
+            llm_seconds.observe(time.perf_counter() - started, op="stream")
+
+    async for token in insight_cache.stream(key, produce):
+        yield token
@@ -0,0 +1,69 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# running_mean: the original (a*(n-1) + f*b)/n average over every food swipe
+# decay:        exponential recency weighting, recent swipes count more
+INTENT_STRATEGY = os.getenv("INTENT_STRATEGY", "running_mean")
+INTENT_DECAY = float(os.getenv("INTENT_DECAY", "0.3"))
+
+# nearest foods fetched per vector search; reused until the intent vector
+# has moved more than PREFETCH_DRIFT (cosine distance) from where they were ranked
+PREFETCH_SIZE = int(os.getenv("PREFETCH_SIZE", "10"))
+PREFETCH_DRIFT = float(os.getenv("PREFETCH_DRIFT", "0.02"))
+
+
+def parse_factors(spec):
+    """'right=1,super=3,left=-1' → {'right': 1.0, 'super': 3.0, 'left': -1.0}"""
+    factors = {}
+    for part in spec.split(","):
+        if part.strip():
+            action, value = part.split("=")
+            factors[action.strip()] = float(value)
+    return factors
+
+
+SWIPE_FACTORS = parse_factors(os.getenv("SWIPE_FACTORS", "right=1,super=3,left=-1"))
+
+
+def new_intent(embedding):
+    """Fresh float32 intent vector (a copy, never a view of the index matrix)."""
+    return np.array(embedding, dtype=np.float32, copy=True)
+
+
+def update_intent(vector, embedding, n, swipe_type,
+                  strategy=INTENT_STRATEGY, factors=SWIPE_FACTORS, decay=INTENT_DECAY):
+    """
+    Fold one food swipe into `vector` in place and return it.
+
+    `n` is the number of food swipes in the session including this one.
+    """
+    factor = factors.get(swipe_type, 0.0)
+    embedding = np.asarray(embedding, dtype=np.float32)
+    if strategy == "decay":
+        vector *= (1.0 - decay)
+        vector += (decay * factor) * embedding
+    else:
+        n = max(n, 1)
+        vector *= (n - 1) / n
+        vector += (factor / n) * embedding
+    return vector
+
+
+def is_meaningful_vector(vec, threshold=1e-6):
+    """Check if vector has meaningful values (not all near-zero)"""
+    if vec is None:
+        return False
+    return bool(np.any(np.abs(np.asarray(vec)) > threshold))
+
+
+def intent_drift(anchor, vec):
+    """Cosine distance between two intent vectors (1.0 if either is missing)."""
+    if anchor is None or vec is None:
+        return 1.0
+    denom = float(np.linalg.norm(anchor) * np.linalg.norm(vec))
+    if denom == 0.0:
+        return 1.0
+    return 1.0 - float(np.dot(anchor, vec)) / denom
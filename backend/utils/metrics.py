@@ -0,0 +1,239 @@
+import os
+import time
+import inspect
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# log statements slower than this many milliseconds with their parameters (0 = off)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+slow_query_log = logging.getLogger("slow_query")
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+# ---------------- Metric types ----------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        # copied under the lock: a scrape runs in a threadpool while requests add series
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, key, value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}       # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        out = []
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                out.append((self.name + "_bucket", key, cumulative, (("le", bound),)))
+            out.append((self.name + "_bucket", key, series[-1], (("le", "+Inf"),)))
+            out.append((self.name + "_sum", key, series[-2]))
+            out.append((self.name + "_count", key, series[-1]))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+
+    def _get(self, cls, name, help, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, help, **kwargs)
+        return metric
+
+    def counter(self, name, help=""):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=""):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help="", buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def collector(self, fn):
+        """Register a callable run before every scrape (to refresh gauges)."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        """Prometheus text exposition format."""
+        for fn in self.collectors:
+            fn()
+        lines = []
+        for metric in list(self.metrics.values()):
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample in metric.samples():
+                name, key, value = sample[:3]
+                extra = sample[3] if len(sample) > 3 else ()
+                lines.append(f"{name}{_format_labels(key, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_seconds = registry.histogram("http_request_duration_seconds", "HTTP request latency by route")
+query_seconds = registry.histogram("db_query_duration_seconds", "SQL statement latency")
+stage_seconds = registry.histogram("recommender_duration_seconds", "SwipeBrain step latency")
+pool_wait_seconds = registry.histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection")
+llm_seconds = registry.histogram("llm_duration_seconds", "Insight LLM latency", buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32))
+slow_queries = registry.counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS")
+
+
+# ---------------- Timing helpers ----------------
+@contextmanager
+def timer(histogram, **labels):
+    """Observe the wall time of the block into `histogram`."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+
+
+def timed(histogram, **labels):
+    """Decorator form of `timer` for plain and async functions (a no-op when disabled)."""
+    def decorate(fn):
+        if not METRICS_ENABLED:
+            return fn
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timer(histogram, **labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(histogram, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ---------------- SQL statements ----------------
+def _short(value, limit=200):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + f"...<{len(text)} chars>"
+
+
+def record_query(query, params, seconds):
+    sql = query if isinstance(query, str) else str(query)
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "?"
+    query_seconds.observe(seconds, statement=verb)
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        slow_queries.inc(statement=verb)
+        shown = [_short(p) for p in params] if isinstance(params, (list, tuple)) else _short(params)
+        slow_query_log.warning("slow query %.1f ms: %s params=%s", seconds * 1000, " ".join(sql.split()), shown)
+
+
+def timed_cursor_factories():
+    """(sync, async) cursor classes that time every execute; installed on the pools when enabled."""
+    from psycopg import Cursor, AsyncCursor
+
+    class TimedCursor(Cursor):
+        def execute(self, query, params=None, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().execute(query, params, **kwargs)
+            finally:
+                record_query(query, params, time.perf_counter() - started)
+
+        def executemany(self, query, params_seq, **kwargs):
+            started = time.perf_counter()
+            try:
+                return super().executemany(query, params_seq, **kwargs)
+            finally:
+                record_query(query, (), time.perf_counter() - started)
+
+    class TimedAsyncCursor(AsyncCursor):
+        async def execute(self, query, params=None, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await super().execute(query, params, **kwargs)
+            finally:
+                record_query(query, params, time.perf_counter() - started)
+
+        async def executemany(self, query, params_seq, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await super().executemany(query, params_seq, **kwargs)
+            finally:
+                record_query(query, (), time.perf_counter() - started)
+
+    return TimedCursor, TimedAsyncCursor
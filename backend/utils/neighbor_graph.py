@@ -0,0 +1,145 @@
+import os
+import logging
+import threading
+import numpy as np
+import psycopg
+from dotenv import load_dotenv
+from utils.snapshot import write_arrays, map_arrays, catalog_version
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NEIGHBORS_PATH = os.getenv("NEIGHBORS_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "food_neighbors.snap"))
+# graph: pick foods by walking the neighbour lists of recently liked foods
+GRAPH_WALK = os.getenv("GRAPH_WALK", "0") == "1"
+GRAPH_HISTORY = int(os.getenv("GRAPH_HISTORY", "10"))              # recent likes / dislikes kept per session
+GRAPH_DISLIKE_NEIGHBORS = int(os.getenv("GRAPH_DISLIKE_NEIGHBORS", "5"))
+
+MAGIC = b"FOODNBRS"
+BLOCK_ROWS = 1024       # query rows per matrix product when building
+
+
+# ---------------- Offline build ----------------
+def build_neighbors(ids, matrix, k=32, block=BLOCK_ROWS, progress=None):
+    """
+    Exact top-k cosine neighbours of every row, blockwise so memory holds one
+    (block x n) similarity slab. Returns (ids, neighbour ids int32 padded with
+    -1, similarities float16), sorted by food id.
+    """
+    order = np.argsort(ids)
+    ids = np.asarray(ids, dtype=np.int64)[order]
+    unit = np.asarray(matrix, dtype=np.float32)[order]
+    unit = unit / np.maximum(np.linalg.norm(unit, axis=1, keepdims=True), 1e-12)
+    n = len(ids)
+    k = min(k, max(n - 1, 0))
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float16)
+    if k == 0:
+        return ids, neighbors, scores
+
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        sims = unit[start:stop] @ unit.T
+        sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf      # not its own neighbour
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        rank = np.argsort(-top_sims, axis=1)
+        neighbors[start:stop] = ids[np.take_along_axis(top, rank, axis=1)]
+        scores[start:stop] = np.take_along_axis(top_sims, rank, axis=1)
+        if progress:
+            progress(stop, n)
+    return ids, neighbors, scores
+
+
+def write_graph(path, version, ids, neighbors, scores):
+    return write_arrays(path, MAGIC, {"version": version, "k": int(neighbors.shape[1])}, [
+        ("ids", ids), ("neighbors", neighbors), ("scores", scores),
+    ])
+
+
+# ---------------- Serving ----------------
+class NeighborGraph:
+    """Memory-mapped top-k neighbour lists (one adjacency row per food)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ready = False
+        self.ids = np.empty(0, dtype=np.int64)
+        self.neighbors = np.empty((0, 0), dtype=np.int32)
+        self.scores = np.empty((0, 0), dtype=np.float16)
+
+    def load(self, conn, path=NEIGHBORS_PATH):
+        if not os.path.exists(path):
+            return self
+        try:
+            meta, arrays = map_arrays(path, MAGIC)
+        except (ValueError, OSError) as e:
+            logger.warning("ignoring neighbour graph %s: %s", path, e)
+            return self
+        try:
+            version = catalog_version(conn)
+        except psycopg.Error as e:
+            logger.warning("cannot check neighbour graph %s against the catalogue, graph walk disabled: %s", path, e)
+            return self
+        if meta["version"] != version:
+            logger.warning("neighbour graph %s is stale, graph walk disabled until it is rebuilt", path)
+            return self
+        with self._lock:
+            self.ids = arrays["ids"]
+            self.neighbors = arrays["neighbors"]
+            self.scores = arrays["scores"]
+            self.ready = len(self.ids) > 0
+        return self
+
+    def rows_for(self, food_ids):
+        food_ids = np.asarray(list(food_ids), dtype=np.int64)
+        if not len(self.ids) or not len(food_ids):
+            return np.empty(0, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.ids, food_ids), 0, len(self.ids) - 1)
+        return pos[self.ids[pos] == food_ids]
+
+    def neighbors_of(self, food_id):
+        rows = self.rows_for([food_id])
+        if not len(rows):
+            return []
+        row = self.neighbors[rows[0]]
+        return row[row >= 0].tolist()
+
+    def walk(self, liked, disliked, seen=(), k=1, allowed=None):
+        """
+        Up to k foods from the neighbour lists of `liked` (oldest first; newer
+        likes weigh more), scored by summed similarity. Disliked foods and
+        their closest GRAPH_DISLIKE_NEIGHBORS neighbours are left out, as are
+        seen foods and any rejected by `allowed(ids) -> bool mask`.
+        """
+        rows = self.rows_for(liked)
+        if not len(rows):
+            return []
+        # recency weights 1, 1/2, 1/4, ... from the newest like backwards
+        weights = 0.5 ** np.arange(len(rows) - 1, -1, -1, dtype=np.float32)
+        candidates = self.neighbors[rows].ravel()
+        scores = (self.scores[rows].astype(np.float32) * weights[:, None]).ravel()
+        valid = candidates >= 0
+        uniq, inverse = np.unique(candidates[valid], return_inverse=True)
+        total = np.bincount(inverse, weights=scores[valid])
+        uniq = uniq.astype(np.int64)
+
+        keep = np.ones(len(uniq), dtype=bool)
+        if len(disliked):
+            bad = np.concatenate([
+                np.asarray(list(disliked), dtype=np.int64),
+                self.neighbors[self.rows_for(disliked), :GRAPH_DISLIKE_NEIGHBORS].ravel().astype(np.int64),
+            ])
+            keep &= ~np.isin(uniq, bad)
+        if seen:
+            keep &= ~(seen.mask(uniq) if hasattr(seen, "mask") else np.isin(uniq, np.fromiter(seen, dtype=np.int64)))
+        if allowed is not None:
+            keep &= allowed(uniq)
+
+        uniq, total = uniq[keep], total[keep]
+        top = np.argsort(-total, kind="stable")[:k]
+        return uniq[top].tolist()
+
+
+neighbor_graph = NeighborGraph()
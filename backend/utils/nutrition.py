@@ -0,0 +1,199 @@
+import re
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+
+NUTRIENTS = ("calories", "fat", "carbs", "protein")
+LABELS = {"calories": "calories", "fat": "fat", "carbs": "carbs", "carbohydrates": "carbs", "protein": "protein"}
+
+_NUMBER = re.compile(r"\d*\.?\d+")
+
+
+# ---------------- Parsing ----------------
+def _amount(text):
+    match = _NUMBER.search(str(text).replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def parse_nutrition(raw):
+    """
+    {"144": "Calories", "14g": "Fat", ...} → {"calories": 144.0, "fat": 14.0, ...}
+
+    The dataset maps the amount to the nutrient name; the usual
+    name → amount orientation is accepted too. Missing nutrients are None.
+    """
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    out = dict.fromkeys(NUTRIENTS)
+    for key, value in (raw or {}).items():
+        name, amount = (value, key) if str(value).strip().lower() in LABELS else (key, value)
+        nutrient = LABELS.get(str(name).strip().lower())
+        if nutrient:
+            out[nutrient] = _amount(amount)
+    return out
+
+
+# ---------------- Schema ----------------
+# B-tree per nutrient for the pgvector pre-filter; built offline (build_indexes.py)
+INDEXES = {f"food_{n}_idx": f"food ({n})" for n in NUTRIENTS}
+
+
+def ensure_schema(conn):
+    """Typed nutrition columns and the per-session filter column (no table rewrite, no index build)."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE (table_name = 'food' AND column_name = ANY(%s))
+               OR (table_name = 'session_memory' AND column_name = 'nutrition_filter')
+        """, (list(NUTRIENTS),))
+        present = set(cur.fetchall())
+        # skip the ALTERs (and their table lock) when everything already exists
+        for n in NUTRIENTS:
+            if ("food", n) not in present:
+                cur.execute(f"ALTER TABLE food ADD COLUMN IF NOT EXISTS {n} real")
+        if ("session_memory", "nutrition_filter") not in present:
+            cur.execute("ALTER TABLE session_memory ADD COLUMN IF NOT EXISTS nutrition_filter jsonb")
+    conn.commit()
+
+
+def backfill(conn, batch_size=5000):
+    """Parse the JSON blob of foods loaded before the typed columns existed."""
+    updated = 0
+    with conn.cursor(name="nutrition_backfill", withhold=True) as read:
+        read.itersize = batch_size
+        read.execute("""
+            SELECT id, nutrition FROM food
+            WHERE nutrition IS NOT NULL AND calories IS NULL AND fat IS NULL
+              AND carbs IS NULL AND protein IS NULL
+        """)
+        while rows := read.fetchmany(batch_size):
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        CREATE TEMP TABLE IF NOT EXISTS food_nutrition_stage (
+                            id int PRIMARY KEY, calories real, fat real, carbs real, protein real
+                        ) ON COMMIT DELETE ROWS
+                    """)
+                    with cur.copy("COPY food_nutrition_stage (id, calories, fat, carbs, protein) FROM STDIN") as copy:
+                        for food_id, raw in rows:
+                            parsed = parse_nutrition(raw)
+                            copy.write_row((food_id, *(parsed[n] for n in NUTRIENTS)))
+                    cur.execute("""
+                        UPDATE food f
+                        SET calories = s.calories, fat = s.fat, carbs = s.carbs, protein = s.protein
+                        FROM food_nutrition_stage s WHERE f.id = s.id
+                    """)
+            updated += len(rows)
+    return updated
+
+
+# ---------------- Per-session constraints ----------------
+class NutritionFilter:
+    """Inclusive (min, max) bounds per nutrient; a food with an unknown value fails a bound on it."""
+
+    def __init__(self, bounds=None):
+        self.bounds = {
+            n: (lo, hi) for n, (lo, hi) in (bounds or {}).items()
+            if n in NUTRIENTS and (lo is not None or hi is not None)
+        }
+
+    @classmethod
+    def from_params(cls, **params):
+        """from_params(min_calories=200, max_fat=20, ...)"""
+        return cls({n: (params.get(f"min_{n}"), params.get(f"max_{n}")) for n in NUTRIENTS})
+
+    def __bool__(self):
+        return bool(self.bounds)
+
+    def key(self):
+        return tuple(sorted(self.bounds.items()))
+
+    def to_json(self):
+        return {n: list(b) for n, b in self.bounds.items()}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({n: tuple(b) for n, b in (data or {}).items()})
+
+    def sql(self):
+        """(' AND calories <= %s ...', params) for the food table."""
+        clauses, params = [], []
+        for n, (lo, hi) in sorted(self.bounds.items()):
+            if lo is not None:
+                clauses.append(f"{n} >= %s")
+                params.append(lo)
+            if hi is not None:
+                clauses.append(f"{n} <= %s")
+                params.append(hi)
+        return "".join(" AND " + c for c in clauses), tuple(params)
+
+    def allows(self, ids):
+        """Boolean array: True where the food passes every bound."""
+        return nutrition_columns.mask(self, ids)
+
+
+class NutritionColumns:
+    """
+    Columnar copy of the nutrition columns, indexed directly by food id, so a
+    filter over any candidate array is one gather per bounded nutrient.
+    Masks per distinct filter are cached. The category tree refresher reloads
+    it when foods are added; until then ids past the copy fail every filter.
+    """
+
+    def __init__(self, cache_size=64):
+        self._lock = threading.Lock()
+        self.ready = False
+        self.columns = {n: np.empty(0, dtype=np.float32) for n in NUTRIENTS}
+        self._masks = OrderedDict()
+        self.cache_size = cache_size
+
+    def load(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT id, {', '.join(NUTRIENTS)} FROM food ORDER BY id")
+            rows = cur.fetchall()
+        size = rows[-1][0] + 1 if rows else 0
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+        columns = {}
+        for i, n in enumerate(NUTRIENTS, start=1):
+            col = np.full(size, np.nan, dtype=np.float32)
+            col[ids] = np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=np.float32)
+            columns[n] = col
+        with self._lock:
+            self.columns = columns
+            self._masks.clear()
+            self.ready = True
+        return self
+
+    def _dense_mask(self, flt):
+        key = flt.key()
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+        size = len(next(iter(self.columns.values())))
+        mask = np.ones(size, dtype=bool)
+        for n, (lo, hi) in flt.bounds.items():
+            col = self.columns[n]
+            # comparisons with NaN are False, so unknown values drop out
+            if lo is not None:
+                mask &= col >= lo
+            if hi is not None:
+                mask &= col <= hi
+        with self._lock:
+            self._masks[key] = mask
+            while len(self._masks) > self.cache_size:
+                self._masks.popitem(last=False)
+        return mask
+
+    def mask(self, flt, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        dense = self._dense_mask(flt)
+        out = np.zeros(len(ids), dtype=bool)
+        inside = ids < len(dense)
+        out[inside] = dense[ids[inside]]
+        return out
+
+
+nutrition_columns = NutritionColumns()
@@ -0,0 +1,196 @@
+import numpy as np
+
+BLOCK_ROWS = 8192       # rows encoded / decoded at a time, bounds the float32 scratch memory
+
+
+def blocks(matrix, block=BLOCK_ROWS):
+    """Consecutive float32 row blocks of a matrix (or read-only memory map)."""
+    for i in range(0, len(matrix), block):
+        yield np.asarray(matrix[i:i + block], dtype=np.float32)
+
+
+class PCA:
+    """Linear projection onto the top `dim` principal components."""
+
+    def __init__(self, dim):
+        self.dim = dim
+        self.mean = None
+        self.components = None      # (dim, full_dim)
+
+    def fit(self, matrix, sample=20000, seed=0):
+        rng = np.random.default_rng(seed)
+        rows = matrix if len(matrix) <= sample else matrix[rng.choice(len(matrix), sample, replace=False)]
+        self.mean = rows.mean(axis=0).astype(np.float32)
+        # right singular vectors of the centred sample are the principal axes
+        _, _, vt = np.linalg.svd(rows - self.mean, full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:self.dim], dtype=np.float32)
+        return self
+
+    @property
+    def full_dim(self):
+        return self.components.shape[1]
+
+    def transform(self, x):
+        return ((np.asarray(x, dtype=np.float32) - self.mean) @ self.components.T).astype(np.float32)
+
+    def inverse(self, z):
+        return (np.asarray(z, dtype=np.float32) @ self.components + self.mean).astype(np.float32)
+
+
+class Float16Codec:
+    name = "float16"
+    dtype = np.float16
+
+    def fit(self, blocks):
+        return self
+
+    def encode(self, matrix):
+        return np.asarray(matrix, dtype=np.float16)
+
+    def decode(self, codes):
+        return np.asarray(codes, dtype=np.float32)
+
+    def dot(self, codes, q):
+        return codes.astype(np.float32) @ q
+
+    def bytes_per_vector(self, dim):
+        return 2 * dim
+
+
+class Int8Codec:
+    """Per-dimension affine scalar quantization: x ≈ offset + scale * code, code in [-127, 127]."""
+
+    name = "int8"
+    dtype = np.int8
+
+    def __init__(self):
+        self.offset = None
+        self.scale = None
+
+    def fit(self, blocks):
+        lo = hi = None
+        for block in blocks:
+            b_lo, b_hi = block.min(axis=0), block.max(axis=0)
+            lo = b_lo if lo is None else np.minimum(lo, b_lo)
+            hi = b_hi if hi is None else np.maximum(hi, b_hi)
+        self.offset = ((hi + lo) / 2).astype(np.float32)
+        self.scale = np.maximum((hi - lo) / 254, 1e-12).astype(np.float32)
+        return self
+
+    def encode(self, matrix):
+        codes = np.asarray(matrix, dtype=np.float32) - self.offset
+        codes /= self.scale
+        np.rint(codes, out=codes)
+        return np.clip(codes, -127, 127, out=codes).astype(np.int8)
+
+    def decode(self, codes):
+        return self.offset + self.scale * np.asarray(codes, dtype=np.float32)
+
+    def dot(self, codes, q):
+        # (offset + scale*c)·q = offset·q + c·(scale*q), no decode of the matrix needed
+        return codes.astype(np.float32) @ (self.scale * q) + float(self.offset @ q)
+
+    def bytes_per_vector(self, dim):
+        return dim
+
+
+CODECS = {"float16": Float16Codec, "int8": Int8Codec}
+
+
+class CompactStore:
+    """
+    Quantized (optionally PCA-reduced) copy of an embedding matrix.
+
+    Only the codes, their squared norms and the codec parameters are kept.
+    `build()` reads the float32 matrix block by block, so a memory-mapped
+    snapshot is never copied whole; it can be dropped afterwards.
+    """
+
+    def __init__(self, codec="int8", pca_dim=0):
+        self.codec = CODECS[codec]()
+        self.pca = PCA(pca_dim) if pca_dim else None
+        self.codes = None
+        self.sq_norms = None
+
+    def _blocks(self, matrix):
+        """Float32 row blocks in the stored space (PCA-projected when configured)."""
+        for block in blocks(matrix):
+            yield self.pca.transform(block) if self.pca is not None else block
+
+    def successor(self):
+        """
+        An empty store with this store's codec and fitted PCA, for a rebuild:
+        vectors already projected into its space (session intents) stay valid.
+        """
+        store = CompactStore.__new__(CompactStore)
+        store.codec = type(self.codec)()
+        store.pca = self.pca
+        store.codes = store.sq_norms = None
+        return store
+
+    def build(self, matrix):
+        # a successor keeps its predecessor's projection
+        if self.pca is not None and self.pca.components is None:
+            self.pca.fit(matrix)
+        dim = self.pca.dim if self.pca is not None else matrix.shape[1]
+        # two passes over the rows: codec parameters first, then the codes
+        self.codec.fit(self._blocks(matrix))
+        codes = np.empty((len(matrix), dim), dtype=self.codec.dtype)
+        sq_norms = np.empty(len(matrix), dtype=np.float32)
+        for i, block in zip(range(0, len(matrix), BLOCK_ROWS), self._blocks(matrix)):
+            block_codes = codes[i:i + len(block)]
+            block_codes[:] = self.codec.encode(block)
+            decoded = self.codec.decode(block_codes)
+            sq_norms[i:i + len(block)] = np.einsum("ij,ij->i", decoded, decoded)
+        self.codes, self.sq_norms = codes, sq_norms
+        return self
+
+    def __len__(self):
+        return 0 if self.codes is None else len(self.codes)
+
+    @property
+    def dim(self):
+        return self.codes.shape[1]
+
+    def nbytes(self):
+        total = self.codes.nbytes + self.sq_norms.nbytes
+        if self.pca is not None:
+            total += self.pca.components.nbytes + self.pca.mean.nbytes
+        return total
+
+    # ---------------- Query space ----------------
+    def to_index_space(self, vec):
+        """Project a full-precision vector into the stored space (no-op without PCA)."""
+        vec = np.asarray(vec, dtype=np.float32)
+        if self.pca is not None and vec.shape[-1] == self.pca.full_dim:
+            return self.pca.transform(vec)
+        return vec
+
+    def to_full_space(self, vec):
+        vec = np.asarray(vec, dtype=np.float32)
+        if self.pca is not None and vec.shape[-1] == self.pca.dim:
+            return self.pca.inverse(vec)
+        return vec
+
+    # ---------------- Distances ----------------
+    def distances(self, q, rows=None):
+        """|x|^2 - 2 x.q for every (or the given) row, blockwise over the codes."""
+        codes = self.codes if rows is None else self.codes[rows]
+        norms = self.sq_norms if rows is None else self.sq_norms[rows]
+        dots = np.concatenate([
+            self.codec.dot(codes[i:i + BLOCK_ROWS], q) for i in range(0, len(codes), BLOCK_ROWS)
+        ]) if len(codes) else np.empty(0, dtype=np.float32)
+        return norms - 2.0 * dots
+
+    def vector(self, row):
+        return self.codec.decode(self.codes[row])
+
+
+def rerank(query, ids, vectors, k):
+    """Exact L2 re-ranking of candidate ids against their full-precision vectors."""
+    if not len(ids):
+        return []
+    vectors = np.asarray(vectors, dtype=np.float32)
+    d = np.einsum("ij,ij->i", vectors, vectors) - 2.0 * (vectors @ np.asarray(query, dtype=np.float32))
+    order = np.argsort(d)[:k]
+    return [int(ids[i]) for i in order]
@@ -0,0 +1,168 @@
+import os
+from dotenv import load_dotenv
+from utils.indexes import ensure_indexes as build_indexes
+
+load_dotenv()
+
+# sessions idle this long are summarised into session_archive and their swipes deleted
+SESSION_RETENTION_DAYS = float(os.getenv("SESSION_RETENTION_DAYS", "30"))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "500"))          # sessions archived per transaction
+# a maintenance batch gives up rather than queue behind live traffic
+RETENTION_LOCK_TIMEOUT = os.getenv("RETENTION_LOCK_TIMEOUT", "2s")
+
+
+# ---------------- Schema ----------------
+def _missing(cur):
+    cur.execute("""
+        SELECT
+            NOT EXISTS (SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'swipe_sessions' AND column_name = 'last_active'),
+            to_regclass('session_archive') IS NULL
+    """)
+    return cur.fetchone()
+
+
+def check_schema(conn):
+    """
+    Read-only startup check: the flush writes swipe_sessions.last_active, so
+    refuse to serve until maintain_sessions.py has migrated the schema.
+    """
+    with conn.cursor() as cur:
+        if any(_missing(cur)):
+            raise RuntimeError("retention schema missing: run "
+                               "`PYTHONPATH=backend python maintain_sessions.py --migrate` once")
+    conn.commit()
+
+
+def ensure_schema(conn):
+    """Activity timestamp on swipe_sessions and the archive table (DDL, run by maintain_sessions.py)."""
+    with conn.cursor() as cur:
+        no_column, _ = _missing(cur)
+        if no_column:
+            # a constant default: no table rewrite, existing sessions start their TTL now
+            cur.execute("ALTER TABLE swipe_sessions ADD COLUMN IF NOT EXISTS last_active timestamptz NOT NULL DEFAULT now()")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS session_archive (
+                session_id text PRIMARY KEY,
+                last_active timestamptz,
+                archived_at timestamptz NOT NULL DEFAULT now(),
+                food_swipes int NOT NULL DEFAULT 0,
+                category_swipes int NOT NULL DEFAULT 0,
+                left_swipes int NOT NULL DEFAULT 0,
+                right_swipes int NOT NULL DEFAULT 0,
+                liked_food_ids int[] NOT NULL DEFAULT '{}',
+                disliked_food_ids int[] NOT NULL DEFAULT '{}',
+                liked_category_ids int[] NOT NULL DEFAULT '{}',
+                super_food_id int,
+                super_category_id int,
+                current_category int,
+                intent_vector vector
+            )
+        """)
+    conn.commit()
+
+
+# Per-session access paths of the live tables: the state reload, the counts /
+# summary queries and the archiver all filter on session_id, and the covering
+# columns let the first two run as index-only scans.
+INDEXES = {
+    "session_food_session_idx": "session_food (session_id) INCLUDE (food_id, swipe_type)",
+    "session_category_session_idx": "session_category (session_id) INCLUDE (category_id, swipe_type)",
+    "swipe_sessions_last_active_idx": "swipe_sessions (last_active)",
+}
+
+
+def ensure_indexes(conn):
+    """Build the INDEXES concurrently (see utils.indexes); returns the names built."""
+    return build_indexes(conn, INDEXES)
+
+
+# ---------------- Archival ----------------
+def count_expired(conn, idle_days=SESSION_RETENTION_DAYS):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT COUNT(*) FROM swipe_sessions
+            WHERE last_active < now() - %s * interval '1 day'
+        """, (idle_days,))
+        return cur.fetchone()[0]
+
+
+def archive_batch(conn, idle_days=SESSION_RETENTION_DAYS, batch_size=RETENTION_BATCH):
+    """
+    Summarise up to batch_size idle sessions into session_archive and delete
+    their rows from the live tables, in one short transaction. Returns the
+    number of sessions archived.
+
+    Requests take no row locks, so what keeps live sessions out is the idle
+    threshold: every flush moves last_active forward. SKIP LOCKED only passes
+    over rows a flush (or another archiver) is writing right now; their new
+    last_active no longer matches once committed. A session that comes back
+    during the batch that archives it starts over with an empty history.
+    """
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute(f"SET LOCAL lock_timeout = '{RETENTION_LOCK_TIMEOUT}'")
+            cur.execute("""
+                SELECT id FROM swipe_sessions
+                WHERE last_active < now() - %s * interval '1 day'
+                ORDER BY last_active
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (idle_days, batch_size))
+            ids = [r[0] for r in cur.fetchall()]
+            if not ids:
+                return 0
+
+            cur.execute("""
+                WITH foods AS (
+                    SELECT session_id,
+                        COUNT(*) AS swipes,
+                        COUNT(*) FILTER (WHERE swipe_type = 'left') AS left_swipes,
+                        COUNT(*) FILTER (WHERE swipe_type = 'right') AS right_swipes,
+                        COALESCE(array_agg(food_id) FILTER (WHERE swipe_type <> 'left'), '{}') AS liked,
+                        COALESCE(array_agg(food_id) FILTER (WHERE swipe_type = 'left'), '{}') AS disliked,
+                        (array_agg(food_id) FILTER (WHERE swipe_type = 'super'))[1] AS super_id
+                    FROM session_food WHERE session_id = ANY(%(ids)s)
+                    GROUP BY session_id
+                ), categories AS (
+                    SELECT session_id,
+                        COUNT(*) AS swipes,
+                        COUNT(*) FILTER (WHERE swipe_type = 'left') AS left_swipes,
+                        COUNT(*) FILTER (WHERE swipe_type = 'right') AS right_swipes,
+                        COALESCE(array_agg(category_id) FILTER (WHERE swipe_type <> 'left'), '{}') AS liked,
+                        (array_agg(category_id) FILTER (WHERE swipe_type = 'super'))[1] AS super_id
+                    FROM session_category WHERE session_id = ANY(%(ids)s)
+                    GROUP BY session_id
+                )
+                INSERT INTO session_archive (
+                    session_id, last_active, food_swipes, category_swipes, left_swipes, right_swipes,
+                    liked_food_ids, disliked_food_ids, liked_category_ids,
+                    super_food_id, super_category_id, current_category, intent_vector
+                )
+                SELECT s.id::text, s.last_active,
+                    COALESCE(f.swipes, 0), COALESCE(c.swipes, 0),
+                    COALESCE(f.left_swipes, 0) + COALESCE(c.left_swipes, 0),
+                    COALESCE(f.right_swipes, 0) + COALESCE(c.right_swipes, 0),
+                    COALESCE(f.liked, '{}'), COALESCE(f.disliked, '{}'), COALESCE(c.liked, '{}'),
+                    f.super_id, c.super_id, m.current_category, m.intent_vector
+                FROM swipe_sessions s
+                LEFT JOIN foods f ON f.session_id = s.id
+                LEFT JOIN categories c ON c.session_id = s.id
+                LEFT JOIN session_memory m ON m.session_id = s.id
+                WHERE s.id = ANY(%(ids)s)
+                -- a session id reused after an earlier archival keeps its latest summary
+                ON CONFLICT (session_id) DO UPDATE SET
+                    last_active = EXCLUDED.last_active, archived_at = EXCLUDED.archived_at,
+                    food_swipes = EXCLUDED.food_swipes, category_swipes = EXCLUDED.category_swipes,
+                    left_swipes = EXCLUDED.left_swipes, right_swipes = EXCLUDED.right_swipes,
+                    liked_food_ids = EXCLUDED.liked_food_ids, disliked_food_ids = EXCLUDED.disliked_food_ids,
+                    liked_category_ids = EXCLUDED.liked_category_ids,
+                    super_food_id = EXCLUDED.super_food_id, super_category_id = EXCLUDED.super_category_id,
+                    current_category = EXCLUDED.current_category, intent_vector = EXCLUDED.intent_vector
+            """, {"ids": ids})
+
+            # children first, then the sessions they reference
+            for table in ("session_food", "session_category", "session_memory"):
+                cur.execute(f"DELETE FROM {table} WHERE session_id = ANY(%s)", (ids,))
+            cur.execute("DELETE FROM swipe_sessions WHERE id = ANY(%s)", (ids,))
+    return len(ids)
@@ -0,0 +1,114 @@
+import random
+import numpy as np
+
+SAMPLE_TRIES = 16
+
+
+class SeenSet:
+    """
+    Bitmap over the dense integer IDs of `food` / `categories`.
+
+    One bit per ID, so a session that has seen every food of a 1M catalogue
+    costs 125 KB, membership is O(1) and `mask()` tests a whole candidate
+    array at once.
+    """
+
+    __slots__ = ("bits", "count")
+
+    def __init__(self, ids=()):
+        self.bits = bytearray()
+        self.count = 0
+        for i in ids:
+            self.add(i)
+
+    def add(self, item_id):
+        byte, bit = item_id >> 3, 1 << (item_id & 7)
+        if byte >= len(self.bits):
+            # grow geometrically so a long session does not resize per swipe
+            self.bits.extend(bytes(max(byte + 1 - len(self.bits), len(self.bits))))
+        if not self.bits[byte] & bit:
+            self.bits[byte] |= bit
+            self.count += 1
+
+    def __contains__(self, item_id):
+        byte = item_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (item_id & 7)))
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def __iter__(self):
+        if not self.bits:
+            return iter(())
+        flags = np.unpackbits(np.frombuffer(self.bits, dtype=np.uint8), bitorder="little")
+        return iter(np.flatnonzero(flags).tolist())
+
+    def mask(self, ids):
+        """Boolean array: True where the corresponding ID has been seen."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.bits:
+            return np.zeros(len(ids), dtype=bool)
+        table = np.frombuffer(self.bits, dtype=np.uint8)
+        byte = ids >> 3
+        inside = byte < len(table)
+        out = np.zeros(len(ids), dtype=bool)
+        out[inside] = (table[byte[inside]] >> (ids[inside] & 7)) & 1 == 1
+        return out
+
+    # ---------------- Persistence ----------------
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        seen = cls()
+        seen.bits = bytearray(data)
+        seen.count = int(np.unpackbits(np.frombuffer(seen.bits, dtype=np.uint8)).sum()) if data else 0
+        return seen
+
+
+def sample_unseen(candidates, seen=(), tries=SAMPLE_TRIES):
+    """
+    Uniform random pick from `candidates` that is not in `seen`.
+
+    Rejection sampling answers in O(1) expected time while most candidates are
+    unseen; only when `tries` draws all hit seen IDs does it fall back to
+    filtering the candidate list.
+    """
+    n = len(candidates)
+    if n == 0:
+        return None
+    for _ in range(tries):
+        c = candidates[random.randrange(n)]
+        if c not in seen:
+            return int(c)
+
+    if isinstance(seen, SeenSet) and isinstance(candidates, np.ndarray):
+        remaining = candidates[~seen.mask(candidates)]
+    else:
+        remaining = [c for c in candidates if c not in seen]
+    return int(random.choice(remaining)) if len(remaining) else None
+
+
+def sample_unseen_k(candidates, seen=(), k=1, tries=SAMPLE_TRIES):
+    """Up to `k` distinct unseen candidates, in random order."""
+    if k == 1:
+        pick = sample_unseen(candidates, seen, tries)
+        return [] if pick is None else [pick]
+    n = len(candidates)
+    picked = []
+    taken = set()
+    for _ in range(tries * k):
+        if len(picked) == k or n == 0:
+            return picked
+        c = int(candidates[random.randrange(n)])
+        if c not in seen and c not in taken:
+            taken.add(c)
+            picked.append(c)
+
+    remaining = [int(c) for c in candidates if c not in seen and int(c) not in taken]
+    random.shuffle(remaining)
+    return picked + remaining[:k - len(picked)]
@@ -0,0 +1,297 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import hashlib
+import logging
+import tempfile
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# local: state lives in this worker only (one uvicorn worker, or sticky routing)
+# file:  one file per session under SESSION_DIR, shared by every worker on the host
+# redis: any Redis-protocol server at SESSION_REDIS_URL, shared across hosts
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "local")
+# tmpfs keeps the file backend in memory; it only exists on Linux, and only that backend uses it
+_SESSION_ROOT = "/dev/shm" if SESSION_BACKEND == "file" and os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SESSION_DIR = os.getenv("SESSION_DIR", os.path.join(_SESSION_ROOT, "food-sessions"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_KEY_PREFIX = os.getenv("SESSION_KEY_PREFIX", "food:session:")
+SESSION_REDIS_POOL = int(os.getenv("SESSION_REDIS_POOL", "8"))       # connections per worker
+# local with several workers is only correct when a proxy pins each session to one worker
+SESSION_STICKY = os.getenv("SESSION_STICKY", "0") == "1"
+
+
+class LocalBackend:
+    """No shared copy: the worker's own SessionStore cache is the only one."""
+
+    name = "local"
+    shared = False
+
+    async def get(self, session_id):
+        return None
+
+    async def put(self, session_id, data, ttl):
+        pass
+
+    async def delete(self, session_id):
+        pass
+
+    async def close(self):
+        pass
+
+
+# ---------------- Shared memory / disk ----------------
+class FileBackend:
+    """
+    One file per session. On tmpfs (/dev/shm) this is shared memory between
+    the workers of one host. Writers take an exclusive flock on the session's
+    lock file and rename a complete temp file into place, so readers never
+    see a half-written state.
+    """
+
+    name = "file"
+    shared = True
+
+    def __init__(self, directory=SESSION_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        # session ids come from the client, so never use them as file names directly
+        return os.path.join(self.directory, hashlib.sha1(session_id.encode()).hexdigest())
+
+    # blocking flock / file I/O runs on a worker thread, never on the event loop
+    async def get(self, session_id):
+        return await asyncio.to_thread(self._get, self._path(session_id))
+
+    async def put(self, session_id, data, ttl):
+        await asyncio.to_thread(self._put, self._path(session_id), data, ttl)
+
+    async def delete(self, session_id):
+        await asyncio.to_thread(self._remove, self._path(session_id))
+
+    def _get(self, path):
+        try:
+            if os.path.getmtime(path) < time.time():
+                # expiry is stored as the file's mtime
+                self._remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _put(path, data, ttl):
+        import fcntl  # POSIX only; imported here so the module still loads on Windows
+
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                expires = time.time() + ttl
+                os.utime(tmp, (expires, expires))
+                os.replace(tmp, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _remove(path):
+        for p in (path, path + ".lock"):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def sweep(self):
+        """Remove expired session files (run from maintenance, not the request path)."""
+        now = time.time()
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".lock", ".tmp")):
+                continue
+            if entry.stat().st_mtime < now:
+                self._remove(entry.path)
+                removed += 1
+        return removed
+
+    async def close(self):
+        pass
+
+
+# ---------------- Redis protocol ----------------
+class RedisError(Exception):
+    pass
+
+
+class RespConnection:
+    """One connection speaking the Redis serialization protocol (RESP2)."""
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+
+    @staticmethod
+    def _encode(args):
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, (bytes, bytearray)):
+                arg = str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("connection closed by server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RedisError(body.decode())
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            size = int(body)
+            if size < 0:
+                return None
+            data = await self._reader.readexactly(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(body)
+            return None if size < 0 else [await self._read_reply() for _ in range(size)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+    async def roundtrip(self, *args):
+        try:
+            self._writer.write(self._encode(args))
+            await self._writer.drain()
+            return await self._read_reply()
+        except RedisError:
+            # an error reply was read in full, the connection is still in step
+            raise
+        except BaseException:
+            # cancelled or broken mid-command: the reply may still be in flight
+            # and would be read as the answer to the next command, so drop the link
+            self.close()
+            raise
+
+    def close(self):
+        self._writer.close()
+
+
+class RespClient:
+    """
+    Minimal asyncio client for the Redis serialization protocol (RESP2):
+    enough for GET / SET EX / DEL / PING against Redis, Valkey, KeyDB, etc.
+    Keeps up to `size` connections, one command in flight on each.
+    """
+
+    def __init__(self, url=SESSION_REDIS_URL, size=SESSION_REDIS_POOL):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.size = size
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self):
+        conn = RespConnection(*await asyncio.open_connection(self.host, self.port))
+        try:
+            if self.password:
+                await conn.roundtrip("AUTH", self.password)
+            if self.db:
+                await conn.roundtrip("SELECT", self.db)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+    async def execute(self, *args):
+        async with self._slots:
+            # an idle connection may have been dropped by the server: retry once on a new one
+            for attempt in range(2):
+                conn = self._idle.pop() if self._idle and not attempt else await self._connect()
+                try:
+                    reply = await conn.roundtrip(*args)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    if attempt:
+                        raise
+                    continue
+                except RedisError:
+                    self._idle.append(conn)
+                    raise
+                self._idle.append(conn)
+                return reply
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class RedisBackend:
+    name = "redis"
+    shared = True
+
+    def __init__(self, url=SESSION_REDIS_URL, prefix=SESSION_KEY_PREFIX):
+        self.client = RespClient(url)
+        self.prefix = prefix
+
+    async def get(self, session_id):
+        return await self.client.execute("GET", self.prefix + session_id)
+
+    async def put(self, session_id, data, ttl):
+        await self.client.execute("SET", self.prefix + session_id, data, "EX", max(1, int(ttl)))
+
+    async def delete(self, session_id):
+        await self.client.execute("DEL", self.prefix + session_id)
+
+    async def close(self):
+        await self.client.close()
+
+
+BACKENDS = {"local": LocalBackend, "file": FileBackend, "redis": RedisBackend}
+
+
+def make_backend(name=SESSION_BACKEND):
+    return BACKENDS[name]()
+
+
+def worker_count(argv=None, env=None):
+    """Server workers configured for this app (uvicorn --workers, gunicorn -w, WEB_CONCURRENCY)."""
+    argv = sys.argv if argv is None else argv
+    env = os.environ if env is None else env
+    for i, arg in enumerate(argv):
+        for flag in ("--workers", "-w"):
+            if arg == flag and i + 1 < len(argv):
+                return int(argv[i + 1])
+            if arg.startswith(flag + "="):
+                return int(arg.split("=", 1)[1])
+    return int(env.get("WEB_CONCURRENCY", "1"))
+
+
+def check_workers(backend, workers=None):
+    """
+    The local backend keeps each session in one worker's memory only, so
+    with several workers they serve stale state and overwrite each other's
+    writes. Refuse to start unless sessions are pinned (SESSION_STICKY=1).
+    """
+    workers = worker_count() if workers is None else workers
+    if backend.shared or workers <= 1:
+        return
+    message = (f"SESSION_BACKEND=local with {workers} workers: each worker caches its own copy of a "
+               f"session; use SESSION_BACKEND=file or redis, or a single worker")
+    if not SESSION_STICKY:
+        raise RuntimeError(message)
+    logger.warning("%s (SESSION_STICKY=1, relying on sticky routing)", message)
@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+import numpy as np
+from psycopg.types.json import Jsonb
+from dotenv import load_dotenv
+from utils.seen_set import SeenSet
+from utils.session_backends import make_backend
+from utils.nutrition import NutritionFilter
+from utils.neighbor_graph import GRAPH_HISTORY
+from utils.db import hot_statement, SAMPLE_SESSION_ID
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))            # seconds idle before eviction
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "5"))
+SESSION_FLUSH_BATCH = int(os.getenv("SESSION_FLUSH_BATCH", "500"))
+
+# statements of the first request of a session (prepared on every pooled connection)
+FETCH_MEMORY_SQL = hot_statement("""
+    SELECT current_category, intent_vector, nutrition_filter, version
+    FROM session_memory WHERE session_id=%s
+""", (SAMPLE_SESSION_ID,))
+FETCH_FOOD_SWIPES_SQL = hot_statement("SELECT food_id, swipe_type FROM session_food WHERE session_id=%s", (SAMPLE_SESSION_ID,))
+FETCH_CATEGORY_SWIPES_SQL = hot_statement("SELECT category_id FROM session_category WHERE session_id=%s", (SAMPLE_SESSION_ID,))
+
+
+def ensure_schema(conn):
+    """Version column used by the flush to drop stale writes from other workers."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'session_memory' AND column_name = 'version'
+        """)
+        if cur.fetchone() is None:
+            cur.execute("ALTER TABLE session_memory ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 0")
+    conn.commit()
+
+
+class SessionState:
+    """Everything SwipeBrain needs about one session between requests."""
+
+    __slots__ = (
+        "session_id", "current_category", "intent_vector",
+        "seen_foods", "seen_categories", "food_swipes",
+        "queue", "queue_anchor", "nutrition", "recent_likes", "recent_dislikes",
+        "version", "dirty", "last_access",
+    )
+
+    def __init__(self, session_id, current_category=None, intent_vector=None,
+                 seen_foods=None, seen_categories=None, food_swipes=0, nutrition=None, version=0):
+        self.session_id = session_id
+        self.current_category = current_category
+        self.intent_vector = None if intent_vector is None else np.asarray(intent_vector, dtype=np.float32)
+        self.seen_foods = SeenSet(seen_foods or ())
+        self.seen_categories = SeenSet(seen_categories or ())
+        self.food_swipes = food_swipes
+        # prefetched nearest foods and the intent vector they were ranked for
+        self.queue = []
+        self.queue_anchor = None
+        # per-session nutrition bounds, applied as a pre-filter to food picks
+        self.nutrition = NutritionFilter.from_json(nutrition)
+        # last GRAPH_HISTORY liked / disliked food ids, oldest first (graph walk)
+        self.recent_likes = []
+        self.recent_dislikes = []
+        # bumped on every change; a flush never overwrites a newer row (see SessionStore.flush)
+        self.version = version
+        self.dirty = False
+        self.last_access = time.monotonic()
+
+    # ---------------- Serialization (shared backends) ----------------
+    def to_bytes(self):
+        """JSON header for the scalars, then the raw vectors and seen bitmaps."""
+        intent = b"" if self.intent_vector is None else np.asarray(self.intent_vector, dtype=np.float32).tobytes()
+        anchor = b"" if self.queue_anchor is None else np.asarray(self.queue_anchor, dtype=np.float32).tobytes()
+        foods, categories = self.seen_foods.to_bytes(), self.seen_categories.to_bytes()
+        header = json.dumps({
+            "c": self.current_category, "n": self.food_swipes, "q": [int(f) for f in self.queue],
+            "f": self.nutrition.to_json(), "l": self.recent_likes, "d": self.recent_dislikes,
+            "v": self.version,
+            "sizes": [len(intent), len(anchor), len(foods), len(categories)],
+        }).encode()
+        return b"".join([len(header).to_bytes(4, "little"), header, intent, anchor, foods, categories])
+
+    @classmethod
+    def from_bytes(cls, session_id, data):
+        size = int.from_bytes(data[:4], "little")
+        header = json.loads(data[4:4 + size])
+        parts, pos = [], 4 + size
+        for n in header["sizes"]:
+            parts.append(data[pos:pos + n])
+            pos += n
+        intent, anchor, foods, categories = parts
+        state = cls(session_id, header["c"], food_swipes=header["n"], nutrition=header.get("f"),
+                    version=header.get("v", 0))
+        state.intent_vector = np.frombuffer(intent, dtype=np.float32).copy() if intent else None
+        state.queue_anchor = np.frombuffer(anchor, dtype=np.float32).copy() if anchor else None
+        state.seen_foods = SeenSet.from_bytes(foods)
+        state.seen_categories = SeenSet.from_bytes(categories)
+        state.queue = header["q"]
+        state.recent_likes = header.get("l", [])
+        state.recent_dislikes = header.get("d", [])
+        return state
+
+    def remember_swipe(self, food_id, swipe_type):
+        recent = self.recent_dislikes if swipe_type == "left" else self.recent_likes
+        recent.append(int(food_id))
+        del recent[:-GRAPH_HISTORY]
+
+
+class SessionStore:
+    """
+    Write-behind cache of SessionState.
+
+    States are read from Postgres once, then served from memory. Changes only
+    mark the state dirty; dirty states are written to `session_memory` in
+    batches by `run_flusher()` every SESSION_FLUSH_INTERVAL seconds, and when
+    a state leaves the cache through LRU or TTL eviction.
+
+    With a shared `backend` (file or redis, see utils.session_backends) the
+    shared copy is read on every load and written after every request, so
+    any worker can serve any session; the local cache then only tracks which
+    states this worker still has to flush. Each state carries a version that
+    travels with the shared copy, and a flush only writes a row whose stored
+    version is older, so a worker flushing late cannot overwrite a newer
+    state written by another worker.
+    """
+
+    def __init__(self, max_sessions=SESSION_CACHE_SIZE, ttl=SESSION_TTL,
+                 flush_interval=SESSION_FLUSH_INTERVAL, flush_batch=SESSION_FLUSH_BATCH, backend=None):
+        self.backend = backend or make_backend()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._states = OrderedDict()
+        self._evicted = []
+        # states taken out of _evicted by a flush that has not committed yet
+        self._in_flight = {}
+        self._wakeup = asyncio.Event()
+        # maps intent vectors back to the stored embedding space (see CompactIndex)
+        self.intent_codec = None
+
+    def __len__(self):
+        return len(self._states)
+
+    def holds(self, session_id):
+        """True when this worker caches the session, i.e. it was loaded for an existing session."""
+        return session_id in self._states
+
+    # ---------------- Read path ----------------
+    async def load(self, conn, session_id):
+        if self.backend.shared:
+            state = await self._load_shared(session_id)
+            if state is not None:
+                return state
+
+        state = self._states.get(session_id)
+        if state is not None:
+            state.last_access = time.monotonic()
+            self._states.move_to_end(session_id)
+            return state
+
+        # evicted but not yet flushed (or flushing) → the in-memory copy is the newest
+        state = next((s for s in self._evicted if s.session_id == session_id), None)
+        if state is not None:
+            self._evicted.remove(state)
+        else:
+            state = self._in_flight.get(session_id)
+        if state is not None:
+            state.last_access = time.monotonic()
+        else:
+            state = await self._fetch(conn, session_id)
+        self._states[session_id] = state
+        self._states.move_to_end(session_id)
+        self._evict_overflow()
+        return state
+
+    async def _load_shared(self, session_id):
+        try:
+            data = await self.backend.get(session_id)
+        except Exception as e:
+            # the shared store is an accelerator; Postgres stays the source of truth
+            logger.warning("session backend read failed: %s", e)
+            return None
+        if data is None:
+            return None
+        state = SessionState.from_bytes(session_id, data)
+        # a local copy still waiting for its flush hands its dirty flag on
+        old = self._states.pop(session_id, None)
+        evicted = [s for s in self._evicted if s.session_id == session_id]
+        for s in evicted:
+            self._evicted.remove(s)
+        # a state whose flush is still in flight may not reach the table either
+        state.dirty = (any(s.dirty for s in evicted + ([old] if old else []))
+                       or session_id in self._in_flight)
+        self._states[session_id] = state
+        self._evict_overflow()
+        return state
+
+    async def publish(self, state):
+        """Write the state to the shared backend (no-op for the local one)."""
+        if not self.backend.shared:
+            return
+        try:
+            await self.backend.put(state.session_id, state.to_bytes(), self.ttl)
+        except Exception as e:
+            logger.warning("session backend write failed: %s", e)
+
+    async def _fetch(self, conn, session_id):
+        async with conn.cursor() as cur:
+            await cur.execute(FETCH_MEMORY_SQL, (session_id,))
+            row = await cur.fetchone()
+            if row is None:
+                await cur.execute("""
+                    INSERT INTO session_memory(session_id, current_category, intent_vector)
+                    VALUES (%s, NULL, NULL)
+                    ON CONFLICT DO NOTHING
+                """, (session_id,))
+                row = (None, None, None, 0)
+
+            await cur.execute(FETCH_FOOD_SWIPES_SQL, (session_id,))
+            food_swipes = await cur.fetchall()
+            seen_foods = [r[0] for r in food_swipes]
+            await cur.execute(FETCH_CATEGORY_SWIPES_SQL, (session_id,))
+            seen_categories = [r[0] for r in await cur.fetchall()]
+
+        state = SessionState(session_id, row[0], row[1], seen_foods, seen_categories,
+                             food_swipes=len(seen_foods), nutrition=row[2], version=row[3] or 0)
+        for food_id, swipe_type in food_swipes:
+            state.remember_swipe(food_id, swipe_type)
+        return state
+
+    # ---------------- Write path ----------------
+    def mark_dirty(self, state):
+        state.dirty = True
+        state.version += 1
+
+    def discard(self, session_id):
+        """Drop a session from the cache without writing it back."""
+        self._states.pop(session_id, None)
+
+    def snapshot(self, state):
+        """Serialized copy of a state, to undo a request that fails halfway (see restore)."""
+        return state.to_bytes()
+
+    async def restore(self, state, data):
+        """
+        Put back the state captured by `snapshot` after its request rolled
+        back. It gets a version above the abandoned one, so neither a flush
+        nor the shared copy of the abandoned state can win over it.
+        """
+        restored = SessionState.from_bytes(state.session_id, data)
+        restored.version = state.version + 1
+        restored.dirty = True
+        self._evicted = [s for s in self._evicted if s.session_id != state.session_id]
+        self._states[state.session_id] = restored
+        self._states.move_to_end(state.session_id)
+        await self.publish(restored)
+        return restored
+
+    def _expired(self, state, now=None):
+        return ((now or time.monotonic()) - state.last_access) > self.ttl
+
+    def _evict(self, session_id):
+        state = self._states.pop(session_id)
+        if state.dirty:
+            self._evicted.append(state)
+            if len(self._evicted) >= self.flush_batch:
+                self._wakeup.set()
+
+    def _evict_overflow(self):
+        while len(self._states) > self.max_sessions:
+            self._evict(next(iter(self._states)))
+
+    def evict_expired(self):
+        now = time.monotonic()
+        # the OrderedDict is kept in access order, so expired states are at the front
+        while self._states:
+            sid, state = next(iter(self._states.items()))
+            if not self._expired(state, now):
+                break
+            self._evict(sid)
+
+    async def flush(self, conn):
+        """Write every dirty state (cached or evicted) back in one batch."""
+        pending = self._evicted + [s for s in self._states.values() if s.dirty]
+        self._evicted = []
+        if not pending:
+            return 0
+        # until the commit lands the table row is stale, so load() must still find these
+        flushing = {s.session_id: s for s in pending if s.session_id not in self._states}
+        self._in_flight.update(flushing)
+        for state in pending:
+            state.dirty = False
+        codec = self.intent_codec
+        rows = [
+            (s.session_id, s.current_category,
+             codec.to_storage_space(s.intent_vector) if codec and s.intent_vector is not None else s.intent_vector,
+             Jsonb(s.nutrition.to_json()) if s.nutrition else None,
+             s.version, s.session_id, s.version)
+            for s in pending
+        ]
+        try:
+            async with conn.cursor() as cur:
+                # last_active drives retention (see utils.retention); it rides on the flush
+                await cur.executemany("""
+                    WITH touched AS (
+                        UPDATE swipe_sessions SET last_active = now() WHERE id = %s
+                    )
+                    UPDATE session_memory
+                    SET current_category=%s, intent_vector=%s, nutrition_filter=%s, version=%s
+                    WHERE session_id=%s AND version < %s
+                """, rows)
+            await conn.commit()
+        except Exception:
+            # keep the states dirty so the next cycle retries them
+            for state in pending:
+                state.dirty = True
+                if state.session_id not in self._states:
+                    self._evicted.append(state)
+            raise
+        finally:
+            for sid, state in flushing.items():
+                if self._in_flight.get(sid) is state:
+                    del self._in_flight[sid]
+        return len(pending)
+
+    async def run_flusher(self, connection_factory):
+        """Background task: evict idle sessions and flush dirty ones periodically."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self.evict_expired()
+            try:
+                async with connection_factory() as conn:
+                    await self.flush(conn)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("session flush failed")
+
+
+session_store = SessionStore()
@@ -0,0 +1,160 @@
+import os
+import json
+import logging
+import numpy as np
+import psycopg
+from dotenv import load_dotenv
+from utils.embedder import EMBEDDING_ID
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "food_embeddings.snap"))
+
+MAGIC = b"FOODSNAP"
+FORMAT_VERSION = 2
+HEADER_SIZE = 4096
+ALIGN = 64
+
+
+def ensure_catalog_meta(conn):
+    """One-row table holding the counter that add_embeddings.py bumps on every write."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                id boolean PRIMARY KEY DEFAULT true CHECK (id),
+                embeddings_version bigint NOT NULL DEFAULT 0
+            )
+        """)
+        cur.execute("INSERT INTO catalog_meta DEFAULT VALUES ON CONFLICT DO NOTHING")
+    conn.commit()
+
+
+def bump_embeddings_version(cur):
+    """Call in the transaction that writes embeddings, so every snapshot taken before it goes stale."""
+    cur.execute("UPDATE catalog_meta SET embeddings_version = embeddings_version + 1")
+
+
+def catalog_version(conn):
+    """
+    Stamp of the embedded catalogue: the embedding model, the number of
+    embedded foods and their highest id (foods added or removed), and the
+    catalog_meta counter (foods re-embedded). Cheap enough for every boot.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM food WHERE embedding IS NOT NULL")
+        count, max_id = cur.fetchone()
+        cur.execute("SELECT to_regclass('catalog_meta') IS NOT NULL")
+        embeddings = 0
+        if cur.fetchone()[0]:
+            cur.execute("SELECT embeddings_version FROM catalog_meta")
+            row = cur.fetchone()
+            embeddings = row[0] if row else 0
+    return f"{EMBEDDING_ID}:{count}-{max_id}-{embeddings}"
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_arrays(path, magic, meta, arrays):
+    """
+    Layout: a 4 KB header (magic + JSON meta with dtypes, shapes and offsets),
+    then the arrays, each 64-byte aligned. Written to a temp file and renamed
+    into place, so a reader never maps a half-written file.
+    """
+    layout, offset = {}, HEADER_SIZE
+    for name, arr in arrays:
+        layout[name] = {"offset": offset, "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        offset = _aligned(offset + arr.nbytes)
+
+    header = json.dumps({"format": FORMAT_VERSION, "arrays": layout, **meta}).encode()
+    if len(magic) + 4 + len(header) > HEADER_SIZE:
+        raise ValueError("snapshot header too large")
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(magic + len(header).to_bytes(4, "little") + header)
+        for name, arr in arrays:
+            f.seek(layout[name]["offset"])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def map_arrays(path, magic):
+    """(meta, {name: read-only memmap}) of a file written by `write_arrays`."""
+    with open(path, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{path}: not a {magic.decode()} file")
+        size = int.from_bytes(f.read(4), "little")
+        meta = json.loads(f.read(size))
+    if meta["format"] != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported snapshot format {meta['format']}")
+    arrays = {
+        name: np.memmap(path, dtype=np.dtype(a["dtype"]), mode="r", offset=a["offset"], shape=tuple(a["shape"]))
+        for name, a in meta.pop("arrays").items()
+    }
+    return meta, arrays
+
+
+def write_snapshot(path, version, ids, category_ids, matrix, ivf=None):
+    """
+    food ids, category ids, squared norms and embeddings, all sorted by food
+    id, plus the IVF centroids and row -> cell assignment when `ivf` is given.
+    """
+    order = np.argsort(ids)
+    ids = np.asarray(ids, dtype=np.int64)[order]
+    category_ids = np.asarray(category_ids, dtype=np.int64)[order]
+    matrix = np.ascontiguousarray(np.asarray(matrix, dtype=np.float32)[order])
+    sq_norms = np.einsum("ij,ij->i", matrix, matrix).astype(np.float32)
+    arrays = [("ids", ids), ("category_ids", category_ids), ("sq_norms", sq_norms), ("matrix", matrix)]
+    if ivf is not None:
+        centroids, assign = ivf
+        arrays += [("ivf_centroids", np.asarray(centroids, dtype=np.float32)),
+                   ("ivf_assign", np.asarray(assign, dtype=np.int32)[order])]
+    return write_arrays(path, MAGIC, {"version": version}, arrays)
+
+
+class Snapshot:
+    """Read-only memory map of a snapshot; every worker shares the same page cache."""
+
+    def __init__(self, path=SNAPSHOT_PATH):
+        self.path = path
+        meta, arrays = map_arrays(path, MAGIC)
+        self.version = meta["version"]
+        self.ids = arrays["ids"]
+        self.category_ids = arrays["category_ids"]
+        self.sq_norms = arrays["sq_norms"]
+        self.matrix = arrays["matrix"]
+        # optional: IVF cells trained by export_snapshot.py --ivf
+        self.ivf_centroids = arrays.get("ivf_centroids")
+        self.ivf_assign = arrays.get("ivf_assign")
+
+    def is_current(self, conn):
+        return self.version == catalog_version(conn)
+
+
+def open_snapshot(conn, path=SNAPSHOT_PATH):
+    """The snapshot at `path` if it exists and matches the catalogue, else None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        snap = Snapshot(path)
+    except (ValueError, OSError) as e:
+        logger.warning("ignoring snapshot %s: %s", path, e)
+        return None
+    try:
+        current = snap.is_current(conn)
+    except psycopg.Error as e:
+        logger.warning("cannot check snapshot %s against the catalogue, loading embeddings from the database: %s",
+                       path, e)
+        return None
+    if not current:
+        logger.warning("snapshot %s is stale, loading embeddings from the database", path)
+        return None
+    return snap
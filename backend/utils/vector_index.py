@@ -0,0 +1,468 @@
+import os
+import logging
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from utils.quantize import CompactStore, rerank
+from utils.embedder import EMBEDDING_DIM
+from utils.snapshot import open_snapshot, catalog_version
+from utils.indexes import missing_indexes
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# pgvector | halfvec | numpy | ivf | compact
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pgvector")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))       # 0 → sqrt(n)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+ASSIGN_ROWS = 8192      # points per k-means assignment step, bounds the distance slab
+FETCH_ROWS = 5000       # rows per round trip when embeddings come from Postgres
+# compact: int8 | float16 codes, optional PCA reduction, and how many
+# candidates per result are re-ranked against full-precision embeddings
+VECTOR_QUANT = os.getenv("VECTOR_QUANT", "int8")
+VECTOR_PCA_DIM = int(os.getenv("VECTOR_PCA_DIM", "0"))
+VECTOR_RESCORE = int(os.getenv("VECTOR_RESCORE", "4"))
+
+
+def _as_query(query):
+    return np.asarray(query, dtype=np.float32).reshape(-1)
+
+
+def _top_k(dists, k):
+    """Indices of the k smallest finite distances, nearest first."""
+    k = min(k, int(np.isfinite(dists).sum()))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(dists, k - 1)[:k]
+    return part[np.argsort(dists[part])]
+
+
+def fetch_embeddings(conn):
+    """
+    Return (ids, matrix) for every food that has an embedding, streamed from a
+    server-side cursor straight into the preallocated matrix.
+    """
+    # one snapshot of the table for the count and the rows
+    with conn.transaction():
+        conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*), MAX(vector_dims(embedding)) FROM food WHERE embedding IS NOT NULL")
+            n, dim = cur.fetchone()
+        if not n:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        ids = np.empty(n, dtype=np.int64)
+        matrix = np.empty((n, dim), dtype=np.float32)
+        with conn.cursor(name="fetch_embeddings") as cur:
+            cur.itersize = FETCH_ROWS
+            cur.execute("SELECT id, embedding FROM food WHERE embedding IS NOT NULL ORDER BY id")
+            for i, (food_id, emb) in enumerate(cur):
+                ids[i] = food_id
+                matrix[i] = emb
+    return ids, matrix
+
+
+# ---------------- pgvector (fallback) ----------------
+class PgvectorIndex:
+    """Nearest neighbours computed by Postgres with `embedding <-> query`."""
+
+    name = "pgvector"
+    ready = True
+
+    def load(self, conn):
+        return self
+
+    def vector(self, food_id):
+        # embeddings live in Postgres only
+        return None
+
+    # {where}: optional pre-filter on the typed nutrition columns (see NutritionFilter.sql)
+    SEARCH_SQL = """
+        SELECT id FROM food
+        WHERE embedding IS NOT NULL AND id <> ALL(%s::int[]){where}
+        ORDER BY embedding <-> %s::vector
+        LIMIT %s
+    """
+
+    # exact ranking of an explicit candidate set (a category subtree)
+    WITHIN_SQL = """
+        SELECT id FROM food
+        WHERE id = ANY(%s::int[]) AND embedding IS NOT NULL AND id <> ALL(%s::int[]){where}
+        ORDER BY embedding <-> %s::vector
+        LIMIT %s
+    """
+
+    def _params(self, query, k, exclude, filter_params=()):
+        return (list(exclude), *filter_params, list(map(float, query)), k)
+
+    def _statement(self, query, k, exclude, within, where):
+        clause, filter_params = where.sql() if where else ("", ())
+        if within is None:
+            return self.SEARCH_SQL.format(where=clause), self._params(query, k, exclude, filter_params)
+        return self.WITHIN_SQL.format(where=clause), (
+            list(map(int, within)), list(exclude), *filter_params, list(map(float, query)), k
+        )
+
+    def search(self, query, k=1, exclude=(), conn=None, within=None, where=None):
+        with conn.cursor() as cur:
+            cur.execute(*self._statement(query, k, exclude, within, where))
+            return [row[0] for row in cur.fetchall()]
+
+    async def asearch(self, query, k=1, exclude=(), conn=None, within=None, where=None):
+        async with conn.cursor() as cur:
+            await cur.execute(*self._statement(query, k, exclude, within, where))
+            return [row[0] for row in await cur.fetchall()]
+
+
+class PgHalfvecIndex(PgvectorIndex):
+    """
+    pgvector search over a half-precision HNSW expression index, with the
+    candidates re-ranked by the full-precision `embedding <-> query`.
+    """
+
+    name = "halfvec"
+
+    SEARCH_SQL = f"""
+        SELECT id FROM (
+            SELECT id, embedding FROM food
+            WHERE embedding IS NOT NULL AND id <> ALL(%s::int[]){{where}}
+            ORDER BY embedding::halfvec({EMBEDDING_DIM}) <-> %s::halfvec({EMBEDDING_DIM})
+            LIMIT %s
+        ) candidates
+        ORDER BY embedding <-> %s::vector
+        LIMIT %s
+    """
+
+    # HNSW expression index the search relies on; built offline by build_indexes.py
+    INDEXES = {
+        "food_embedding_halfvec_idx":
+            f"food USING hnsw ((embedding::halfvec({EMBEDDING_DIM})) halfvec_l2_ops)",
+    }
+
+    def load(self, conn):
+        # only check: building HNSW here would block writes to food and stall startup
+        if missing_indexes(conn, self.INDEXES):
+            logger.warning("food_embedding_halfvec_idx is missing; halfvec searches scan the whole "
+                           "table until build_indexes.py has built it")
+        return self
+
+    def _params(self, query, k, exclude, filter_params=()):
+        q = list(map(float, query))
+        return (list(exclude), *filter_params, q, k * max(VECTOR_RESCORE, 1), q, k)
+
+
+# ---------------- NumPy brute force ----------------
+class BruteForceIndex:
+    """Exact L2 search over the full embedding matrix held in memory."""
+
+    name = "numpy"
+
+    def __init__(self):
+        self.ready = False
+        self.ids = np.empty(0, dtype=np.int64)
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+        self._lock = threading.Lock()
+        # catalogue stamp at load time (see reload_if_stale)
+        self.version = None
+
+    def successor(self):
+        """An empty index configured like this one, to rebuild and swap in whole."""
+        return type(self)()
+
+    def load(self, conn):
+        self.version = catalog_version(conn)
+        # a fresh snapshot is memory-mapped instead of pulling every embedding
+        snap = open_snapshot(conn)
+        if snap is not None:
+            return self.build(snap.ids, snap.matrix, snap.sq_norms)
+        ids, matrix = fetch_embeddings(conn)
+        return self.build(ids, matrix)
+
+    def build(self, ids, matrix, sq_norms=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+            order = np.argsort(ids)
+            ids, matrix, sq_norms = ids[order], matrix[order], None
+        with self._lock:
+            self.ids = ids
+            # already sorted float32 input (e.g. a memory map) is used without a copy
+            self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+            self.sq_norms = sq_norms if sq_norms is not None else np.einsum("ij,ij->i", self.matrix, self.matrix)
+            self.ready = len(self.ids) > 0
+        return self
+
+    def rows_for(self, ids):
+        """Row positions of the given food ids (unknown ids are dropped)."""
+        ids = np.fromiter(ids, dtype=np.int64) if not isinstance(ids, np.ndarray) else ids
+        pos = np.searchsorted(self.ids, ids)
+        pos = np.clip(pos, 0, max(len(self.ids) - 1, 0))
+        return pos[self.ids[pos] == ids] if len(self.ids) else pos[:0]
+
+    def _excluded(self, exclude, rows=None):
+        """Boolean mask over `rows` (default: every row) of excluded foods."""
+        ids = self.ids if rows is None else self.ids[rows]
+        if hasattr(exclude, "mask"):
+            return exclude.mask(ids)
+        return np.isin(ids, np.fromiter(exclude, dtype=np.int64))
+
+    def vector(self, food_id):
+        rows = self.rows_for([food_id])
+        return self.matrix[rows[0]] if len(rows) else None
+
+    def _distances(self, q, rows=None):
+        # |x - q|^2 = |x|^2 - 2 x.q + |q|^2 ; the |q|^2 term does not change the ranking
+        if rows is None:
+            return self.sq_norms - 2.0 * (self.matrix @ q)
+        return self.sq_norms[rows] - 2.0 * (self.matrix[rows] @ q)
+
+    def _rank_rows(self, q, rows, k, exclude, where=None):
+        """Ids of the k nearest of the given rows."""
+        if exclude:
+            rows = rows[~self._excluded(exclude, rows)]
+        if where:
+            rows = rows[where.allows(self.ids[rows])]
+        return self.ids[rows[_top_k(self._distances(q, rows), k)]]
+
+    def search(self, query, k=1, exclude=(), conn=None, within=None, where=None):
+        q = _as_query(query)
+        if within is not None:
+            return self._rank_rows(q, self.rows_for(within), k, exclude, where).tolist()
+        dists = self._distances(q)
+        if exclude:
+            dists[self._excluded(exclude)] = np.inf
+        if where:
+            # pre-filter: foods outside the bounds are never ranked
+            dists[~where.allows(self.ids)] = np.inf
+        return self.ids[_top_k(dists, k)].tolist()
+
+    async def asearch(self, query, k=1, exclude=(), conn=None, within=None, where=None):
+        # in-memory search is CPU-only and sub-millisecond, no need to offload
+        return self.search(query, k, exclude, within=within, where=where)
+
+
+# ---------------- IVF (approximate) ----------------
+def train_ivf(matrix, nlist=IVF_NLIST, iterations=10, seed=0, block=ASSIGN_ROWS):
+    """
+    (centroids, row -> cell assignment) of a k-means coarse quantizer;
+    nlist=0 means sqrt(n) cells.
+    """
+    n = len(matrix)
+    nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+    rng = np.random.default_rng(seed)
+    centroids = np.asarray(matrix[rng.choice(n, nlist, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        assign = _assign(matrix, centroids, block)
+        for c, rows in enumerate(ivf_lists(assign, nlist)):
+            # an empty cell keeps its previous centroid
+            if len(rows):
+                centroids[c] = matrix[rows].mean(axis=0)
+    return centroids, _assign(matrix, centroids, block)
+
+
+def _assign(points, centroids, block=ASSIGN_ROWS):
+    """Nearest centroid per point, one (block x nlist) distance slab at a time."""
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    assign = np.empty(len(points), dtype=np.int32)
+    for i in range(0, len(points), block):
+        dists = c_norms[None, :] - 2.0 * (np.asarray(points[i:i + block], dtype=np.float32) @ centroids.T)
+        assign[i:i + block] = np.argmin(dists, axis=1)
+    return assign
+
+
+def ivf_lists(assign, nlist):
+    """Row positions of every cell, ascending within a cell."""
+    order = np.argsort(assign, kind="stable")
+    return np.split(order, np.cumsum(np.bincount(assign, minlength=nlist))[:-1])
+
+
+class IVFIndex(BruteForceIndex):
+    """
+    Inverted-file index: a k-means coarse quantizer splits the catalogue
+    into `nlist` cells and a query only scans the `nprobe` closest cells.
+    """
+
+    name = "ivf"
+
+    def __init__(self, nlist=IVF_NLIST, nprobe=IVF_NPROBE, iterations=10, seed=0):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.lists = []
+
+    def successor(self):
+        return IVFIndex(self.nlist, self.nprobe, self.iterations, self.seed)
+
+    def load(self, conn):
+        self.version = catalog_version(conn)
+        snap = open_snapshot(conn)
+        if snap is None:
+            ids, matrix = fetch_embeddings(conn)
+            return self.build(ids, matrix)
+        if snap.ivf_centroids is not None and self.nlist in (0, len(snap.ivf_centroids)):
+            # cells trained offline by export_snapshot.py, no k-means in the worker
+            return self.build(snap.ids, snap.matrix, snap.sq_norms,
+                              centroids=snap.ivf_centroids, assign=snap.ivf_assign)
+        logger.warning("snapshot %s has no IVF cells for nlist=%s; training k-means in this worker "
+                       "(export_snapshot.py --ivf precomputes them)", snap.path, self.nlist or "auto")
+        return self.build(snap.ids, snap.matrix, snap.sq_norms)
+
+    def build(self, ids, matrix, sq_norms=None, centroids=None, assign=None):
+        """`centroids` / `assign` (row -> cell, rows sorted by id) skip the k-means training."""
+        super().build(ids, matrix, sq_norms)
+        n = len(self.ids)
+        if n == 0:
+            return self
+        if centroids is None or assign is None or len(assign) != n:
+            centroids, assign = train_ivf(self.matrix, self.nlist, self.iterations, self.seed)
+        with self._lock:
+            self.centroids = np.asarray(centroids, dtype=np.float32)
+            self.lists = ivf_lists(assign, len(self.centroids))
+        return self
+
+    def search(self, query, k=1, exclude=(), conn=None, within=None, where=None):
+        q = _as_query(query)
+        if within is not None:
+            # a subtree is small enough to scan exactly
+            return self._rank_rows(q, self.rows_for(within), k, exclude, where).tolist()
+        c_dists = np.einsum("ij,ij->i", self.centroids, self.centroids) - 2.0 * (self.centroids @ q)
+        order = np.argsort(c_dists)
+
+        # widen the probe until enough unseen candidates are found
+        nprobe = min(self.nprobe, len(order))
+        while True:
+            rows = np.concatenate([self.lists[c] for c in order[:nprobe]])
+            if exclude:
+                rows = rows[~self._excluded(exclude, rows)]
+            if where:
+                rows = rows[where.allows(self.ids[rows])]
+            if len(rows) >= k or nprobe >= len(order):
+                break
+            nprobe = min(nprobe * 2, len(order))
+
+        dists = self._distances(q, rows)
+        return self.ids[rows[_top_k(dists, k)]].tolist()
+
+
+# ---------------- Quantized in-memory index ----------------
+class CompactIndex(BruteForceIndex):
+    """
+    Brute-force search over int8 / float16 codes (optionally PCA-reduced),
+    with the top `rescore * k` candidates re-ranked against full-precision
+    embeddings fetched from Postgres.
+
+    Vectors handed out by `vector()` live in the reduced space, so session
+    intent vectors built from them are held at the same size.
+    """
+
+    name = "compact"
+
+    def __init__(self, codec=VECTOR_QUANT, pca_dim=VECTOR_PCA_DIM, rescore=VECTOR_RESCORE):
+        super().__init__()
+        self.store = CompactStore(codec, pca_dim)
+        self.rescore = rescore
+        # optional in-process source of full vectors (ids -> matrix), used offline
+        self.full_vectors = None
+
+    def successor(self):
+        index = CompactIndex.__new__(CompactIndex)
+        BruteForceIndex.__init__(index)
+        index.store = self.store.successor()
+        index.rescore = self.rescore
+        index.full_vectors = self.full_vectors
+        return index
+
+    def build(self, ids, matrix, sq_norms=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        # a snapshot is already sorted; encoding straight from its memory map
+        # never holds a float32 copy of the catalogue
+        if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+            order = np.argsort(ids)
+            ids, matrix = ids[order], matrix[order]
+        store = self.store.build(matrix) if len(ids) else self.store
+        with self._lock:
+            self.ids = ids
+            self.store = store
+            self.ready = len(self.ids) > 0
+        return self
+
+    def vector(self, food_id):
+        rows = self.rows_for([food_id])
+        return self.store.vector(rows[0]) if len(rows) else None
+
+    def to_index_space(self, vec):
+        return self.store.to_index_space(vec)
+
+    def to_storage_space(self, vec):
+        return self.store.to_full_space(vec)
+
+    def _distances(self, q, rows=None):
+        return self.store.distances(q, rows)
+
+    def _candidates(self, query, n, exclude, within=None, where=None):
+        q = self.store.to_index_space(_as_query(query))
+        if within is not None:
+            return self._rank_rows(q, self.rows_for(within), n, exclude, where)
+        dists = self._distances(q)
+        if exclude:
+            dists[self._excluded(exclude)] = np.inf
+        if where:
+            dists[~where.allows(self.ids)] = np.inf
+        return self.ids[_top_k(dists, n)]
+
+    def search(self, query, k=1, exclude=(), conn=None, within=None, where=None):
+        if not self.rescore or self.full_vectors is None:
+            return self._candidates(query, k, exclude, within, where).tolist()
+        ids = self._candidates(query, k * self.rescore, exclude, within, where)
+        return rerank(self.store.to_full_space(query), ids, self.full_vectors(ids), k)
+
+    async def asearch(self, query, k=1, exclude=(), conn=None, within=None, where=None):
+        if not self.rescore or conn is None:
+            return self.search(query, k, exclude, within=within, where=where)
+        ids = self._candidates(query, k * self.rescore, exclude, within, where).tolist()
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT id, embedding FROM food WHERE id = ANY(%s::int[])", (ids,)
+            )
+            rows = await cur.fetchall()
+        if not rows:
+            return []
+        return rerank(self.store.to_full_space(query), [r[0] for r in rows],
+                      np.vstack([np.asarray(r[1], dtype=np.float32) for r in rows]), k)
+
+
+BACKENDS = {
+    "pgvector": PgvectorIndex,
+    "halfvec": PgHalfvecIndex,
+    "numpy": BruteForceIndex,
+    "ivf": IVFIndex,
+    "compact": CompactIndex,
+}
+
+pgvector_index = PgvectorIndex()
+vector_index = BACKENDS[VECTOR_BACKEND]() if VECTOR_BACKEND != "pgvector" else pgvector_index
+
+
+def get_vector_index():
+    """Configured index, or pgvector while the in-memory index is not loaded."""
+    return vector_index if vector_index.ready else pgvector_index
+
+
+def reload_if_stale(conn):
+    """
+    Rebuild the in-memory index when the embedded catalogue has changed (new,
+    removed or re-embedded foods, see utils.snapshot.catalog_version) and
+    swap it in with one assignment, so searches in flight finish on the old
+    one. Returns the new index, or None when nothing changed (always for the
+    Postgres backends, which have no copy to refresh).
+    """
+    global vector_index
+    if not isinstance(vector_index, BruteForceIndex) or catalog_version(conn) == vector_index.version:
+        return None
+    vector_index = vector_index.successor().load(conn)
+    logger.info("%s index reloaded: %d foods", vector_index.name, len(vector_index.ids))
+    return vector_index
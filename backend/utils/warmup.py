@@ -0,0 +1,105 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from dotenv import load_dotenv
+from utils.metrics import registry
+from utils.vector_index import get_vector_index
+from utils.intent import PREFETCH_SIZE
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERIES = int(os.getenv("WARMUP_QUERIES", "20"))          # sample vector searches run at startup
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "60"))
+# load the food table and its indexes into shared buffers when pg_prewarm is installed
+WARMUP_PREWARM = os.getenv("WARMUP_PREWARM", "1") == "1"
+
+
+# ---------------- Startup warm-up ----------------
+_ready = registry.gauge("app_ready", "1 once the startup warm-up has finished")
+
+
+class Warmup:
+    """
+    Readiness of this worker. The lifespan opens the pool and loads the
+    in-memory indexes, then runs `run()` in the background; /ready answers
+    503 until it is done, while / (liveness) answers from the start.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.seconds = None
+        self.error = None
+        _ready.set(0)
+
+    def set_ready(self, ready):
+        self.ready = ready
+        _ready.set(1 if ready else 0)
+
+    async def run(self, pool, connection_factory, timeout=WARMUP_TIMEOUT):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._warm(pool, connection_factory), timeout)
+        except Exception as e:
+            # warm-up only speeds up the first requests; serve cold rather than never
+            self.error = repr(e)
+            logger.warning("warm-up incomplete: %s", self.error)
+        self.seconds = round(time.perf_counter() - started, 3)
+        self.set_ready(True)
+
+    async def _warm(self, pool, connection_factory):
+        # every min_size connection open (and configured) before taking traffic
+        await pool.wait()
+        async with connection_factory() as conn:
+            if WARMUP_PREWARM:
+                await self._prewarm(conn)
+            queries = await self._sample_queries(conn)
+
+        # hold min_size connections at once so each gets its own searches
+        async with AsyncExitStack() as stack:
+            conns = [await stack.enter_async_context(connection_factory()) for _ in range(pool.min_size)]
+            await asyncio.gather(*(self._search(conn, queries[i::len(conns)]) for i, conn in enumerate(conns)))
+
+    @staticmethod
+    async def _prewarm(conn):
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")
+            if await cur.fetchone() is None:
+                return
+            await cur.execute("""
+                SELECT pg_prewarm(c.oid::regclass) FROM pg_class c
+                WHERE c.oid = 'food'::regclass
+                   OR c.oid IN (SELECT indexrelid FROM pg_index WHERE indrelid = 'food'::regclass)
+            """)
+
+    @staticmethod
+    async def _sample_queries(conn):
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                SELECT embedding FROM food WHERE embedding IS NOT NULL
+                ORDER BY id LIMIT %s
+            """, (WARMUP_QUERIES,))
+            rows = [r[0] for r in await cur.fetchall()]
+        index = get_vector_index()
+        # a compact index searches in its own (reduced) space
+        if hasattr(index, "to_index_space"):
+            rows = [index.to_index_space(r) for r in rows]
+        return rows
+
+    @staticmethod
+    async def _search(conn, queries):
+        """The recommender's search, prepared on the first run, and index pages pulled into cache."""
+        index = get_vector_index()
+        threshold = conn.prepare_threshold
+        conn.prepare_threshold = 0
+        try:
+            for query in queries:
+                await index.asearch(query, k=PREFETCH_SIZE, exclude=(), conn=conn)
+        finally:
+            conn.prepare_threshold = threshold
+
+
+warmup = Warmup()
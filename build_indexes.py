@@ -0,0 +1,38 @@
+import time
+import argparse
+from dotenv import load_dotenv
+from utils.db import get_conn, put_conn
+from utils.indexes import ensure_indexes
+from utils.nutrition import INDEXES as NUTRITION_INDEXES
+from utils.retention import INDEXES as RETENTION_INDEXES
+from utils.vector_index import PgHalfvecIndex, VECTOR_BACKEND
+load_dotenv()
+
+
+def run(halfvec=VECTOR_BACKEND == "halfvec"):
+    """
+    Build the indexes the backend expects, with CREATE INDEX CONCURRENTLY so
+    the app keeps serving (and writing) meanwhile. The app only checks for
+    them at startup. Safe to re-run: existing valid indexes are skipped.
+    """
+    indexes = {**NUTRITION_INDEXES, **RETENTION_INDEXES}
+    if halfvec:
+        indexes.update(PgHalfvecIndex.INDEXES)
+    started = time.monotonic()
+    conn = get_conn()
+    try:
+        for name, definition in indexes.items():
+            step = time.monotonic()
+            if ensure_indexes(conn, {name: definition}):
+                print(f"index built: {name} ({time.monotonic() - step:.1f}s)")
+    finally:
+        put_conn(conn)
+    print(f"Indexes ready: {len(indexes)}, {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the backend's indexes concurrently.")
+    parser.add_argument("--halfvec", action="store_true",
+                        help="also build the HNSW halfvec index (default: when VECTOR_BACKEND=halfvec)")
+    args = parser.parse_args()
+    run(args.halfvec or VECTOR_BACKEND == "halfvec")
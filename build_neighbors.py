@@ -0,0 +1,48 @@
+import time
+import argparse
+from dotenv import load_dotenv
+from utils.db import get_conn, put_conn
+from utils.snapshot import open_snapshot, catalog_version
+from utils.vector_index import fetch_embeddings
+from utils.neighbor_graph import NEIGHBORS_PATH, build_neighbors, write_graph
+load_dotenv()
+
+K = 32      # neighbours kept per food
+
+
+def run(path=NEIGHBORS_PATH, k=K):
+    """
+    Precompute the top-k neighbour list of every embedded food for the graph
+    walk mode. Run after add_embeddings.py (and export_snapshot.py, whose
+    snapshot is reused when it is current).
+    """
+    started = time.monotonic()
+    conn = get_conn()
+    try:
+        version = catalog_version(conn)
+        snap = open_snapshot(conn)
+        ids, matrix = (snap.ids, snap.matrix) if snap is not None else fetch_embeddings(conn)
+    finally:
+        put_conn(conn)
+    if not len(ids):
+        print("No embedded foods, nothing to build")
+        return None
+
+    def progress(done, total):
+        end = "\n" if done == total else "\r"
+        print(f"neighbours: {done}/{total} foods, {time.monotonic() - started:.1f}s", end=end, flush=True)
+
+    ids, neighbors, scores = build_neighbors(ids, matrix, k, progress=progress)
+    write_graph(path, version, ids, neighbors, scores)
+    size = (neighbors.nbytes + scores.nbytes + ids.nbytes) / 1e6
+    print(f"Neighbour graph written: {path}, {len(ids)} foods x {neighbors.shape[1]} neighbours, "
+          f"{size:.1f} MB, {time.monotonic() - started:.1f}s")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute food-to-food neighbour lists for graph walk mode.")
+    parser.add_argument("path", nargs="?", default=NEIGHBORS_PATH)
+    parser.add_argument("-k", type=int, default=K)
+    args = parser.parse_args()
+    run(args.path, args.k)
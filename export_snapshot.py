@@ -0,0 +1,70 @@
+import time
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+from utils.db import get_conn, put_conn
+from utils.snapshot import SNAPSHOT_PATH, catalog_version, ensure_catalog_meta, write_snapshot
+from utils.vector_index import IVF_NLIST, VECTOR_BACKEND, train_ivf
+load_dotenv()
+
+FETCH_ROWS = 5000       # rows per round trip of the server-side cursor
+
+
+def export(path=SNAPSHOT_PATH, ivf=VECTOR_BACKEND == "ivf", nlist=IVF_NLIST):
+    """
+    Write food ids, category ids and embeddings to a snapshot the backend
+    memory-maps at startup. Run after add_embeddings.py. With `ivf` the
+    k-means cells of VECTOR_BACKEND=ivf are trained here once, instead of
+    in every worker at startup.
+    """
+    started = time.monotonic()
+    conn = get_conn()
+    try:
+        ensure_catalog_meta(conn)
+        # one snapshot of the table for the stamp, the count and the rows
+        with conn.transaction():
+            conn.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            version = catalog_version(conn)
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*), MAX(vector_dims(embedding)) FROM food WHERE embedding IS NOT NULL")
+                n, dim = cur.fetchone()
+            if not n:
+                print("No embedded foods, nothing to export")
+                return None
+
+            ids = np.empty(n, dtype=np.int64)
+            category_ids = np.empty(n, dtype=np.int64)
+            matrix = np.empty((n, dim), dtype=np.float32)
+            with conn.cursor(name="snapshot_export") as cur:
+                cur.itersize = FETCH_ROWS
+                cur.execute("""
+                    SELECT id, COALESCE(category_id, 0), embedding
+                    FROM food WHERE embedding IS NOT NULL ORDER BY id
+                """)
+                for i, (food_id, category_id, emb) in enumerate(cur):
+                    ids[i], category_ids[i] = food_id, category_id
+                    matrix[i] = emb
+    finally:
+        put_conn(conn)
+
+    cells = None
+    if ivf:
+        step = time.monotonic()
+        cells = train_ivf(matrix, nlist)
+        print(f"IVF cells trained: {len(cells[0])}, {time.monotonic() - step:.1f}s")
+
+    write_snapshot(path, version, ids, category_ids, matrix, cells)
+    elapsed = time.monotonic() - started
+    print(f"Snapshot written: {path}, {n} foods x {dim} dims, "
+          f"{matrix.nbytes / 1e6:.1f} MB, version {version}, {elapsed:.1f}s")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export food embeddings to a memory-mappable snapshot.")
+    parser.add_argument("path", nargs="?", default=SNAPSHOT_PATH)
+    parser.add_argument("--ivf", action="store_true",
+                        help="also train the IVF cells (default: when VECTOR_BACKEND=ivf)")
+    parser.add_argument("--nlist", type=int, default=IVF_NLIST, help="IVF cells, 0 = sqrt(n)")
+    args = parser.parse_args()
+    export(args.path, args.ivf or VECTOR_BACKEND == "ivf", args.nlist)
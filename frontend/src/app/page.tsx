@@ -5,6 +5,7 @@ import { getSessionId } from "@/lib/session";
 import { useRouter } from "next/navigation";
 
 const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
+const BATCH_SIZE = 5;
 
 export default function Home() {
   const [items, setItems] = useState<Recommendation[]>([]);
@@ -25,20 +26,24 @@ export default function Home() {
   const fetchNext = () => {
     setLoading(true);
     const sid = getSessionId();
-    fetch(`${BACKEND_URL}/next/${sid}`)
+    fetch(`${BACKEND_URL}/next/${sid}?k=${BATCH_SIZE}`)
       .then(res => res.json())
       .then((data) => {
         setLoading(false);
-        if (!data || Object.keys(data).length === 0) {
-          setItems([]);
-          return;
-        }
-        const nextItems = Array.isArray(data) ? data : [data];
-        setItems(nextItems);
-        setCurrentIndex(0);
+        showBatch(data);
       });
   };
 
+  const showBatch = (data: Recommendation | Recommendation[] | null) => {
+    if (!data || Object.keys(data).length === 0) {
+      setItems([]);
+      return;
+    }
+    const nextItems = Array.isArray(data) ? data : [data];
+    setItems(nextItems);
+    setCurrentIndex(0);
+  };
+
   const swipe = (action: "left" | "right" | "super") => {
     const item = items[currentIndex];
     if (!item) return;
@@ -47,17 +52,24 @@ export default function Home() {
     
     const sid = getSessionId();
     const type = encodeURIComponent(item.type);
-    fetch(`${BACKEND_URL}/swipe/${sid}/${item.id}/${action}?item_type=${type}`, {
+    // a category swipe moves through the tree, so the rest of the batch is stale
+    const needNext = action !== "super" && (item.type === "category" || currentIndex + 1 >= items.length);
+    const url = needNext
+      ? `${BACKEND_URL}/swipe-next/${sid}/${item.id}/${action}?item_type=${type}&k=${BATCH_SIZE}`
+      : `${BACKEND_URL}/swipe/${sid}/${item.id}/${action}?item_type=${type}`;
+    fetch(url, {
       method: "POST",
-    }).then(() => {
-      if(action == "super")
-        return
-      setTimeout(() => {
-        setSwipeDirection(null);
-        if (currentIndex + 1 < items.length) setCurrentIndex(currentIndex + 1);
-        else fetchNext();
-      }, 300);
-    });
+    })
+      .then(res => (needNext ? res.json() : null))
+      .then((data) => {
+        if(action == "super")
+          return
+        setTimeout(() => {
+          setSwipeDirection(null);
+          if (needNext) showBatch(data?.next ?? null);
+          else setCurrentIndex(currentIndex + 1);
+        }, 300);
+      });
   };
 
   const superSwipe = async () => {
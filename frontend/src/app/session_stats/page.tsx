@@ -11,37 +11,41 @@ const BACKEND_URL =
 export default function StatPage() {
     const [stats, setStats] = useState<Stats | null>(null);
     const [loading, setLoading] = useState(true);
+    const [insightFailed, setInsightFailed] = useState(false);
     const router = useRouter();
 
     useEffect(() => {
-        const fetchStats = async () => {
-        try {
-            const sid = getSessionId();
-            const res = await fetch(`${BACKEND_URL}/super/${sid}`, {
-            method: "POST",
-            });
-
-            if (res.status === 404) {
-            setStats(null);
+        // numbers arrive first, then the insight streams in token by token
+        const sid = getSessionId();
+        const source = new EventSource(`${BACKEND_URL}/super/${sid}/stream`);
+
+        source.addEventListener("stats", (e) => {
+            const data = JSON.parse((e as MessageEvent).data);
+            setStats({ ...data, insights: "" });
             setLoading(false);
-            return;
-            }
-
-            if (!res.ok) {
-            throw new Error("Failed to fetch stats");
-            }
-
-            const data = await res.json();
-            setStats(data);
-        } catch (err) {
-            console.error("Stats fetch error:", err);
-            setStats(null);
-        } finally {
+        });
+
+        source.addEventListener("token", (e) => {
+            const { text } = JSON.parse((e as MessageEvent).data);
+            setStats(prev => (prev ? { ...prev, insights: prev.insights + text } : prev));
+        });
+
+        source.addEventListener("insight_error", (e) => {
+            // the counts are already shown; only the LLM insight failed
+            const { detail } = JSON.parse((e as MessageEvent).data);
+            console.error("taste insight failed:", detail);
+            setInsightFailed(true);
+        });
+
+        source.addEventListener("done", () => source.close());
+
+        source.onerror = () => {
+            // 404 (no session) or a dropped stream: show whatever has arrived
+            source.close();
             setLoading(false);
-        }
         };
-        fetchStats()
 
+        return () => source.close();
     }, []); 
 
     const handleReset = () =>
@@ -176,7 +180,11 @@ if (loading) {
                     </div>
                 </div>
                 <div className= "flex text-orange-600 bg-gray-100 rounded-2xl p-2 text-center shadow-lg mb-5">
-                    <p className="w-full">{stats.insights}</p>
+                    <p className="w-full">
+                        {insightFailed && !stats.insights
+                            ? "We couldn't read your taste right now. Try again in a moment."
+                            : stats.insights}
+                    </p>
                 </div>
 
                 {/* Reset Button */}
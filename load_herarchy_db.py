@@ -1,52 +1,188 @@
-import  json, os
-from psycopg import sql
+import  json, os, time, argparse
 from dotenv import load_dotenv
-from utils.db import get_conn
+from utils.db import get_conn, put_conn
+from utils.nutrition import NUTRIENTS, INDEXES as NUTRITION_INDEXES, parse_nutrition, ensure_schema, backfill
+from utils.indexes import ensure_indexes
 load_dotenv()
-conn=get_conn()
-cur=conn.cursor()
-
-with open("recipes_with_key_ingredients.json") as f:
-    data = json.load(f)
-
-category_cache = {}
-
-def get_or_create_category(name, parent):
-    key = (name,parent)
-    if key in category_cache:
-        return category_cache[key]
-
-    cur.execute("""
-        INSERT INTO categories(name,parent_id)
-        VALUES(%s,%s)
-        ON CONFLICT(name,parent_id) DO UPDATE SET name=EXCLUDED.name
-        RETURNING id
-    """,(name,parent))
-
-    cid = cur.fetchone()[0]
-    category_cache[key]=cid
-    return cid
-
-food_rows=[]
-
-for r in data:
-    parent=None
-    for cat in r["category"]:
-        parent=get_or_create_category(cat.strip(),parent)
-
-    food_rows.append((
-        r["name"],
-        parent,
-        r["key_ingredients"],
-        json.dumps(r["nutrition"])
-    ))
-
-cur.executemany( """
-INSERT INTO food(name,category_id,key_ingredients,nutrition)
-VALUES (%s, %s, %s, %s)
-""",food_rows)
-
-conn.commit()
-cur.close()
-conn.close()
-print("Food ingested.")
+
+DATA_FILE = "recipes_with_key_ingredients.json"
+CHUNK_SIZE = 1 << 20        # bytes read per step of the incremental parser
+REPORT_EVERY = 50_000       # rows between progress lines
+
+
+# ---------------- Incremental JSON parsing ----------------
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield the elements of a top-level JSON array one at a time, reading the
+    file in chunks, so memory holds one chunk plus one record.
+    """
+    decoder = json.JSONDecoder()
+    skip = " \t\r\n,"
+    with open(path, encoding="utf-8") as f:
+        # leading whitespace may run past the first chunk
+        buf = ""
+        while not buf:
+            more = f.read(chunk_size)
+            if not more:
+                break
+            buf = more.lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a JSON array")
+        pos, eof = 1, False
+        while True:
+            while pos < len(buf) and buf[pos] in skip:
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                # decode at an offset; slicing per record would copy the chunk each time
+                obj, end = decoder.raw_decode(buf, pos)
+                # a number at the very end of the chunk may continue in the next one
+                complete = end < len(buf) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                more = f.read(chunk_size)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            pos = end
+            yield obj
+
+
+class Progress:
+    def __init__(self, label, every=REPORT_EVERY):
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.started = time.monotonic()
+
+    def tick(self, n=1):
+        self.count += n
+        if self.count % self.every == 0:
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        end = "\n" if final else "\r"
+        print(f"{self.label}: {self.count} rows, {self.count / elapsed:,.0f} rows/s, {elapsed:.1f}s", end=end, flush=True)
+
+
+def category_path(record):
+    return tuple(c.strip() for c in record["category"])
+
+
+# ---------------- Categories: one multi-row upsert per tree level ----------------
+def collect_paths(path):
+    paths = set()
+    progress = Progress("scanning categories")
+    for r in iter_json_array(path):
+        cats = category_path(r)
+        # every prefix is a category of its own
+        for depth in range(1, len(cats) + 1):
+            paths.add(cats[:depth])
+        progress.tick()
+    progress.report(final=True)
+    return paths
+
+
+def resolve_categories(cur, paths):
+    """Map every category path to its id, inserting missing categories level by level."""
+    ids = {}
+    depth = 1
+    while True:
+        level = sorted(p for p in paths if len(p) == depth)
+        if not level:
+            return ids
+        names = [p[-1] for p in level]
+        parents = [ids[p[:-1]] if depth > 1 else None for p in level]
+
+        if depth == 1:
+            # NULL parent_id never conflicts, so reuse existing roots explicitly
+            cur.execute(
+                "SELECT name, id FROM categories WHERE parent_id IS NULL AND name = ANY(%s)",
+                (names,),
+            )
+            existing = dict(cur.fetchall())
+            missing = [n for n in names if n not in existing]
+            if missing:
+                cur.execute("""
+                    INSERT INTO categories(name, parent_id)
+                    SELECT unnest(%s::text[]), NULL
+                    RETURNING name, id
+                """, (missing,))
+                existing.update(cur.fetchall())
+            for p in level:
+                ids[p] = existing[p[-1]]
+        else:
+            cur.execute("""
+                INSERT INTO categories(name, parent_id)
+                SELECT * FROM unnest(%s::text[], %s::int[])
+                ON CONFLICT(name,parent_id) DO UPDATE SET name=EXCLUDED.name
+                RETURNING name, parent_id, id
+            """, (names, parents))
+            by_key = {(name, parent): cid for name, parent, cid in cur.fetchall()}
+            for p, name, parent in zip(level, names, parents):
+                ids[p] = by_key[(name, parent)]
+        print(f"level {depth}: {len(level)} categories")
+        depth += 1
+
+
+# ---------------- Foods: COPY ----------------
+def copy_foods(cur, path, category_ids):
+    progress = Progress("loading foods")
+    columns = ",".join(("name", "category_id", "key_ingredients", "nutrition") + NUTRIENTS)
+    with cur.copy(f"COPY food({columns}) FROM STDIN") as copy:
+        for r in iter_json_array(path):
+            # typed columns parsed from the inverted {"14g": "Fat"} blob
+            parsed = parse_nutrition(r["nutrition"])
+            copy.write_row((
+                r["name"],
+                category_ids[category_path(r)],
+                r["key_ingredients"],
+                json.dumps(r["nutrition"]),
+                *(parsed[n] for n in NUTRIENTS),
+            ))
+            progress.tick()
+    progress.report(final=True)
+    return progress.count
+
+
+def ingest(path=DATA_FILE):
+    started = time.monotonic()
+    conn = get_conn()
+    try:
+        ensure_schema(conn)
+        paths = collect_paths(path)
+        with conn.transaction():
+            with conn.cursor() as cur:
+                category_ids = resolve_categories(cur, paths)
+                rows = copy_foods(cur, path, category_ids)
+        # after the bulk load: one build per index, concurrent with readers
+        ensure_indexes(conn, NUTRITION_INDEXES)
+    finally:
+        put_conn(conn)
+    elapsed = time.monotonic() - started
+    size = os.path.getsize(path)
+    print(f"Food ingested: {rows} foods, {len(paths)} categories, "
+          f"{size / elapsed / 1e6:.1f} MB/s, {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a recipes JSON array into categories and food.")
+    parser.add_argument("path", nargs="?", default=DATA_FILE)
+    parser.add_argument("--backfill-nutrition", action="store_true",
+                        help="only parse nutrition into the typed columns for foods already loaded")
+    args = parser.parse_args()
+    if args.backfill_nutrition:
+        conn = get_conn()
+        try:
+            ensure_schema(conn)
+            print(f"Nutrition parsed for {backfill(conn)} foods")
+        finally:
+            put_conn(conn)
+    else:
+        ingest(args.path)
@@ -0,0 +1,74 @@
+import time
+import argparse
+from dotenv import load_dotenv
+from utils.db import get_conn, put_conn
+from utils.retention import (
+    SESSION_RETENTION_DAYS, RETENTION_BATCH,
+    ensure_schema, ensure_indexes, count_expired, archive_batch,
+)
+from utils.session_backends import SESSION_BACKEND, FileBackend
+load_dotenv()
+
+PAUSE = 0.2     # seconds between batches, leaves room for live traffic
+
+
+def run(idle_days=SESSION_RETENTION_DAYS, batch_size=RETENTION_BATCH, max_batches=None,
+        pause=PAUSE, dry_run=False, vacuum=False, migrate=False):
+    """
+    Archive sessions idle for more than idle_days and delete their swipes,
+    one short transaction per batch, so it can run (e.g. from cron) while
+    the backend serves traffic. Creates the retention schema first; with
+    migrate=True it stops there.
+    """
+    started = time.monotonic()
+    conn = get_conn()
+    try:
+        ensure_schema(conn)
+        for name in ensure_indexes(conn):
+            print(f"index built: {name}")
+        if migrate:
+            print("Retention schema up to date")
+            return 0
+
+        expired = count_expired(conn, idle_days)
+        if dry_run:
+            print(f"{expired} sessions idle for more than {idle_days:g} days")
+            return 0
+
+        archived = batches = 0
+        while max_batches is None or batches < max_batches:
+            n = archive_batch(conn, idle_days, batch_size)
+            if not n:
+                break
+            archived += n
+            batches += 1
+            print(f"archived: {archived}/{expired} sessions, {time.monotonic() - started:.1f}s", end="\r", flush=True)
+            time.sleep(pause)
+        if archived:
+            print()
+
+        if vacuum and archived:
+            # reclaim the deleted rows now instead of waiting for autovacuum
+            for table in ("session_food", "session_category", "session_memory", "swipe_sessions"):
+                conn.execute(f"VACUUM (ANALYZE) {table}")
+    finally:
+        put_conn(conn)
+
+    if SESSION_BACKEND == "file":
+        print(f"Expired session files removed: {FileBackend().sweep()}")
+    print(f"Sessions archived: {archived} in {batches} batches, {time.monotonic() - started:.1f}s")
+    return archived
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive idle swipe sessions and prune their history.")
+    parser.add_argument("--idle-days", type=float, default=SESSION_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH)
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches (default: until done)")
+    parser.add_argument("--pause", type=float, default=PAUSE, help="seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="only count the sessions that would be archived")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) the live tables afterwards")
+    parser.add_argument("--migrate", action="store_true",
+                        help="only create the retention schema and indexes (run once before starting the backend)")
+    args = parser.parse_args()
+    run(args.idle_days, args.batch_size, args.max_batches, args.pause, args.dry_run, args.vacuum, args.migrate)